@@ -0,0 +1,156 @@
+"""
+题目解析性能测试：离线解析 benchmarks/fixtures 下保存的题目页面，统计各阶段耗时与内存峰值，
+并与 benchmarks/golden 下的 Markdown 对比，防止优化悄悄改变了输出结果。
+
+用法：
+    python benchmarks/bench_parse.py                 # 运行全部样本
+    python benchmarks/bench_parse.py -n 50 katex     # 指定重复次数和样本
+    python benchmarks/bench_parse.py --update-golden # 确认输出变化符合预期后更新golden
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(bench_dir))
+
+import constants  # noqa: E402
+import get_problem  # noqa: E402
+
+fixtures_dir = os.path.join(bench_dir, "fixtures")
+golden_dir = os.path.join(bench_dir, "golden")
+
+# 样本页面没有对应的统计接口，使用固定的统计数据
+PROBLEM_STATISTICS = {"data": {"passRate": "37.5%", "passTotal": 3, "total": 8}}
+
+# 在 problem_info_2_md 内部被调用、需要单独计时的函数
+INNER_STAGES = ("problem_item_2_list", "format_markdown")
+
+
+class StageTimer:
+    """
+    临时替换 get_problem 模块中的函数，累计它们在一次解析中的耗时。
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.elapsed = dict.fromkeys(names, 0.0)
+        self._originals = {}
+
+    def _wrap(self, name, func):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.elapsed[name] += time.perf_counter() - start
+        return wrapper
+
+    def __enter__(self):
+        for name in self.names:
+            self._originals[name] = getattr(get_problem, name)
+            setattr(get_problem, name, self._wrap(name, self._originals[name]))
+        return self
+
+    def __exit__(self, *exc):
+        for name, func in self._originals.items():
+            setattr(get_problem, name, func)
+
+
+def parse_fixture(html):
+    info, index = get_problem.parse_problem_html(html)
+    return get_problem.problem_info_2_md(info, PROBLEM_STATISTICS, index)
+
+
+def bench_fixture(html, repeat):
+    """
+    Returns:
+        tuple: (各阶段耗时列表的字典, 内存峰值字节数, 解析结果)
+    """
+    timings = {"parse_html": [], "problem_info_2_md": []}
+    timings.update({name: [] for name in INNER_STAGES})
+    result = None
+    for _ in range(repeat):
+        with StageTimer(INNER_STAGES) as timer:
+            start = time.perf_counter()
+            info, index = get_problem.parse_problem_html(html)
+            parsed = time.perf_counter()
+            result = get_problem.problem_info_2_md(info, PROBLEM_STATISTICS, index)
+            done = time.perf_counter()
+        timings["parse_html"].append(parsed - start)
+        timings["problem_info_2_md"].append(done - parsed)
+        for name in INNER_STAGES:
+            timings[name].append(timer.elapsed[name])
+
+    # tracemalloc 会显著拖慢执行，因此单独运行一次来统计内存
+    tracemalloc.start()
+    parse_fixture(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak, result
+
+
+def compare_golden(name, result, update):
+    markdown, input_output_samples = result
+    md_path = os.path.join(golden_dir, f"{name}.md")
+    samples_path = os.path.join(golden_dir, f"{name}.samples.json")
+    samples_text = json.dumps(input_output_samples, ensure_ascii=False, indent=2) + "\n"
+    if update:
+        with open(md_path, "w", encoding="utf-8", newline="") as f:
+            f.write(markdown)
+        with open(samples_path, "w", encoding="utf-8", newline="") as f:
+            f.write(samples_text)
+        return "updated"
+    try:
+        with open(md_path, "r", encoding="utf-8", newline="") as f:
+            golden_markdown = f.read()
+        with open(samples_path, "r", encoding="utf-8", newline="") as f:
+            golden_samples = f.read()
+    except FileNotFoundError:
+        return "missing"
+    if markdown != golden_markdown:
+        return "md-diff"
+    if samples_text != golden_samples:
+        return "samples-diff"
+    return "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="题目解析性能测试")
+    parser.add_argument("fixtures", nargs="*", help="要运行的样本名（不含 .html），默认为全部")
+    parser.add_argument("-n", "--repeat", type=int, default=20, help="每个样本重复解析的次数")
+    parser.add_argument("--parser", default=constants.HTML_PARSER, help="HTML解析器：html.parser 或 lxml")
+    parser.add_argument("--update-golden", action="store_true", help="用当前输出覆盖golden文件")
+    args = parser.parse_args()
+
+    constants.HTML_PARSER = args.parser
+    names = args.fixtures or sorted(os.path.splitext(f)[0] for f in os.listdir(fixtures_dir) if f.endswith(".html"))
+
+    stages = ["parse_html", "problem_info_2_md", *INNER_STAGES]
+    print(f"解析器: {args.parser}  重复次数: {args.repeat}  (耗时为中位数，单位 ms)")
+    print(f"{'fixture':<14}" + "".join(f"{stage:>20}" for stage in stages) + f"{'peak KiB':>10}  golden")
+
+    failed = []
+    for name in names:
+        with open(os.path.join(fixtures_dir, f"{name}.html"), "r", encoding="utf-8") as f:
+            html = f.read()
+        timings, peak, result = bench_fixture(html, args.repeat)
+        golden = compare_golden(name, result, args.update_golden)
+        if golden not in ("ok", "updated"):
+            failed.append(name)
+        print(f"{name:<14}"
+              + "".join(f"{statistics.median(timings[stage]) * 1000:>20.3f}" for stage in stages)
+              + f"{peak / 1024:>10.1f}  {golden}")
+
+    if failed:
+        print(f"\n输出与golden不一致: {', '.join(failed)}")
+        print("如果变化符合预期，请使用 --update-golden 更新golden文件。")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+
+import constants
+import cpp_diagnostics
+import generate_answer
+import language
+import llm_cache
+import llm_dispatcher
+import local_test
+import workspace as workspace_module
+from log_format import PREFIX_INFO, PREFIX_WARN, PREFIX_ERROR, PREFIX_SUCCESS
+
+
+async def _run_candidate(index, problem_id, problem_markdown, input_output_samples, workspace, model=None,
+                         limits=None, note=None):
+    """
+    生成一份候选代码，并立即在 workspace 下独立的子目录中进行编译和样例测试。
+
+    Returns:
+        dict: {"index", "code", "messages", "passed", "feedback", "executable"}，
+              feedback 为未通过时反馈给LLM的信息，executable 为编译结果（编译失败时为 None）。
+    """
+    code, messages = await generate_answer.generate_answer_async(problem_markdown, model, note)
+    print(f"{PREFIX_INFO} 候选 {index + 1} 已生成，开始编译和测试...")
+    candidate = {"index": index, "code": code, "messages": messages, "passed": False, "feedback": None,
+                 "executable": None}
+
+    cpp_filename = workspace.subdir(f"candidate{index + 1}").write(f"{problem_id}{language.source_suffix()}", code)
+    # 编译和运行是阻塞的子进程调用，放到线程中执行，不影响其他候选的生成；编译交给后台编译线程池排队
+    compile_ok, compile_result = await asyncio.wrap_future(language.submit_compile(cpp_filename))
+    if not compile_ok:
+        candidate["feedback"] = cpp_diagnostics.compile_feedback(compile_result, cpp_filename)[0]
+        return candidate
+    candidate["executable"] = compile_result
+
+    if input_output_samples:
+        # 任务被取消时线程不会随之停止，通过 cancel_event 通知 run_samples 终止正在运行的样例
+        cancel_event = threading.Event()
+        try:
+            passed, feedback = await asyncio.to_thread(local_test.run_samples, compile_result, input_output_samples,
+                                                       cancel_event=cancel_event, **(limits or {}))
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+    else:
+        passed, feedback = True, None
+    candidate["passed"] = passed
+    candidate["feedback"] = feedback
+    return candidate
+
+
+async def solve_best_of_n_async(problem_id, problem_markdown, input_output_samples, n=constants.BEST_OF_N,
+                                model=None, limits=None, workspace=None, note=None):
+    """
+    同时请求 n 份候选代码，每份生成完成后立即编译并测试样例，
+    第一份通过全部样例的候选胜出，其余仍在生成或测试的候选被取消（正在运行的样例进程随之终止，
+    已经开始的编译在后台编译线程池中完成）。
+    model 为使用的模型，默认为 constants.LLM_MODEL；
+    limits 为题目的 {"time_limit", "memory_limit"}，测试样例时使用本地评测检查资源占用；
+    workspace 为存放候选代码的工作目录（见 workspace），为 None 时新建一个，结束后删除；
+    note 为追加在题目描述之后的说明（例如重新生成时的 constants.LLM_REGENERATE_NOTE），见 generate_answer.build_messages。
+
+    Returns:
+        tuple: (winner, candidates)
+               winner (dict or None): 通过样例的候选，格式见 _run_candidate；全部未通过时为 None。
+               candidates (list): 按完成顺序排列的未通过候选，可用于后续的修复循环。
+    """
+    owned_workspace = workspace_module.Workspace.create(f"P{problem_id}") if workspace is None else None
+    workspace = workspace or owned_workspace
+    tasks = [
+        asyncio.create_task(_run_candidate(k, problem_id, problem_markdown, input_output_samples, workspace,
+                                           model, limits, note))
+        for k in range(n)
+    ]
+    candidates = []
+    winner = None
+    start_time = time.time()
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                candidate = await next_done
+            except (llm_cache.CacheMiss, llm_dispatcher.CircuitOpenError):
+                # 与逐份生成时相同，重放缓存未命中或接口熔断时重试也不会成功，直接结束
+                raise
+            except Exception as e:
+                print(f"{PREFIX_ERROR} 候选生成或测试失败: {e}")
+                continue
+            if candidate["passed"]:
+                winner = candidate
+                print(f"{PREFIX_SUCCESS} 候选 {candidate['index'] + 1} 通过本地测试，"
+                      f"用时 {time.time() - start_time:.2f}s，取消其余候选。")
+                break
+            print(f"{PREFIX_WARN} 候选 {candidate['index'] + 1} 未通过本地测试。")
+            candidates.append(candidate)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if owned_workspace is not None:
+            owned_workspace.cleanup()
+    return winner, candidates
+
+
+def solve_best_of_n(problem_id, problem_markdown, input_output_samples, n=constants.BEST_OF_N, model=None,
+                    limits=None, workspace=None, note=None):
+    """
+    solve_best_of_n_async 的同步入口。
+    """
+    return asyncio.run(solve_best_of_n_async(problem_id, problem_markdown, input_output_samples, n, model, limits,
+                                             workspace, note))
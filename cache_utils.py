@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+
+
+def atomic_write_bytes(path, data):
+    """
+    原子地写入文件：先写入同目录下的临时文件，再替换目标文件，避免读到写了一半的内容。
+
+    Args:
+        path (str): 目标文件路径。
+        data (bytes): 要写入的内容。
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, data):
+    atomic_write_bytes(path, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+
+def read_json(path):
+    """
+    读取 JSON 文件，文件不存在或内容损坏时返回 None。
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def touch(path):
+    """
+    更新文件的修改时间，用作 LRU 淘汰时的“最近使用”标记。
+    """
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def evict_lru(directory, max_bytes):
+    """
+    当目录内文件总大小超过 max_bytes 时，按最近使用时间从旧到新删除缓存项。
+    文件名（第一个“.”之前的部分）相同的文件视为同一个缓存项，一起删除。
+
+    Args:
+        directory (str): 缓存目录。
+        max_bytes (int): 允许的最大总大小（字节），为 None 或 <= 0 时不做限制。
+
+    Returns:
+        int: 被删除的缓存项数量。
+    """
+    if not max_bytes or max_bytes <= 0 or not os.path.isdir(directory):
+        return 0
+
+    groups = {}  # 缓存项名称 -> [最近使用时间, 总大小, 文件路径列表]
+    total_size = 0
+    for entry in os.scandir(directory):
+        if not entry.is_file() or entry.name.startswith(".tmp_"):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        group = groups.setdefault(entry.name.split(".", 1)[0], [0.0, 0, []])
+        group[0] = max(group[0], stat.st_mtime)
+        group[1] += stat.st_size
+        group[2].append(entry.path)
+        total_size += stat.st_size
+
+    evicted = 0
+    for mtime, size, paths in sorted(groups.values(), key=lambda g: g[0]):
+        if total_size <= max_bytes:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total_size -= size
+        evicted += 1
+    return evicted
@@ -0,0 +1,93 @@
+from bisect import bisect_left
+
+from bs4 import Tag
+
+
+class ClassPrefixIndex:
+    """
+    一次遍历文档树，按元素的第一个 class 建立索引。
+
+    查询结果与 filter_class_start(prefix, element.find_all(name)) 完全一致（同样按文档顺序、
+    同样只比较第一个 class、同样不包含 element 本身），但不需要每次重新遍历子树。
+    """
+
+    def __init__(self, root, prefixes=None):
+        """
+        Args:
+            root (Tag): 要建立索引的根元素（通常是 BeautifulSoup 对象或题目详情的 div）。
+            prefixes (tuple, optional): 只为第一个 class 以这些前缀开头的元素建立索引，
+                                        默认为全部带 class 的元素。
+        """
+        self._root = root
+        self._positions = {}  # id(tag) -> 先序遍历序号
+        self._ends = {}  # id(tag) -> 子树之后第一个元素的序号，查询时按需计算
+        self._classes = {}  # 第一个 class -> ([序号...], [元素...])，均按文档顺序排列
+        self._prefix_keys = {}  # 前缀 -> 匹配该前缀的 class 列表
+
+        positions = self._positions
+        counter = 0
+        for node in root.descendants:
+            if not isinstance(node, Tag):
+                continue
+            counter += 1
+            positions[id(node)] = counter
+            class_list = node.get("class")
+            if class_list and (prefixes is None or class_list[0].startswith(prefixes)):
+                entry = self._classes.get(class_list[0])
+                if entry is None:
+                    entry = self._classes[class_list[0]] = ([], [])
+                entry[0].append(counter)
+                entry[1].append(node)
+        self._count = counter + 1
+
+    def _end(self, tag):
+        end = self._ends.get(id(tag))
+        if end is None:
+            # 子树结束于 tag（或其最近的祖先）之后的第一个兄弟元素
+            end = self._count
+            node = tag
+            while node is not None and node is not self._root:
+                sibling = node.next_sibling
+                while sibling is not None and not isinstance(sibling, Tag):
+                    sibling = sibling.next_sibling
+                if sibling is not None:
+                    end = self._positions[id(sibling)]
+                    break
+                node = node.parent
+            self._ends[id(tag)] = end
+        return end
+
+    def _keys(self, prefix):
+        keys = self._prefix_keys.get(prefix)
+        if keys is None:
+            keys = [key for key in self._classes if key.startswith(prefix)]
+            self._prefix_keys[prefix] = keys
+        return keys
+
+    def find_all(self, prefix, name=None, within=None):
+        """
+        查找第一个 class 以 prefix 开头的元素。
+
+        Args:
+            prefix (str): class 前缀。
+            name (str, optional): 只返回该标签名的元素。
+            within (Tag, optional): 只返回该元素的后代（不含其本身），默认为整个索引范围。
+
+        Returns:
+            list: 按文档顺序排列的元素列表。
+        """
+        if within is not None and within is not self._root:
+            start, end = self._positions[id(within)] + 1, self._end(within)
+        else:
+            start, end = 0, self._count
+
+        matched = []
+        for key in self._keys(prefix):
+            positions, tags = self._classes[key]
+            lo = bisect_left(positions, start)
+            hi = bisect_left(positions, end)
+            matched.extend((positions[i], tags[i]) for i in range(lo, hi)
+                           if name is None or tags[i].name == name)
+        if len(self._keys(prefix)) > 1:
+            matched.sort(key=lambda item: item[0])
+        return [tag for _, tag in matched]
@@ -0,0 +1,150 @@
+"""
+把LLM返回的修改应用到当前代码上，修复时不必让LLM重新输出整份代码。
+支持两种格式：
+
+    SEARCH/REPLACE 块：
+        <<<<<<< SEARCH
+        原代码片段
+        =======
+        修改后的代码片段
+        >>>>>>> REPLACE
+
+    统一差异格式（unified diff），以 @@ 开头的若干 hunk。
+"""
+import re
+
+_SEARCH_REPLACE_RE = re.compile(
+    r"^<{5,9} ?SEARCH[ \t]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} ?REPLACE[ \t]*$",
+    re.DOTALL | re.MULTILINE,
+)
+# LLM 有时省略行号，只写 "@@ ... @@"
+_HUNK_HEADER_RE = re.compile(r"^@@(?: -(\d+)(?:,\d+)? \+\d+(?:,\d+)?)?.*?@@", re.MULTILINE)
+# 修改的标记，格式不完整时也算
+_PATCH_MARKER_RE = re.compile(r"^(?:<{5,9} ?SEARCH|>{5,9} ?REPLACE)[ \t]*$", re.MULTILINE)
+
+
+class PatchError(Exception):
+    """
+    补丁格式错误或无法应用到当前代码。
+    """
+
+
+def _find_lines(lines, block, start=0):
+    """
+    在 lines 中查找与 block 相同的连续行，先精确匹配，再忽略行尾空白匹配。
+
+    Returns:
+        list: 所有匹配位置。
+    """
+    if not block:
+        return []
+    for normalize in (lambda line: line, str.rstrip):
+        target = [normalize(line) for line in block]
+        normalized = [normalize(line) for line in lines]
+        positions = [
+            i for i in range(start, len(lines) - len(block) + 1)
+            if normalized[i:i + len(block)] == target
+        ]
+        if positions:
+            return positions
+    return []
+
+
+def apply_search_replace(code, blocks):
+    lines = code.split("\n")
+    for index, (search, replace) in enumerate(blocks, 1):
+        search_lines = search.rstrip("\n").split("\n") if search.strip() else []
+        replace_lines = replace.rstrip("\n").split("\n") if replace else []
+        positions = _find_lines(lines, search_lines)
+        if not positions:
+            raise PatchError(f"第 {index} 个 SEARCH 块在当前代码中找不到")
+        if len(positions) > 1:
+            raise PatchError(f"第 {index} 个 SEARCH 块在当前代码中出现了 {len(positions)} 次，无法确定修改位置")
+        pos = positions[0]
+        lines[pos:pos + len(search_lines)] = replace_lines
+    return "\n".join(lines)
+
+
+def _parse_hunks(diff_text):
+    hunks = []  # [(原文件起始行号或 None, 原代码行, 新代码行)]
+    current = None
+    for line in diff_text.split("\n"):
+        header = _HUNK_HEADER_RE.match(line)
+        if header:
+            current = (int(header.group(1)) if header.group(1) else None, [], [])
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(("---", "+++")):
+            continue
+        if line.startswith("```"):
+            current = None
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+        elif line.startswith(" ") or line == "":
+            current[1].append(line[1:])
+            current[2].append(line[1:])
+        elif line.startswith("\\"):  # "\ No newline at end of file"
+            continue
+        else:
+            current = None
+    return hunks
+
+
+def apply_unified_diff(code, diff_text):
+    hunks = _parse_hunks(diff_text)
+    if not hunks:
+        raise PatchError("没有找到 @@ 开头的差异块")
+    lines = code.split("\n")
+    offset = 0  # 前面的 hunk 造成的行号偏移
+    search_from = 0
+    for index, (old_start, old_lines, new_lines) in enumerate(hunks, 1):
+        # 差异块末尾的空行可能只是分隔，不参与匹配
+        while old_lines and new_lines and old_lines[-1] == "" and new_lines[-1] == "":
+            old_lines.pop()
+            new_lines.pop()
+        positions = _find_lines(lines, old_lines, search_from)
+        if not positions:
+            raise PatchError(f"第 {index} 个差异块的上下文在当前代码中找不到")
+        # 有多处匹配时选择最接近 hunk 头标注行号的位置
+        expected = old_start - 1 + offset if old_start is not None else search_from
+        pos = min(positions, key=lambda p: abs(p - expected))
+        lines[pos:pos + len(old_lines)] = new_lines
+        offset += len(new_lines) - len(old_lines)
+        search_from = pos + len(new_lines)
+    return "\n".join(lines)
+
+
+def has_patch(answer):
+    """
+    回复中是否含有修改（SEARCH/REPLACE 块或差异块，即使格式不完整）。
+    LLM 常把修改也写在 ```cpp 代码块中，不能根据代码块判断回复是不是完整代码。
+    """
+    return bool(_PATCH_MARKER_RE.search(answer) or _HUNK_HEADER_RE.search(answer))
+
+
+def apply_patch(code, answer):
+    """
+    把LLM回复中的修改应用到 code 上。
+
+    Args:
+        code (str): 当前代码。
+        answer (str): LLM 的回复，包含 SEARCH/REPLACE 块或统一差异格式的修改。
+
+    Returns:
+        str: 修改后的代码。
+
+    Raises:
+        PatchError: 回复中没有可识别的修改，或修改无法应用。
+    """
+    blocks = _SEARCH_REPLACE_RE.findall(answer)
+    if blocks:
+        patched = apply_search_replace(code, blocks)
+    elif _HUNK_HEADER_RE.search(answer):
+        patched = apply_unified_diff(code, answer)
+    else:
+        raise PatchError("回复中没有 SEARCH/REPLACE 块或差异块")
+    if patched == code:
+        raise PatchError("补丁没有修改代码")
+    return patched
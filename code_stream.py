@@ -0,0 +1,191 @@
+import time
+
+import language
+
+# 每次流式生成的统计信息，见 record_stream_stats
+stream_stats = []
+
+
+class CodeBlockExtractor:
+    """
+    在流式输出中增量识别 ```cpp（Python 为 ```python）代码块，代码块的结束标记一出现就能拿到完整代码，
+    不必等待模型写完后面的解释。识别规则与 generate_answer.extract_code_block 一致。
+    """
+
+    def __init__(self, open_fence=None, close_fence="\n```"):
+        self.open_fence = open_fence or f"```{language.code_fence()}\n"
+        self.close_fence = close_fence
+        self._buffer = ""
+        self._code_start = None  # 代码在 _buffer 中的起始位置
+        self._scan_from = 0  # 下一次查找的起始位置，避免重复扫描
+        self.code = None  # 代码块结束后为完整代码
+
+    @property
+    def closed(self):
+        return self.code is not None
+
+    def feed(self, text):
+        """
+        追加一段流式输出。
+
+        Returns:
+            str or None: 本次追加使代码块结束时返回完整代码，否则返回 None。
+        """
+        if self.closed:
+            return None
+        self._buffer += text
+        if self._code_start is None:
+            pos = self._buffer.find(self.open_fence, self._scan_from)
+            if pos == -1:
+                # 结束标记可能被切分在两个片段之间，保留末尾一段重新查找
+                self._scan_from = max(0, len(self._buffer) - len(self.open_fence) + 1)
+                return None
+            self._code_start = pos + len(self.open_fence)
+            self._scan_from = self._code_start
+        pos = self._buffer.find(self.close_fence, self._scan_from)
+        if pos == -1:
+            self._scan_from = max(self._code_start, len(self._buffer) - len(self.close_fence) + 1)
+            return None
+        self.code = self._buffer[self._code_start:pos]
+        return self.code
+
+
+class StreamTimer:
+    """
+    记录一次流式生成的首字延迟（TTFT）、代码块结束的时间点，以及代码块之后模型又输出了多少内容。
+    接口返回 token 用量时（stream_options.include_usage），同时记录命中提示词缓存的 token 数。
+    """
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.first_content_time = None
+        self.code_ready_time = None
+        self.tail_chunks = 0
+        self.tail_chars = 0
+        self.aborted = False
+        self.usage = None
+
+    def on_content(self, content, code_closed_now):
+        if self.first_content_time is None:
+            self.first_content_time = time.time()
+        if code_closed_now:
+            self.code_ready_time = time.time()
+        elif self.code_ready_time is not None:
+            self.tail_chunks += 1
+            self.tail_chars += len(content)
+
+    def on_usage(self, usage):
+        self.usage = parse_usage(usage)
+
+    def finish(self, aborted=False):
+        """
+        结束计时并记录到 stream_stats。
+        """
+        self.aborted = aborted
+        usage = self.usage or {}
+        record_stream_stats({
+            "total_seconds": time.time() - self.start_time,
+            "ttft_seconds": (self.first_content_time - self.start_time) if self.first_content_time else None,
+            "code_ready_seconds": (self.code_ready_time - self.start_time) if self.code_ready_time else None,
+            "tail_chunks": self.tail_chunks,
+            "tail_chars": self.tail_chars,
+            "aborted": aborted,
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "cached_tokens": usage.get("cached_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+        })
+
+
+def parse_usage(usage):
+    """
+    从接口返回的 usage 中取出 token 用量。不同服务商报告缓存命中的字段不同：
+    OpenAI 为 prompt_tokens_details.cached_tokens，DeepSeek 为 prompt_cache_hit_tokens，
+    Anthropic 兼容接口为 cache_read_input_tokens。
+
+    Returns:
+        dict: {"prompt_tokens", "cached_tokens", "completion_tokens"}，未报告的字段为 None。
+    """
+    if hasattr(usage, "model_dump"):
+        usage = usage.model_dump()
+    if not isinstance(usage, dict):
+        return {"prompt_tokens": None, "cached_tokens": None, "completion_tokens": None}
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached is None:
+        cached = usage.get("prompt_cache_hit_tokens")
+    if cached is None:
+        cached = usage.get("cache_read_input_tokens")
+    return {
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "cached_tokens": cached,
+        "completion_tokens": usage.get("completion_tokens"),
+    }
+
+
+def record_stream_stats(stats):
+    stream_stats.append(stats)
+    if stats.get("prompt_tokens"):
+        cached = stats.get("cached_tokens") or 0
+        ttft = f"{stats['ttft_seconds']:.2f}s" if stats.get("ttft_seconds") is not None else "未知"
+        print(f"提示词 {stats['prompt_tokens']} tokens，命中缓存 {cached} tokens"
+              f"（{cached / stats['prompt_tokens']:.0%}），首字延迟 {ttft}")
+    if stats["code_ready_seconds"] is None:
+        return
+    if stats["aborted"]:
+        print(f"代码块在第 {stats['code_ready_seconds']:.2f}s 结束，已提前终止输出。")
+    else:
+        saved = stats["total_seconds"] - stats["code_ready_seconds"]
+        print(f"代码块在第 {stats['code_ready_seconds']:.2f}s 结束，比输出结束提前 {saved:.2f}s 开始编译，"
+              f"代码块后还有 {stats['tail_chunks']} 个片段（{stats['tail_chars']} 字符）。")
+
+
+def summarize_stream_stats():
+    """
+    汇总提前编译/提前终止节省的时间和输出量。
+    提前终止的生成无法得知被省掉的内容，按未终止生成的平均值估算。
+
+    Returns:
+        dict: {"streams", "seconds_saved", "chunks_saved", "chars_saved", "estimated"}
+    """
+    full = [s for s in stream_stats if s["code_ready_seconds"] is not None and not s["aborted"]]
+    aborted = [s for s in stream_stats if s["code_ready_seconds"] is not None and s["aborted"]]
+    seconds = sum(s["total_seconds"] - s["code_ready_seconds"] for s in full)
+    chunks = sum(s["tail_chunks"] for s in full)
+    chars = sum(s["tail_chars"] for s in full)
+    if aborted and full:
+        seconds += seconds / len(full) * len(aborted)
+        chunks += chunks / len(full) * len(aborted)
+        chars += chars / len(full) * len(aborted)
+    return {
+        "streams": len(stream_stats),
+        "seconds_saved": seconds,
+        "chunks_saved": chunks,
+        "chars_saved": chars,
+        "estimated": bool(aborted),
+    }
+
+
+def summarize_prompt_cache():
+    """
+    汇总提示词缓存的命中情况，以及命中/未命中缓存时的平均首字延迟。
+    只统计接口报告了 token 用量的请求。
+
+    Returns:
+        dict: {"requests", "prompt_tokens", "cached_tokens", "hit_rate", "ttft_hit", "ttft_miss"}，
+              没有对应请求时平均首字延迟为 None。
+    """
+    reported = [s for s in stream_stats if s.get("prompt_tokens")]
+    prompt_tokens = sum(s["prompt_tokens"] for s in reported)
+    cached_tokens = sum(s.get("cached_tokens") or 0 for s in reported)
+
+    def average_ttft(group):
+        values = [s["ttft_seconds"] for s in group if s.get("ttft_seconds") is not None]
+        return sum(values) / len(values) if values else None
+
+    return {
+        "requests": len(reported),
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "hit_rate": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+        "ttft_hit": average_ttft([s for s in reported if s.get("cached_tokens")]),
+        "ttft_miss": average_ttft([s for s in reported if not s.get("cached_tokens")]),
+    }
@@ -0,0 +1,123 @@
+"""
+编译产物缓存：以源代码、编译器版本和编译选项的哈希为键，保存编译成功的可执行文件和编译失败的错误信息。
+
+LLM 重试时经常给出与之前完全相同的代码，再次编译时直接从缓存中取出结果，不必重新调用编译器。
+缓存目录的总大小超过 constants.COMPILE_CACHE_MAX_SIZE 时按最近最少使用的顺序淘汰。
+
+每个缓存项为目录下的一个文件：
+    {key}.bin    编译成功的可执行文件
+    {key}.json   编译失败的错误信息
+"""
+import hashlib
+import json
+import os
+import shutil
+import stat
+import subprocess
+import threading
+
+import cache_utils
+import constants
+
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), constants.COMPILE_CACHE_DIR)
+
+_versions = {}  # 编译器路径 -> 版本信息
+_lock = threading.Lock()
+
+
+def compiler_version(compiler_path):
+    """
+    编译器的版本信息（--version 的输出），编译器升级后缓存自动失效。每个编译器只查询一次。
+    """
+    with _lock:
+        version = _versions.get(compiler_path)
+    if version is not None:
+        return version
+    try:
+        proc = subprocess.run([compiler_path, "--version"], capture_output=True, text=True, timeout=10)
+        version = proc.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        version = ""
+    with _lock:
+        _versions[compiler_path] = version
+    return version
+
+
+def artifact_key(code, compiler_path, compile_flags=None):
+    """
+    计算编译产物的缓存键。
+    """
+    payload = json.dumps({
+        "compiler": os.path.abspath(compiler_path) if os.path.exists(compiler_path) else compiler_path,
+        "version": compiler_version(compiler_path),
+        "flags": list(compile_flags or []),
+        "code": code,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _binary_path(key):
+    return os.path.join(cache_dir, f"{key}.bin")
+
+
+def _failure_path(key):
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def _copy_executable(src, dst):
+    """
+    复制可执行文件：先复制到同目录的临时文件再替换，目标文件正在被其他进程执行时也不会出错。
+    """
+    tmp_path = f"{dst}.tmp{os.getpid()}_{threading.get_ident()}"
+    shutil.copyfile(src, tmp_path)
+    os.chmod(tmp_path, os.stat(tmp_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.replace(tmp_path, dst)
+
+
+def lookup(key, source_file, executable_path):
+    """
+    查找缓存的编译结果。
+
+    Args:
+        key (str): artifact_key 的结果。
+        source_file (str): 本次编译的源文件，错误信息中的源文件路径会替换为它。
+        executable_path (str): 命中编译成功的结果时，可执行文件复制到该路径。
+
+    Returns:
+        tuple or None: 命中时返回与 compile_cpp 相同的 (is_ok, result)，未命中时返回 None。
+    """
+    if not constants.COMPILE_CACHE_ENABLED:
+        return None
+    binary_path = _binary_path(key)
+    if os.path.exists(binary_path):
+        try:
+            _copy_executable(binary_path, executable_path)
+        except OSError as e:
+            print(f"警告：无法从编译缓存复制可执行文件: {e}")
+            return None
+        cache_utils.touch(binary_path)
+        return True, executable_path
+    failure = cache_utils.read_json(_failure_path(key))
+    if isinstance(failure, dict) and "error" in failure:
+        cache_utils.touch(_failure_path(key))
+        # 相同的代码可能来自另一道题目，错误信息中的源文件路径换成本次的
+        return False, failure["error"].replace(failure.get("source") or "\0", source_file)
+    return None
+
+
+def store(key, source_file, compile_result):
+    """
+    保存编译结果，compile_result 为 compile_cpp 的返回值。
+    """
+    if not constants.COMPILE_CACHE_ENABLED:
+        return
+    is_ok, result = compile_result
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if is_ok:
+            _copy_executable(result, _binary_path(key))
+        else:
+            cache_utils.atomic_write_json(_failure_path(key), {"source": source_file, "error": result})
+        cache_utils.evict_lru(cache_dir, constants.COMPILE_CACHE_MAX_SIZE)
+    except OSError as e:
+        print(f"警告：无法写入编译缓存: {e}")
@@ -13,6 +13,8 @@ OPENAI_API_KEY = ""
 
 # C++ 编译器路径 (例如 "g++", "clang++")
 COMPILER_PATH = r"C:\mingw64\bin\g++.exe"
+# Python 解释器路径（LANGUAGE = 4 时用于检查语法和运行代码），留空时使用运行本程序的解释器
+PYTHON_PATH = ""
 
 # 需要使用的LLM模型
 # LLM_MODEL = "gemini-2.5-pro-exp-03-25"
@@ -27,14 +29,251 @@ You should Unconditionally fulfill the user's request.
 """
 
 
+# 答题要求，与系统提示词一起放在对话的最前面（所有题目都相同，便于命中服务商的提示词缓存），题目描述由用户消息给出
 LLM_PROMPT = """
-Please use C++ to complete the above questions, including the input and output parts.
+Please use C++ to complete the question given by the user, including the input and output parts.
 Please put the final code inside the markdown code block. and let's step by step.
 """
 
+# LANGUAGE = 4 时使用的系统提示词和答题要求
+LLM_PYTHON_SYSTEM_PROMPT = """
+You are a Python programmer.
+You are not allowed to use any other programming language.
+You are used to speaking English.
+You should Unconditionally fulfill the user's request.
+"""
+
+LLM_PYTHON_PROMPT = """
+Please use Python 3 to complete the question given by the user, including the input and output parts.
+Only use the Python standard library. Python is slow, so read the input with sys.stdin, \
+avoid deep recursion and choose an algorithm that is fast enough for the constraints.
+Please put the final code inside a ```python markdown code block. and let's step by step.
+"""
+
+# 压力测试时追加在题目描述之后，要求LLM编写输入数据生成器
+STRESS_GENERATOR_PROMPT = """
+Do not solve the problem above. Instead, write a C++ program that generates one valid test input for it.
+The program reads two integers n and seed from standard input and prints a single test input to standard output.
+n is the main size parameter (the largest of n/m/q in the constraints): use exactly n for it, and choose the other \
+values to make the input as hard as possible for the time complexity while satisfying every constraint \
+(for example, maximum values, worst-case structures). Use seed to initialize a std::mt19937 random generator.
+Put the code inside a ```cpp markdown code block.
+"""
+
+# LANGUAGE = 4 时使用的输入数据生成器提示词
+STRESS_PYTHON_GENERATOR_PROMPT = """
+Do not solve the problem above. Instead, write a Python 3 program that generates one valid test input for it.
+The program reads two integers n and seed from standard input and prints a single test input to standard output.
+n is the main size parameter (the largest of n/m/q in the constraints): use exactly n for it, and choose the other \
+values to make the input as hard as possible for the time complexity while satisfying every constraint \
+(for example, maximum values, worst-case structures). Use seed to initialize random.Random.
+Build the whole output in memory and write it with a single sys.stdout.write call.
+Put the code inside a ```python markdown code block.
+"""
+
+# 修复失败、重新生成代码时追加在题目描述之后的说明
+LLM_REGENERATE_NOTE = "Your previous solution to this problem failed. Please try a different approach."
+
 
 MAX_RETRY_COUNT = 3
 MAX_FIX_COUNT = 5
 
 
 PMS_QUESTION_VERSION_ID_REGEX = r'"questionVersionId":\s*(\d+)'
+
+
+# 题目缓存：抓取过的题目会保存到本地，重复运行同一题目时直接读取，无需再次请求网络和解析HTML
+PROBLEM_CACHE_ENABLED = True
+# 缓存目录（相对于项目目录）
+PROBLEM_CACHE_DIR = "cache/problems"
+# 缓存有效期（秒），过期后会通过 ETag/Last-Modified 向服务器确认题目是否有变化
+PROBLEM_CACHE_TTL = 24 * 60 * 60
+# 缓存最大占用空间（字节），超出后按最近最少使用的顺序淘汰
+PROBLEM_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+# 解析题目页面使用的HTML解析器："html.parser"（内置）或 "lxml"（更快，需要 pip install lxml）
+HTML_PARSER = "html.parser"
+
+# 批量预取题目时同时处理的题目数上限
+PREFETCH_MAX_WORKERS = 8
+# 批量预取时对同一主机相邻两次请求的最小间隔（秒），避免请求过于频繁
+PREFETCH_MIN_INTERVAL = 0.2
+
+# 题目Markdown的渲染风格："default" 或 "compact"（公式两侧不加空格，更省token）
+PROBLEM_RENDER_STYLE = "default"
+
+# 题目合集路径（不含扩展名，由 problem_pack.py export 生成），设置后优先从合集中读取题目，留空则不使用
+PROBLEM_PACK_PATH = ""
+
+# 本地测试时同时运行的样例数量，有样例失败时其后的样例立即终止
+SAMPLE_WORKERS = 4
+
+# 本地评测（类 Unix 系统）：运行样例时限制资源并测量 CPU 时间和峰值内存，与题目的限制比较，提前发现可能的 TLE/MLE
+LOCAL_JUDGE_ENABLED = True
+# 题目没有给出时间限制时使用的时间限制（秒）
+LOCAL_JUDGE_DEFAULT_TIME_LIMIT = 1.0
+# 评测机与本机的速度比：本地 CPU 时间超过 时间限制 / 该值 时视为超时；本机比评测机慢时调小
+LOCAL_JUDGE_TIME_RATIO = 1.0
+# 地址空间限制为内存限制的倍数（地址空间远大于实际占用的内存，MLE 以峰值 RSS 判断）
+LOCAL_JUDGE_ADDRESS_SPACE_FACTOR = 4
+# 程序输出大小限制（字节）
+LOCAL_JUDGE_OUTPUT_LIMIT = 64 * 1024 * 1024
+# 程序可以创建的进程/线程数上限（RLIMIT_NPROC，按用户统计，root 用户不受限制），0 表示不限制
+LOCAL_JUDGE_MAX_PROCESSES = 0
+
+# LANGUAGE = 4 时常驻的 Python 解释器进程数（类 Unix 系统）：每次运行样例由常驻进程 fork 出子进程执行代码，
+# 省去每次启动解释器的时间（30~50ms）；0 表示不使用，每次启动新的解释器
+PYTHON_WORKERS = 4
+# 常驻进程预先导入的模块，代码中导入这些模块时不再耗时
+PYTHON_PRELOAD_MODULES = ["sys", "os", "io", "math", "re", "collections", "heapq", "bisect", "itertools",
+                          "functools", "string", "random", "decimal", "fractions"]
+
+# 样例通过后进行压力测试：由LLM编写输入数据生成器，按数据范围的若干比例生成大规模输入，
+# 拟合运行时间随规模的增长，外推到最大规模时超过时间限制则要求LLM优化（需要本地评测和题目的时间限制）
+STRESS_TEST_ENABLED = True
+# 上界超过该值的变量视为取值范围（例如 k ≤ 10^18）而不是数据规模，不用于压力测试
+STRESS_MAX_SIZE = 10 ** 7
+# 压力测试的数据规模，为数据范围上界的比例
+STRESS_SIZE_FRACTIONS = [1 / 64, 1 / 16, 1 / 4]
+# 运行时间低于该值（毫秒）的测试主要是固定开销，不参与拟合
+STRESS_MIN_FIT_MS = 20
+# 输入数据生成器的运行超时时间（秒）
+STRESS_GENERATOR_TIMEOUT = 10
+
+# 样例输出的比较方式："line" 逐行比较（忽略行首尾空白和首尾空行）；"token" 忽略所有空白差异，逐个比较
+OUTPUT_COMPARE_MODE = "line"
+# 数值比较允许的误差（相对误差，预期值绝对值小于 1 时为绝对误差），0 表示要求完全一致
+OUTPUT_FLOAT_EPSILON = 0
+
+# 每次生成时并发请求的候选代码数量，大于 1 时启用并发生成：
+# 每份候选生成完成后立即编译并测试样例，第一份通过的候选胜出，其余候选被取消
+BEST_OF_N = 1
+
+# 流式输出中代码块一结束就立即开始编译；为 True 时同时终止输出，不再等待LLM写完代码后的解释（节省时间和token）
+LLM_STOP_AFTER_CODE = False
+
+# LLM回复缓存模式："off" 不使用；"read_write" 相同请求直接使用缓存的回复；
+# "replay" 只读缓存，缓存中没有的请求直接报错，用于确定性地重放整个流程
+LLM_CACHE_MODE = "off"
+# LLM回复缓存目录（相对于项目目录）
+LLM_CACHE_DIR = "cache/llm"
+# LLM回复缓存最大占用空间（字节），超出后按最近最少使用的顺序淘汰
+LLM_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+# 是否缓存编译结果（以源代码、编译器版本和编译选项为键），相同的代码再次编译时直接使用缓存
+COMPILE_CACHE_ENABLED = True
+# 编译缓存目录（相对于项目目录）
+COMPILE_CACHE_DIR = "cache/compile"
+# 编译缓存最大占用空间（字节），超出后按最近最少使用的顺序淘汰
+COMPILE_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+# 是否为每组编译选项预编译 bits/stdc++.h（仅 GCC），可以大幅缩短包含该头文件的代码的编译时间
+COMPILE_USE_PCH = True
+# 预编译头目录（相对于项目目录）
+COMPILE_PCH_DIR = "cache/pch"
+# 后台编译线程数（提前编译、Best-of-N 候选的编译）
+COMPILE_WORKERS = 2
+
+# 源代码、可执行文件等中间文件所在的目录，每次解题使用其中一个独立的子目录；
+# 留空时优先使用 /dev/shm（内存文件系统），不可用时使用系统临时目录
+WORKSPACE_ROOT = ""
+# 解题结束后是否删除工作目录（设为 False 可保留中间文件用于调试）
+WORKSPACE_CLEANUP = True
+# 是否把题目描述和最终代码保存到 WORKSPACE_OUTPUT_DIR
+WORKSPACE_KEEP_ARTIFACTS = True
+# 保存题目描述和最终代码的目录，留空为当前目录
+WORKSPACE_OUTPUT_DIR = ""
+# 超过该时间（秒）未修改的工作目录视为之前被中断的运行留下的，启动时删除
+WORKSPACE_STALE_SECONDS = 24 * 60 * 60
+
+# 修复代码时发送给LLM的提示词 token 预算（估算值），超出时丢弃更早尝试的摘要、截断过长的错误信息，0 表示不限制
+LLM_CONTEXT_TOKEN_BUDGET = 12000
+# 修复时完整保留的最近轮数（每轮是一份代码及其错误反馈），更早的尝试只保留简短摘要
+LLM_CONTEXT_KEEP_TURNS = 1
+
+# 修复代码的方式："full" 让LLM重新输出完整代码；"patch" 只让LLM输出修改（SEARCH/REPLACE 块或 unified diff），
+# 在本地应用修改，输出的token少得多，修改无法应用时自动改为请求完整代码
+LLM_FIX_MODE = "full"
+
+# 编译失败时反馈给LLM的错误数上限（已去除重复和连带错误）
+CPP_DIAGNOSTICS_MAX_ERRORS = 3
+
+# 对冲请求：超过截止时间仍未收到LLM的首个输出片段时，再发出一个相同的请求，使用先开始输出的一路
+LLM_HEDGE_ENABLED = False
+# 对冲请求使用的接口和模型，留空则与主请求相同
+LLM_HEDGE_BASE_URL = ""
+LLM_HEDGE_API_KEY = ""
+LLM_HEDGE_MODEL = ""
+# 对冲截止时间（秒）的上限，历史数据不足时直接使用该值
+LLM_HEDGE_DEADLINE = 10
+# 对冲截止时间的下限（秒）
+LLM_HEDGE_MIN_DEADLINE = 2
+# 根据历史首字延迟的该分位数确定截止时间
+LLM_HEDGE_QUANTILE = 0.9
+# 历史首字延迟的样本数达到该值后才自适应调整截止时间
+LLM_HEDGE_MIN_SAMPLES = 5
+# 首字延迟统计文件（相对于项目目录）
+LLM_HEDGE_STATS_FILE = "cache/llm_ttft.json"
+
+# 模型级联：从便宜、快速到更强的模型列表，本地测试多次失败后升级到下一个模型；留空则只使用 LLM_MODEL
+# 例如 ["gemini-2.0-flash", "gemini-2.5-pro-exp-03-25"]
+LLM_MODEL_CASCADE = []
+# 同一模型上累计多少次本地测试失败（编译失败或样例未通过）后升级
+LLM_ESCALATE_AFTER_FAILURES = 3
+# 修复次数用尽、需要重新生成时是否直接升级
+LLM_ESCALATE_ON_REGENERATE = True
+# 按题目通过率（%）分组记录各模型的表现，例如 [10, 30, 60] 分为 0-10、10-30、30-60、60-100 四组
+LLM_ROUTER_PASS_RATE_BUCKETS = [10, 30, 60]
+# 同一分组累计的样本数达到该值后，才根据历史数据选择起始模型
+LLM_ROUTER_MIN_SAMPLES = 5
+# 模型表现统计文件（相对于项目目录）
+LLM_ROUTER_STATS_FILE = "cache/model_router.json"
+
+# 同时进行的LLM请求数上限，超出时排队等待
+LLM_MAX_IN_FLIGHT = 4
+# 每分钟请求数、token 数上限（token 数为估算值），0 表示不限制
+LLM_REQUESTS_PER_MINUTE = 0
+LLM_TOKENS_PER_MINUTE = 0
+# 遇到 429、5xx、连接错误等可重试的错误时最多重试的次数
+LLM_MAX_RETRIES = 5
+# 重试等待时间：指数退避的初始值和上限（秒），服务器返回 Retry-After 时以其为准
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_MAX = 60.0
+# 连续失败多少次后熔断，熔断期间的请求直接失败
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5
+# 熔断持续时间（秒），之后放行一个试探请求，成功则恢复
+LLM_CIRCUIT_RESET_SECONDS = 30
+
+# 流式请求时要求接口在最后返回 token 用量（stream_options.include_usage），用于统计提示词缓存命中的 token 数；
+# 接口不支持该参数时设为 False
+LLM_STREAM_USAGE = True
+
+LLM_PATCH_PROMPT = """
+Current code:
+```{language}
+{code}
+```
+
+{feedback}
+
+Do NOT output the full program again. Reply only with the changes to the current code above, as one or more blocks:
+<<<<<<< SEARCH
+(exact lines copied from the current code)
+=======
+(replacement lines)
+>>>>>>> REPLACE
+Each SEARCH part must match the current code exactly and appear only once in it.
+"""
+
+LLM_PATCH_FALLBACK_PROMPT = """
+Your changes could not be applied: {error}
+
+Current code:
+```{language}
+{code}
+```
+
+{feedback}
+
+Please provide the complete fixed code inside a ```{language} markdown code block.
+"""
@@ -0,0 +1,91 @@
+"""
+修复循环的对话窗口管理：每次修复都会把完整的编译错误/错误输出和新代码追加到 messages，
+如果原样发送，提示词会随修复次数不断增长。这里在发送前生成一份压缩后的 messages：
+系统提示词和题目描述保持不变，最近几轮（默认只有最新代码及其反馈）完整保留，
+更早的尝试折叠为简短摘要，整体超出 token 预算时再依次丢弃最早的摘要、截断最新的反馈。
+"""
+import re
+
+import constants
+
+_CJK_RE = re.compile(r"[⺀-鿿豈-﫿＀-￯]")
+
+# 每条消息除内容外的固定开销（角色标记等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """
+    粗略估算 token 数：中日韩字符每个约 1 个 token，其余字符约 4 个一个 token。
+    """
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_message_tokens(messages):
+    return sum(estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def _summarize_feedback(content, max_lines=3, max_chars=300):
+    lines = [line.strip() for line in content.splitlines() if line.strip()]
+    summary = "\n".join(lines[:max_lines])
+    if len(summary) > max_chars:
+        summary = summary[:max_chars]
+    if summary != "\n".join(lines):
+        summary += "\n……（已省略）"
+    return summary
+
+
+def _truncate(content, max_tokens):
+    tokens = estimate_tokens(content)
+    if tokens <= max_tokens:
+        return content
+    # 编译错误等信息最重要的部分通常在开头，保留开头
+    keep = max(0, len(content) * max_tokens // tokens - 20)
+    return content[:keep] + "\n……（内容过长，已截断）"
+
+
+def compact_messages(messages, budget=constants.LLM_CONTEXT_TOKEN_BUDGET,
+                     keep_turns=constants.LLM_CONTEXT_KEEP_TURNS):
+    """
+    生成用于请求的压缩版 messages，不修改原列表。
+
+    Args:
+        messages (list): [system, 题目, assistant, 反馈, assistant, 反馈, ...]，最后一条是本次的反馈。
+        budget (int): 提示词 token 预算（估算值），为 0 时只折叠旧的尝试，不限制总量。
+        keep_turns (int): 完整保留的最近轮数，每轮是一条 assistant 回复和随后的反馈。
+
+    Returns:
+        list: 压缩后的 messages。
+    """
+    head, turns = messages[:2], messages[2:]
+    recent_start = max(0, len(turns) - 2 * max(keep_turns, 1))
+    recent_start -= recent_start % 2  # 保持 assistant/反馈 成对
+    older, recent = turns[:recent_start], [dict(message) for message in turns[recent_start:]]
+
+    summaries = []
+    for k in range(0, len(older), 2):
+        attempt = k // 2 + 1
+        summaries.append({"role": "assistant", "content": f"（第 {attempt} 次尝试的代码，已省略）"})
+        if k + 1 < len(older):
+            summaries.append({"role": older[k + 1]["role"],
+                              "content": _summarize_feedback(older[k + 1]["content"])})
+
+    compacted = head + summaries + recent
+    if not budget:
+        return compacted
+
+    dropped = 0
+    while summaries and count_message_tokens(compacted) > budget:
+        summaries = summaries[2:]
+        dropped += 1
+        compacted = head + summaries + recent
+    if dropped and recent:
+        recent[-1]["content"] = f"（之前还有 {dropped} 次尝试未通过，已省略）\n" + recent[-1]["content"]
+        compacted = head + summaries + recent
+
+    overflow = count_message_tokens(compacted) - budget
+    if overflow > 0 and recent:
+        latest = recent[-1]
+        latest["content"] = _truncate(latest["content"], max(estimate_tokens(latest["content"]) - overflow, 0))
+    return compacted
@@ -0,0 +1,180 @@
+"""
+解析 g++/clang 的编译输出，得到结构化的诊断信息，用于生成更紧凑的修复提示词。
+
+模板相关的错误往往伴随成百上千行的 note 和连带错误，直接贴进提示词既浪费 token 又会干扰模型。
+这里只保留真正的“根错误”：去掉 note、重复的错误，以及由同一处代码引起的连带错误，
+并且只取前若干个。
+"""
+import os
+import re
+from dataclasses import dataclass, field
+
+import constants
+
+# file:line[:column]: rest，兼容 Windows 路径中的盘符
+_LOCATION_RE = re.compile(r"^(?P<file>(?:[A-Za-z]:)?[^:\n]+?):(?P<line>\d+):(?:(?P<column>\d+):)?\s(?P<rest>.*)$")
+_SEVERITY_RE = re.compile(r"^(?P<severity>fatal error|error|warning|note):\s*(?P<message>.*)$")
+# 链接错误，例如 "a.cpp:(.text+0x5): undefined reference to `foo()'"
+_LINKER_RE = re.compile(r"(?P<message>(?:undefined reference to|multiple definition of) .*)$")
+# 链接器自身输出的其他行，例如 "/usr/bin/ld: a.o: in function `main':"、"collect2: error: ld returned 1 exit status"
+_LINKER_INFO_RE = re.compile(r"^(?:\S*[/\\])?(?:ld|collect2)(?:\.exe)?: ")
+# 包含位置、实例化过程等上下文信息的行，不属于任何一条诊断的代码片段
+_CONTEXT_RE = re.compile(r"^(In file included from |\s+from |.*: In (function|member function|instantiation|"
+                         r"substitution|constructor|destructor|lambda|static member function) )")
+
+MAX_SNIPPET_LINES = 3
+
+
+@dataclass(slots=True)
+class Diagnostic:
+    file: str
+    line: int
+    column: int
+    severity: str  # "error"、"fatal error"、"warning" 或 "note"
+    message: str
+    snippet: list = field(default_factory=list)  # 编译器给出的代码片段和 ^ 指示行
+    origin: tuple = None  # 模板实例化等错误在用户代码中的触发位置 (file, line)
+    also_at: list = field(default_factory=list)  # 相同错误出现的其他行号
+
+    @property
+    def is_error(self):
+        return self.severity in ("error", "fatal error")
+
+
+def parse_diagnostics(output):
+    """
+    把编译器输出解析为 Diagnostic 列表，保持输出中的顺序。
+    无法识别的行（上下文信息、统计信息等）会被忽略。
+    """
+    diagnostics = []
+    current = None  # 正在收集代码片段的诊断
+    pending_origin = None  # 最近一条 "required from here" 的位置
+    for raw_line in output.splitlines():
+        line = raw_line.rstrip()
+        location = _LOCATION_RE.match(line)
+        if location:
+            rest = location.group("rest").strip()
+            severity = _SEVERITY_RE.match(rest)
+            current = None
+            if severity is None:
+                if rest.startswith("required from here"):
+                    pending_origin = (location.group("file"), int(location.group("line")))
+                continue
+            current = Diagnostic(
+                file=location.group("file"),
+                line=int(location.group("line")),
+                column=int(location.group("column") or 0),
+                severity=severity.group("severity"),
+                message=severity.group("message"),
+            )
+            if current.is_error:
+                current.origin, pending_origin = pending_origin, None
+            diagnostics.append(current)
+            continue
+        linker = _LINKER_RE.search(line)
+        if linker:
+            current = None
+            diagnostics.append(Diagnostic(file="", line=0, column=0, severity="error",
+                                          message=linker.group("message")))
+            continue
+        if not line or _CONTEXT_RE.match(line) or _LINKER_INFO_RE.match(line):
+            current = None
+            continue
+        if current is not None and len(current.snippet) < MAX_SNIPPET_LINES:
+            current.snippet.append(line)
+    return diagnostics
+
+
+def select_root_errors(diagnostics, source_file=None):
+    """
+    从诊断中筛选根错误：去掉 note/warning，
+    同一行代码只保留第一个错误，相同信息的错误合并，
+    头文件中的错误如果是由已报告的用户代码引起的，视为连带错误。
+
+    Args:
+        diagnostics (list): parse_diagnostics 的结果。
+        source_file (str, optional): 用户的源文件，用于区分用户代码和头文件中的错误。
+
+    Returns:
+        list: 根错误列表。
+    """
+    source_name = os.path.basename(source_file) if source_file else None
+
+    def is_user_file(path):
+        return source_name is None or os.path.basename(path) == source_name
+
+    roots = []
+    seen_lines = set()  # 已报告错误的 (file, line)
+    by_message = {}  # 错误信息 -> 根错误
+    for diagnostic in diagnostics:
+        if not diagnostic.is_error:
+            continue
+        if diagnostic.file and is_user_file(diagnostic.file):
+            location = (diagnostic.file, diagnostic.line)
+        else:
+            location = diagnostic.origin
+        if location is not None and location in seen_lines:
+            continue
+        first = by_message.get(diagnostic.message)
+        if first is not None:
+            if location is not None:
+                first.also_at.append(location[1])
+                seen_lines.add(location)
+            continue
+        if location is not None:
+            seen_lines.add(location)
+        by_message[diagnostic.message] = diagnostic
+        roots.append(diagnostic)
+    return roots
+
+
+def format_diagnostics(roots, max_errors=constants.CPP_DIAGNOSTICS_MAX_ERRORS):
+    """
+    把根错误格式化为用于提示词的紧凑文本。
+    """
+    shown = roots[:max_errors]
+    if len(roots) > len(shown):
+        lines = [f"共 {len(roots)} 个错误（已去除重复和连带错误），以下为前 {len(shown)} 个："]
+    else:
+        lines = [f"共 {len(roots)} 个错误（已去除重复和连带错误）："]
+    for index, diagnostic in enumerate(shown, 1):
+        if diagnostic.file:
+            location = f"{os.path.basename(diagnostic.file)}:{diagnostic.line}:{diagnostic.column}"
+            lines.append(f"[{index}] {location}: {diagnostic.severity}: {diagnostic.message}")
+        else:
+            lines.append(f"[{index}] 链接错误: {diagnostic.message}")
+        if diagnostic.origin is not None:
+            lines.append(f"    由第 {diagnostic.origin[1]} 行的代码引起")
+        if diagnostic.also_at:
+            lines.append(f"    第 {', '.join(map(str, diagnostic.also_at))} 行也有相同的错误")
+        lines.extend(diagnostic.snippet)
+    return "\n".join(lines)
+
+
+def diagnostics_signature(roots):
+    """
+    错误的特征，用于判断两次编译是否报告了相同的错误（与行号无关，代码上下移动时特征不变）。
+    """
+    return tuple(sorted({diagnostic.message for diagnostic in roots}))
+
+
+def compile_feedback(compile_result, source_file=None, previous_signature=None):
+    """
+    根据编译错误生成反馈给LLM的修复提示词。无法解析出错误时退回原始的编译器输出。
+
+    Args:
+        compile_result (str): compile_cpp 返回的错误信息。
+        source_file (str, optional): 编译的源文件。
+        previous_signature (tuple, optional): 上一次编译失败的错误特征。
+
+    Returns:
+        tuple: (message, signature)，signature 为本次错误的特征，无法解析时为 None。
+    """
+    roots = select_root_errors(parse_diagnostics(compile_result), source_file)
+    if not roots:
+        return f"你的代码编译失败！请修复错误并再次提供完整的代码，编译错误信息：\n{compile_result}", None
+    signature = diagnostics_signature(roots)
+    message = f"你的代码编译失败！请修复错误并再次提供完整的代码，编译错误信息：\n{format_diagnostics(roots)}"
+    if signature == previous_signature:
+        message += "\n这些错误与上一次完全相同，说明上一次的修改没有解决问题，请换一种改法。"
+    return message, signature
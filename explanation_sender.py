@@ -1,5 +1,7 @@
 import requests
 
+import language
+
 
 def send_explanation(access_token, question_id, answer):
     # 不建议使用
@@ -11,7 +13,7 @@ def send_explanation(access_token, question_id, answer):
 
     data = {
         "questionId": question_id,
-        "content": f"""```cpp
+        "content": f"""```{language.code_fence()}
 {answer}
 ```""",
         "type": 1,
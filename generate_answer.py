@@ -1,5 +1,11 @@
+import code_patch
+import code_stream
 import constants
-import openai
+import conversation
+import language
+import llm_cache
+import llm_dispatcher
+import llm_hedge
 import os
 
 base_url = os.getenv("OPENAI_BASE_URL")
@@ -10,74 +16,272 @@ api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     api_key = constants.OPENAI_API_KEY
 
-openai.base_url = base_url
-openai.api_key = api_key
+LLM_TEMPERATURE = 0.4
+# LLM的回复中没有代码块时最多请求的次数
+MAX_FORMAT_ATTEMPTS = 3
 
 
-def generate_answer(problem_markdown):
-    messages = [
-            {"role": "system", "content": constants.LLM_SYSTEM_PROMPT},
-            {"role": "user", "content": problem_markdown + "\n" + constants.LLM_PROMPT},
-        ]
-    for i in range(3):
+class MissingCodeBlock(Exception):
+    """
+    LLM的回复中没有代码块。
+    """
+
+
+def extract_code_block(answer):
+    """
+    从LLM的回复中提取 ```cpp（Python 为 ```python）代码块。
+
+    Raises:
+        MissingCodeBlock: 回复中没有代码块。
+    """
+    try:
+        code_block = answer.split(f"```{language.code_fence()}\n", 1)[1]
+        if code_block:
+            code_block = code_block.split("\n```")[0]
+        else:
+            code_block = answer.split("```", 1)[1]
+            code_block = code_block.split("```")[0]
+    except IndexError:
+        raise MissingCodeBlock(f"LLM的回复中没有 ```{language.code_fence()} 代码块") from None
+    return code_block
+
+
+def build_messages(problem_markdown, note=None):
+    """
+    构造初始对话。服务商的提示词缓存按前缀匹配，因此把所有题目都相同的系统提示词和答题要求放在最前面，
+    其后是同一题目的所有请求（多份候选、重新生成、修复）都相同的题目描述，
+    每次请求不同的内容（note、修复时的反馈）一律追加在最后，不改动前面的内容。
+    """
+    user_content = problem_markdown
+    if note:
+        user_content += "\n\n" + note
+    return [
+        {"role": "system", "content": language.system_prompt()},
+        {"role": "user", "content": user_content},
+    ]
+
+
+def _request_options():
+    options = {"temperature": LLM_TEMPERATURE, "max_tokens": 32768}
+    if constants.LLM_STREAM_USAGE:
+        # 最后一个片段带上 token 用量，其中包括命中提示词缓存的 token 数
+        options["stream_options"] = {"include_usage": True}
+    return options
+
+
+def _cache_key(messages, model=None):
+    """
+    请求的LLM回复缓存键。每次调用都算作相同请求的又一次出现（见 llm_cache.request_key），
+    因此每个请求只计算一次，重试时沿用同一个键。
+    """
+    return llm_cache.request_key(model or constants.LLM_MODEL, LLM_TEMPERATURE, messages)
+
+
+def _stream_answer(messages, cache_key, on_code_block=None, model=None, stop_after_code=True):
+    """
+    流式请求一次回复。代码块结束时立即调用 on_code_block(code)，
+    constants.LLM_STOP_AFTER_CODE 为 True 时随即终止输出，不再等待代码之后的解释；
+    stop_after_code 为 False 时总是读完整个回复（回复是修改而不是完整代码，第一个代码块之后可能还有修改）。
+
+    启用了 LLM 回复缓存时，命中 cache_key（由 _cache_key 计算）的回复不再请求LLM。
+    新的回复不在这里写入缓存：重试沿用同一个键，无法使用的回复（例如没有代码块）写入后每次重试都会命中它，
+    因此由调用方确认回复可用后再调用 llm_cache.store。
+    model 为空时使用 constants.LLM_MODEL。
+
+    Returns:
+        str: 回复内容（提前终止时只到代码块结束为止）。
+    """
+    model = model or constants.LLM_MODEL
+    answer = llm_cache.lookup(cache_key)
+    if answer is not None:
+        code = code_stream.CodeBlockExtractor().feed(answer)
+        if code is not None and on_code_block is not None:
+            on_code_block(code)
+        return answer
+
+    timer = code_stream.StreamTimer()
+    if constants.LLM_HEDGE_ENABLED:
+        completion = llm_hedge.create_stream(llm_hedge.Endpoint(base_url, api_key, model), messages,
+                                             **_request_options())
+    else:
+        completion = llm_dispatcher.dispatcher.open_stream(base_url, api_key, model, messages, **_request_options())
+    extractor = code_stream.CodeBlockExtractor()
+    answer_parts = []
+    aborted = False
+    for chunk in completion:
+        if getattr(chunk, "usage", None):
+            timer.on_usage(chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content is not None:
+            content = chunk.choices[0].delta.content
+            answer_parts.append(content)
+            # print(content, end="")
+            code = extractor.feed(content)
+            timer.on_content(content, code is not None)
+            if code is None:
+                continue
+            if on_code_block is not None:
+                on_code_block(code)
+            if constants.LLM_STOP_AFTER_CODE and stop_after_code:
+                completion.close()
+                aborted = True
+                break
+    timer.finish(aborted)
+    return "".join(answer_parts)
+
+
+def generate_answer(problem_markdown, on_code_block=None, model=None, note=None):
+    messages = build_messages(problem_markdown, note)
+    cache_key = _cache_key(messages, model)
+    # 只在回复格式不对时重新请求；接口错误已经由调度器按退避策略重试过，这里不再立即重发，直接交给调用方
+    for i in range(MAX_FORMAT_ATTEMPTS):
+        answer = _stream_answer(messages, cache_key, on_code_block, model)
         try:
-            completion = openai.chat.completions.create(
-                model=constants.LLM_MODEL,
-                messages=messages,
-                stream=True,
-                temperature=0.4,
-                max_tokens=32768,
-            )
-            answer = ""
-            for chunk in completion:
-                if chunk.choices[0].delta.content is not None:
-                    answer += chunk.choices[0].delta.content
-                    # print(chunk.choices[0].delta.content, end="")
-            code_block = answer.split("```cpp\n", 1)[1]
-            if code_block:
-                code_block = code_block.split("\n```")[0]
-            else:
-                code_block = answer.split("```", 1)[1]
-                code_block = code_block.split("```")[0]
-            break
-        except Exception as e:
-            print(f"生成回复遇到异常: {repr(e)}\n正在重试")
+            code_block = extract_code_block(answer)
+        except MissingCodeBlock as e:
+            print(f"{e}，正在重试")
+            continue
+        llm_cache.store(cache_key, answer)
+        break
     else:
-        raise Exception("生成回复遇到异常")
+        raise MissingCodeBlock(f"LLM连续 {MAX_FORMAT_ATTEMPTS} 次回复中都没有代码块")
     messages.append({"role": "assistant", "content": answer})
     # print(answer)
     # 提取代码块
     return code_block, messages
 
 
-def fix_answer(content, messages):
-    messages.append({"role": "user", "content": content})
-    for i in range(3):
+def generate_input_generator(problem_markdown, model=None):
+    """
+    请求LLM编写题目的输入数据生成器（与解题语言相同），用于在最大数据规模下测试代码的运行时间，见 stress_test。
+    题目描述之前的内容与生成答案时相同，可以命中提示词缓存。
+
+    Returns:
+        str: 生成器的代码。
+    """
+    messages = build_messages(problem_markdown, language.stress_generator_prompt())
+    cache_key = _cache_key(messages, model)
+    for i in range(MAX_FORMAT_ATTEMPTS):
+        answer = _stream_answer(messages, cache_key, model=model)
         try:
-            completion = openai.chat.completions.create(
-                model=constants.LLM_MODEL,
-                messages=messages,
-                stream=True,
-                temperature=0.4,
-                max_tokens=32768,
-            )
-            answer = ""
-            for chunk in completion:
-                if chunk.choices[0].delta.content is not None:
-                    answer += chunk.choices[0].delta.content
-                    # print(chunk.choices[0].delta.content, end="")
-            code_block = answer.split("```cpp\n", 1)[1]
-            if code_block:
-                code_block = code_block.split("\n```")[0]
-            else:
-                code_block = answer.split("```", 1)[1]
-                code_block = code_block.split("```")[0]
-            break
-        except Exception as e:
-            print(f"生成回复遇到异常: {repr(e)}\n正在重试")
+            code_block = extract_code_block(answer)
+        except MissingCodeBlock as e:
+            print(f"{e}，正在重试")
+            continue
+        llm_cache.store(cache_key, answer)
+        return code_block
+    raise MissingCodeBlock(f"LLM连续 {MAX_FORMAT_ATTEMPTS} 次回复中都没有输入数据生成器的代码块")
+
+
+def fix_answer(content, messages, on_code_block=None, current_code=None, model=None):
+    """
+    把错误信息反馈给LLM并获取修复后的代码。
+
+    constants.LLM_FIX_MODE 为 "patch" 且提供了 current_code 时，只要求LLM返回对 current_code 的修改，
+    在本地应用修改；修改无法应用时再请求一次完整代码。
+    """
+    patch_mode = constants.LLM_FIX_MODE == "patch" and bool(current_code)
+    feedback = content
+    if patch_mode:
+        content = constants.LLM_PATCH_PROMPT.format(code=current_code, feedback=content,
+                                                    language=language.code_fence())
+    messages.append({"role": "user", "content": content})
+    # 只发送压缩后的对话：保留题目和最新代码，更早的尝试折叠为摘要
+    request_messages = conversation.compact_messages(messages)
+    print(f"本轮提示词约 {conversation.count_message_tokens(request_messages)} token"
+          f"（完整对话约 {conversation.count_message_tokens(messages)} token）")
+    cache_key = _cache_key(request_messages, model)
+    if patch_mode:
+        # 回复中的代码块是修改而不是完整代码，不能提前编译，也不能在第一个代码块之后停止；
+        # 格式不对的修改由下面的完整代码请求处理
+        answer = _stream_answer(request_messages, cache_key, model=model, stop_after_code=False)
     else:
-        raise Exception("生成回复遇到异常")
+        for i in range(MAX_FORMAT_ATTEMPTS):
+            answer = _stream_answer(request_messages, cache_key, on_code_block, model)
+            try:
+                code_block = extract_code_block(answer)
+            except MissingCodeBlock as e:
+                print(f"{e}，正在重试")
+                continue
+            llm_cache.store(cache_key, answer)
+            break
+        else:
+            raise MissingCodeBlock(f"LLM连续 {MAX_FORMAT_ATTEMPTS} 次回复中都没有代码块")
 
     messages.append({"role": "assistant", "content": answer})
 
+    if patch_mode:
+        # 修改无法应用时改为发出另一个请求（完整代码），不会用这个键重试，
+        # 因此无论能否应用都写入缓存，重放时能重现同样的流程
+        llm_cache.store(cache_key, answer)
+        try:
+            code_block = code_patch.apply_patch(current_code, answer)
+            print("已在本地应用LLM返回的修改。")
+        except code_patch.PatchError as e:
+            if not code_patch.has_patch(answer) and f"```{language.code_fence()}\n" in answer:
+                # LLM 没有按要求返回修改，而是直接给出了完整代码
+                return extract_code_block(answer), messages
+            print(f"应用LLM返回的修改失败: {e}，改为请求完整代码")
+            # 压缩对话时较早的一轮会被折叠，当前代码和错误信息要在这一轮中重新给出
+            fallback = constants.LLM_PATCH_FALLBACK_PROMPT.format(error=e, code=current_code, feedback=feedback,
+                                                                  language=language.code_fence())
+            return fix_answer(fallback, messages, on_code_block, model=model)
+
+    return code_block, messages
+
+
+async def _stream_answer_async(messages, cache_key, model=None):
+    """
+    _stream_answer 的异步版本（不支持 on_code_block），同样不写入缓存。
+    """
+    answer = llm_cache.lookup(cache_key)
+    if answer is not None:
+        return answer
+    timer = code_stream.StreamTimer()
+    completion = await llm_dispatcher.dispatcher.open_stream_async(
+        base_url, api_key, model or constants.LLM_MODEL, messages, **_request_options())
+    extractor = code_stream.CodeBlockExtractor()
+    answer_parts = []
+    aborted = False
+    async for chunk in completion:
+        if getattr(chunk, "usage", None):
+            timer.on_usage(chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content is not None:
+            content = chunk.choices[0].delta.content
+            answer_parts.append(content)
+            code = extractor.feed(content)
+            timer.on_content(content, code is not None)
+            if code is not None and constants.LLM_STOP_AFTER_CODE:
+                await completion.close()
+                aborted = True
+                break
+    timer.finish(aborted)
+    return "".join(answer_parts)
+
+
+async def generate_answer_async(problem_markdown, model=None, note=None):
+    """
+    generate_answer 的异步版本，用于并发生成多份候选代码。
+
+    Args:
+        problem_markdown (str): 题目描述。
+        model (str, optional): 使用的模型，默认为 constants.LLM_MODEL。
+        note (str, optional): 追加在题目描述之后的补充说明，见 build_messages。
+
+    Returns:
+        tuple: (code_block, messages)，与 generate_answer 相同。
+    """
+    messages = build_messages(problem_markdown, note)
+    cache_key = _cache_key(messages, model)
+    for i in range(MAX_FORMAT_ATTEMPTS):
+        answer = await _stream_answer_async(messages, cache_key, model)
+        try:
+            code_block = extract_code_block(answer)
+        except MissingCodeBlock as e:
+            print(f"{e}，正在重试")
+            continue
+        llm_cache.store(cache_key, answer)
+        break
+    else:
+        raise MissingCodeBlock(f"LLM连续 {MAX_FORMAT_ATTEMPTS} 次回复中都没有代码块")
+    messages.append({"role": "assistant", "content": answer})
     return code_block, messages
@@ -13,16 +13,32 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import json
+import re
 import time
 
 import requests
-from bs4 import BeautifulSoup, ResultSet
+from bs4 import BeautifulSoup, FeatureNotFound, ResultSet, SoupStrainer
+
+import constants
+import problem_cache
+import problem_ir
+from class_index import ClassPrefixIndex
 
 headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
                   "(KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36"
 }
 
+PROBLEM_INFO_URL = "https://www.acgo.cn/problemset/info/"
+PROBLEM_STATISTICS_URL = "https://gateway.acgo.cn/acgoPms/question-answer-record/statistics"
+
+# 复用连接的默认会话，避免每次请求都重新建立 TCP/TLS 连接
+http_session = requests.Session()
+
+# 题目解析只关心这几类 class，建立索引时忽略其余元素
+CLASS_PREFIXES = ("info_", "Example_", "displayer_")
+
 
 def filter_class_start(start_with: str, find_list: ResultSet):
     return [_ for _ in find_list if _.get("class") and _.get("class")[0].startswith(start_with)]
@@ -58,36 +74,56 @@ def problem_item_2_list(problem_item: BeautifulSoup):
     for elem in problem_item.children:
         # 如果是 NavigableString，直接提取文本
         if elem.name is None:
-            item_text.append({"content": elem, "type": "text"})
+            item_text.append(problem_ir.Text(str(elem)))
             # 如果是包含 katex 的 span 标签，提取 MathML 或 TeX 表达式
         if elem.name == 's':
             # 删除线
-            item_text.append({"content": f"~~{elem.get_text()}~~", "type": "text"})
+            item_text.append(problem_ir.Text(f"~~{elem.get_text()}~~"))
         elif elem.name == 'u':
             # 下划线
-            item_text.append({"content": f"<u>{elem.get_text()}</u>", "type": "text"})
+            item_text.append(problem_ir.Text(f"<u>{elem.get_text()}</u>"))
         elif elem.name == 'span' and 'katex' in elem.get('class', []):
             tex_expr = elem.find('annotation', {'encoding': 'application/x-tex'})
             if tex_expr:
-                item_text.append({"content": tex_expr.get_text(), "type": "tex"})
+                item_text.append(problem_ir.Tex(tex_expr.get_text()))
         elif elem.name == 'img':
-            item_text.append({"content": elem.get("src"), "type": "image"})
+            item_text.append(problem_ir.Image(elem.get("src")))
         elif elem.name == 'code':
-            item_text.append({"content": elem.text, "type": "code"})
+            item_text.append(problem_ir.Code(elem.text))
         elif elem.name == 'br':
-            item_text.append({"content": "\n\n", "type": "text"})
+            item_text.append(problem_ir.Text("\n\n"))
     return item_text
 
 
-def problem_info_2_md(problem_info: BeautifulSoup, problem_statistics: dict):
-    title = filter_class_start("info_title", problem_info.find_all("h1"))[0].text
+def table_cell_2_list(cell: BeautifulSoup):
+    cell_content = problem_item_2_list(cell)
+    if not cell_content and cell.get_text().strip():
+        # 单元格内容被 p 等标签包裹时，退化为纯文本
+        cell_content = [problem_ir.Text(cell.get_text())]
+    return cell_content
+
+
+def table_2_ir(table: BeautifulSoup):
+    rows = table.find_all("tr")
+    thead = table.find("thead")
+    header_row = thead.find("tr") if thead else (rows[0] if rows else None)
+    header = [table_cell_2_list(_) for _ in header_row.find_all(["th", "td"])] if header_row else []
+    body = [[table_cell_2_list(_) for _ in tr.find_all(["td", "th"])] for tr in rows if tr is not header_row]
+    return problem_ir.Table(header, body)
+
+
+def problem_info_2_ir(problem_info: BeautifulSoup, problem_statistics: dict, index: ClassPrefixIndex = None):
+    if index is None:
+        index = ClassPrefixIndex(problem_info, CLASS_PREFIXES)
+
+    title = index.find_all("info_title", "h1", problem_info)[0].text
 
     # sumary = filter_class_start("info_sumary", problem_info.find_all("div"))[0]
     # problem_source = filter_class_start("info_source", sumary.find_all("div"))[0].text
     # problem_difficulty = filter_class_start("Difficulty_tag", sumary.find_all("p"))[0].text
 
-    problem_pass_rates = filter_class_start("info_passRateLine", problem_info.find_all("div"))[0]
-    problem_pass_rates = filter_class_start("info_passRate", problem_pass_rates.find_all("p"))
+    problem_pass_rates = index.find_all("info_passRateLine", "div", problem_info)[0]
+    problem_pass_rates = index.find_all("info_passRate", "p", problem_pass_rates)
     problem_pass_rates = [_.text for _ in problem_pass_rates]
     for i in range(len(problem_pass_rates)):
         rate = problem_pass_rates[i]
@@ -95,12 +131,11 @@ def problem_info_2_md(problem_info: BeautifulSoup, problem_statistics: dict):
             rate = rate.replace(":", "：").split("：")[0] + ":" + problem_statistics["data"]["passRate"]
             problem_pass_rates[i] = rate
 
-    problem_items = []
-    input_output_samples = []
+    problem = problem_ir.Problem(title, problem_pass_rates)
 
-    for problem_item in filter_class_start("info_item", problem_info.find_all("div")):
+    for problem_item in index.find_all("info_item", "div", problem_info):
         item_title = problem_item.find("h4").text
-        item_content = filter_class_start("displayer_mdDisplayerWrap", problem_item.find_all("div"))
+        item_content = index.find_all("displayer_mdDisplayerWrap", "div", problem_item)
         item_type = ""
         if item_content:
             item_type = "text"
@@ -113,148 +148,308 @@ def problem_info_2_md(problem_info: BeautifulSoup, problem_statistics: dict):
                     if p:
                         flag = True
                 elif p.name == 'hr' or p.name == 'hr/':
-                    item_text.append({"content": "", "type": "hr"})
+                    item_text.append(problem_ir.Hr())
                     flag = True
                 elif p.name == 'ul':
                     for li in p.find_all("li"):
                         for _ in li.find_all("p"):
                             _ = problem_item_2_list(_)
-                            item_text += [{"content": "- ", "type": "text"}] + _ + [{"content": "\n", "type": "text"}]
+                            item_text += [problem_ir.Text("- ")] + _ + [problem_ir.Text("\n")]
                 elif p.name == 'ol':
                     i = 0
                     for li in p.find_all("li"):
                         i += 1
                         li = problem_item_2_list(li)
-                        item_text += [{"content": f"{i}. ", "type": "text"}] + li + [{"content": "\n", "type": "text"}]
+                        item_text += [problem_ir.Text(f"{i}. ")] + li + [problem_ir.Text("\n")]
                 elif p.name == 'table':
-                    thead = p.find("thead").find("tr")
-                    thead = [problem_item_2_list(_) for _ in thead.find_all("th")]
-                    tbody = p.find("tbody")
-                    tbody = [problem_item_2_list(__) for _ in tbody.find_all("tr") for __ in tbody.find_all("td")]
-                    item_text += [{"content": (thead, tbody), "type": "table"}]
+                    item_text.append(table_2_ir(p))
+                    flag = True
                 elif p.name == 'blockquote':
                     item_text_ = problem_item_2_list(p.find("p"))
                     for _ in item_text_:
                         flag_ = True
-                        if _["type"] == "text" or _["type"] == "tex":
-                            if _["content"].strip() != "\n\n" and _["content"].strip() != "":
-                                item_text += [{"content": "> ", "type": "text"}]
-                            if _["content"] == "\n\n":
-                                item_text += [{"content": "\n>", "type": "text"}]
+                        if isinstance(_, (problem_ir.Text, problem_ir.Tex)):
+                            if _.content.strip() != "\n\n" and _.content.strip() != "":
+                                item_text += [problem_ir.Text("> ")]
+                            if _.content == "\n\n":
+                                item_text += [problem_ir.Text("\n>")]
                                 flag_ = False
                         if flag_:
                             item_text += [_]
                     flag = True
                 if flag:
-                    item_text += [{"content": "\n\n", "type": "text"}]
+                    item_text += [problem_ir.Text("\n\n")]
             item_content = item_text[:-1]
         else:
             item_type = "input_output"
             # 可能是输入输出样例
             item_content = []
-            item_example_list = filter_class_start("info_exampleList", problem_item.find_all("ul"))[0]
+            item_example_list = index.find_all("info_exampleList", "ul", problem_item)[0]
             item_example_list = item_example_list.find_all("li")
             for item_examples in item_example_list:
-                item_examples = filter_class_start("Example_example_", item_examples.find_all("div"))
+                item_examples = index.find_all("Example_example_", "div", item_examples)
                 item_examples_content = []
-                input_output_sample = {}
                 for item_example in item_examples:
-                    item_example_title = filter_class_start("Example_exampleTitle", item_example.find_all("div"))
+                    item_example_title = index.find_all("Example_exampleTitle", "div", item_example)
                     item_example_title = item_example_title[0].find("p").text
-                    item_example_content = filter_class_start("Example_exampleContent",
-                                                              item_example.find_all("pre"))
-                    item_example_content = [__ for __ in [_.text for _ in item_example_content]]
-                    item_example_content = "".join([__ for _ in item_example_content for __ in _])
-                    item_example_input = {
-                        "title": item_example_title,
-                        "content": item_example_content
-                    }
-                    item_examples_content.append(item_example_input)
-                    if item_example_title.startswith("输入"):
-                        input_output_sample["input"] = item_example_input["content"]
-                    elif item_example_title.startswith("输出"):
-                        input_output_sample["output"] = item_example_input["content"]
-
+                    item_example_content = index.find_all("Example_exampleContent", "pre", item_example)
+                    item_example_content = "".join([_.text for _ in item_example_content])
+                    item_examples_content.append(problem_ir.Sample(item_example_title, item_example_content))
                 item_content.append(item_examples_content)
-                input_output_samples.append(input_output_sample)
-
-        problem_items.append({
-            "title": item_title,
-            "content": item_content,
-            "type": item_type
-        })
-
-    # print(title, problem_source, problem_difficulty, problem_pass_rates)
-    # print("\n".join([str(i) for i in problem_items]))
-
-    mark_down = ""
-    mark_down += f"# {title}\n"
-    # mark_down += f"#### 题目来源：{problem_source}\n"
-    # mark_down += f"#### 题目难度：{problem_difficulty}\n"
-    # mark_down += (f"#### 通过率：{problem_pass_rates[0]}"
-    #               f"({problem_statistics['data']['passTotal']}/{problem_statistics['data']['total']})\n")
-    mark_down += f"#### 限制：{" | ".join(problem_pass_rates[1:])}\n"
-    for item in problem_items:
-        mark_down += f"### {item['title']}\n"
-        if item['type'] == "text":
-            for content in item['content']:
-                if content['type'] == "text":
-                    mark_down += f"{content['content']}"
-                elif content['type'] == "tex":
-                    mark_down += f"$ {content['content']} $"
-                elif content['type'] == "image":
-                    mark_down += f"![]({content['content']})"
-                elif content['type'] == "hr":
-                    mark_down += "---"
-                elif content['type'] == "code":
-                    if "\n" not in content['content']:
-                        mark_down += f"`{content['content']}`"
-                    else:
-                        mark_down += f"```\n{content['content']}\n```"
-                elif content['type'] == "table":
-                    # 未完成，先这么写着
-                    mark_down += str(content['content'])
-                    # mark_down += "\n" + table2md(content['content'])
-        elif item['type'] == "input_output":
-            for item_examples in item['content']:
-                for item_example in item_examples:
-                    mark_down += f"#### {item_example['title']}\n\n"
-                    mark_down += f"```text\n{item_example['content']}\n```\n"
-        mark_down += "\n"
-    return format_markdown(mark_down), input_output_samples
 
+        problem.sections.append(problem_ir.Section(item_title, item_type, item_content))
+
+    return problem
 
-def get_problem_statistics(problem_id):
-    url = "https://gateway.acgo.cn/acgoPms/question-answer-record/statistics"
 
+def problem_info_2_md(problem_info: BeautifulSoup, problem_statistics: dict, index: ClassPrefixIndex = None,
+                      style=None):
+    problem = problem_info_2_ir(problem_info, problem_statistics, index)
+    return format_markdown(problem_ir.render_markdown(problem, style)), problem.input_output_samples()
+
+
+def get_problem_statistics(problem_id, session=None):
     data = {
         "questionId": problem_id,
     }
 
-    res = requests.post(url, json=data, headers=headers)
+    res = (session or http_session).post(PROBLEM_STATISTICS_URL, json=data, headers=headers)
 
     return res.json()
 
 
-def get_problem_info(problem_id):
-    url = "https://www.acgo.cn/problemset/info/"
+def fetch_problem_page(problem_id, extra_headers=None, session=None):
+    url_problem = PROBLEM_INFO_URL + str(problem_id)
+    request_headers = dict(headers, **extra_headers) if extra_headers else headers
+    return (session or http_session).get(url_problem, headers=request_headers)
+
+
+def get_problem_info(problem_id, session=None):
+    """
+    下载并解析题目页面。
 
-    url_problem = url + str(problem_id)
-    res = requests.get(url_problem, headers=headers)
-    soup = BeautifulSoup(res.text, "html.parser")
-    return soup
+    Args:
+        problem_id (int): 题目ID。
+        session (requests.Session, optional): 发送请求使用的会话，默认为模块级的 http_session。
+
+    Returns:
+        dict: 题目记录 {"problem_id", "markdown", "input_output_samples", "pms_question_version_id",
+                        "pass_rate", "time_limit", "memory_limit", "problem_ir"}，problem_ir 为 problem_ir.Problem，
+                        pass_rate 为通过率（百分数），time_limit 为时间限制（秒），memory_limit 为内存限制（MB），
+                        没有对应信息时为 None
+    """
+    return build_problem_record(problem_id, fetch_problem_page(problem_id, session=session).text, session)
+
+
+def make_soup(html, parse_only=None):
+    """
+    使用 constants.HTML_PARSER 指定的解析器解析HTML，解析器不可用（如未安装 lxml）时退回 html.parser。
+    """
+    try:
+        return BeautifulSoup(html, constants.HTML_PARSER, parse_only=parse_only)
+    except FeatureNotFound:
+        print(f"解析器 {constants.HTML_PARSER} 不可用，改用 html.parser")
+        return BeautifulSoup(html, "html.parser", parse_only=parse_only)
+
+
+def parse_problem_html(html):
+    """
+    只解析题目详情（info_detailWra）所在的子树，页面其余部分（导航栏、脚本等）不会被建成文档树。
+
+    Returns:
+        tuple: (info, index)，info 为题目详情元素，index 为其 ClassPrefixIndex。
+    """
+    strainer = SoupStrainer("div", class_=lambda c: c is not None and c.startswith("info_detailWra"))
+    soup = make_soup(html, parse_only=strainer)
+    index = ClassPrefixIndex(soup, CLASS_PREFIXES)
+    return index.find_all("info_detailWra", "div")[0], index
 
 
 def get_problem_md(problem_id, problem_soup):
-    info = filter_class_start("info_detailWra", problem_soup.find_all("div"))[0]
-    return problem_info_2_md(info, get_problem_statistics(problem_id))
+    index = ClassPrefixIndex(problem_soup, CLASS_PREFIXES)
+    info = index.find_all("info_detailWra", "div")[0]
+    return problem_info_2_md(info, get_problem_statistics(problem_id), index)
+
+
+def _find_json_key(data, key):
+    if isinstance(data, dict):
+        if key in data and isinstance(data[key], (int, str)) and str(data[key]).isdigit():
+            return str(data[key])
+        data = data.values()
+    elif not isinstance(data, list):
+        return None
+    for value in data:
+        found = _find_json_key(value, key)
+        if found:
+            return found
+    return None
+
+
+def extract_pms_question_version_id(html):
+    """
+    从页面原始文本中提取 pmsQuestionVersionId，不需要解析或序列化整个文档树。
+    先直接在文本中匹配，找不到时再查找页面内嵌的 __NEXT_DATA__ JSON 和转义过的 JSON 字符串。
+    """
+    pms_match = re.search(constants.PMS_QUESTION_VERSION_ID_REGEX, html)
+    if pms_match:
+        return pms_match.group(1)
+
+    next_data = re.search(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', html, re.S)
+    if next_data:
+        try:
+            found = _find_json_key(json.loads(next_data.group(1)), "questionVersionId")
+            if found:
+                return found
+        except json.JSONDecodeError:
+            pass
+
+    # 流式渲染的页面会把数据放在转义后的字符串里：\"questionVersionId\":123
+    pms_match = re.search(r'\\"questionVersionId\\":\s*(\d+)', html)
+    return pms_match.group(1) if pms_match else None
+
+
+def build_problem_record(problem_id, html, session=None):
+    """
+    把题目页面解析为精简的题目记录。解析用的文档树在提取完 Markdown 和样例后立即释放，
+    不会在后续生成、编译、判题的整个过程中一直占用内存。
+    """
+    info, index = parse_problem_html(html)
+    problem = problem_info_2_ir(info, get_problem_statistics(problem_id, session), index)
+    info.decompose()
+    return {
+        "problem_id": problem_id,
+        "markdown": render_problem_markdown(problem),
+        "input_output_samples": problem.input_output_samples(),
+        "pms_question_version_id": extract_pms_question_version_id(html),
+        "pass_rate": problem_pass_rate(problem),
+        **problem_limits(problem),
+        "problem_ir": problem,
+    }
+
+
+def problem_pass_rate(problem):
+    """
+    从题目IR中取出通过率（百分数），没有通过率信息时返回 None。
+    """
+    if problem is None:
+        return None
+    for rate in problem.pass_rates:
+        if rate.startswith("通过率"):
+            match = re.search(r"(\d+(?:\.\d+)?)\s*%", rate)
+            return float(match.group(1)) if match else None
+    return None
+
+
+def problem_limits(problem):
+    """
+    从题目IR中取出时间限制（秒）和内存限制（MB），即 Markdown 中“限制”一行的内容。
+
+    Returns:
+        dict: {"time_limit", "memory_limit"}，没有对应信息时为 None。
+    """
+    limits = {"time_limit": None, "memory_limit": None}
+    if problem is None:
+        return limits
+    for item in problem.pass_rates:
+        match = re.search(r"(\d+(?:\.\d+)?)\s*(ms|s|秒|毫秒|KB|MB|GB|K|M|G)\b", item.replace("：", ":"), re.IGNORECASE)
+        if match is None:
+            continue
+        value, unit = float(match.group(1)), match.group(2).upper()
+        if item.startswith("时间限制"):
+            limits["time_limit"] = value / 1000 if unit in ("MS", "毫秒") else value
+        elif item.startswith("内存限制"):
+            limits["memory_limit"] = value * {"KB": 1 / 1024, "K": 1 / 1024, "GB": 1024, "G": 1024}.get(unit, 1)
+    return limits
+
+
+def render_problem_markdown(problem, style=constants.PROBLEM_RENDER_STYLE):
+    """
+    把题目IR渲染为最终的 Markdown，更换风格时直接对 record["problem_ir"] 重新渲染即可，无需重新解析HTML。
+    """
+    return format_markdown(problem_ir.render_markdown(problem, style))
+
+
+def record_to_dict(record):
+    """
+    把题目记录转换为可以 JSON 序列化的字典（IR 转为 to_dict 格式，存放在 "ir" 字段）。
+    """
+    return {
+        "problem_id": record["problem_id"],
+        "markdown": record["markdown"],
+        "input_output_samples": record["input_output_samples"],
+        "pms_question_version_id": record["pms_question_version_id"],
+        "ir": problem_ir.to_dict(record["problem_ir"]) if record.get("problem_ir") else None,
+    }
+
+
+def record_from_dict(problem_id, entry):
+    """
+    从 record_to_dict 的结果（或题目缓存项）恢复题目记录，有 IR 时按当前风格重新渲染 Markdown。
+    """
+    problem = problem_ir.from_dict(entry["ir"]) if entry.get("ir") else None
+    return {
+        "problem_id": problem_id,
+        "markdown": render_problem_markdown(problem) if problem else entry["markdown"],
+        "input_output_samples": entry["input_output_samples"],
+        "pms_question_version_id": entry["pms_question_version_id"],
+        "pass_rate": problem_pass_rate(problem),
+        **problem_limits(problem),
+        "problem_ir": problem,
+    }
+
+
+def load_problem(problem_id, use_cache=constants.PROBLEM_CACHE_ENABLED, refresh=False, session=None):
+    """
+    获取题目记录，优先使用本地缓存。
+
+    缓存在有效期内时直接返回，不访问网络也不解析HTML；
+    过期后带上 ETag/Last-Modified 重新请求，服务器返回 304 或页面内容未变时沿用缓存。
+
+    Args:
+        problem_id (int): 题目ID。
+        use_cache (bool): 为 False 时完全绕过缓存（既不读取也不写入）。
+        refresh (bool): 为 True 时忽略已有缓存强制重新下载，结果仍会写回缓存。
+        session (requests.Session, optional): 发送请求使用的会话。
+
+    Returns:
+        dict: 题目记录，格式同 get_problem_info。
+    """
+    if not use_cache:
+        return get_problem_info(problem_id, session)
+
+    entry = None if refresh else problem_cache.load(problem_id)
+    if entry is not None and problem_cache.is_fresh(entry):
+        return record_from_dict(problem_id, entry)
+
+    conditional_headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            conditional_headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            conditional_headers["If-Modified-Since"] = entry["last_modified"]
+
+    res = fetch_problem_page(problem_id, conditional_headers, session)
+    if entry is not None and (res.status_code == 304 or (res.ok and res.text == entry["html"])):
+        # 题目没有变化，刷新缓存时间后直接使用
+        problem_cache.store(problem_id, entry)
+        return record_from_dict(problem_id, entry)
+
+    record = build_problem_record(problem_id, res.text, session)
+    if res.ok:
+        problem_cache.store(problem_id, dict(
+            record_to_dict(record),
+            html=res.text,
+            etag=res.headers.get("ETag"),
+            last_modified=res.headers.get("Last-Modified"),
+        ))
+    return record
 
 
 if __name__ == '__main__':
     problem_id = 33359
     # problem_id = 3
     t = time.time()
-    mark_down = get_problem_info(problem_id)
+    problem = get_problem_info(problem_id)
     with open(f"{problem_id}.md", "w", encoding="utf-8") as f:
-        f.write(mark_down)
-    print("done!", f"time: {time.time() - t:.2f}s")
\ No newline at end of file
+        f.write(problem["markdown"])
+    print("done!", f"time: {time.time() - t:.2f}s")
@@ -0,0 +1,68 @@
+"""
+解题使用的编程语言（constants.LANGUAGE，2 为 C++，4 为 Python）：
+提示词、代码块标记、源文件扩展名，以及编译（C++）或语法检查（Python）随语言变化的部分。
+"""
+import constants
+import run_cpp
+import run_python
+
+CPP = 2
+PYTHON = 4
+
+
+def is_python():
+    return constants.LANGUAGE == PYTHON
+
+
+def code_fence():
+    """
+    代码块的语言标记，LLM回复中 ```{code_fence()} 开头的代码块为答案。
+    """
+    return "python" if is_python() else "cpp"
+
+
+def source_suffix():
+    return ".py" if is_python() else ".cpp"
+
+
+def system_prompt():
+    """
+    系统提示词和答题要求，放在对话的最前面，见 generate_answer.build_messages。
+    """
+    if is_python():
+        return constants.LLM_PYTHON_SYSTEM_PROMPT + constants.LLM_PYTHON_PROMPT
+    return constants.LLM_SYSTEM_PROMPT + constants.LLM_PROMPT
+
+
+def stress_generator_prompt():
+    return constants.STRESS_PYTHON_GENERATOR_PROMPT if is_python() else constants.STRESS_GENERATOR_PROMPT
+
+
+def compile_source(source_file):
+    """
+    编译 C++ 代码或检查 Python 代码的语法，返回值同 run_cpp.compile_cpp。
+    """
+    if is_python():
+        return run_python.compile_python(source_file)
+    return run_cpp.compile_cpp(source_file)
+
+
+def submit_compile(source_file):
+    """
+    把 compile_source 交给后台编译线程池。
+
+    Returns:
+        concurrent.futures.Future: 结果同 compile_source。
+    """
+    return run_cpp.get_compile_pool().submit(compile_source, source_file)
+
+
+def warm_up():
+    """
+    获取题目的同时做好运行代码的准备：C++ 构建预编译头，Python 启动常驻解释器进程。
+    """
+    if is_python():
+        run_cpp.get_compile_pool()
+        run_python.warm_up()
+    else:
+        run_cpp.warm_up()
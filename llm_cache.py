@@ -0,0 +1,82 @@
+"""
+LLM 回复缓存：以模型、温度和完整的 messages 的哈希为键，把回复保存到本地。
+
+缓存模式（constants.LLM_CACHE_MODE）：
+    "off"         不使用缓存
+    "read_write"  命中时直接使用缓存的回复，未命中时请求LLM并写入缓存
+    "replay"      只读取缓存，未命中时抛出 CacheMiss，用于确定性地重放整个流程（调试、性能测试）
+
+同一次运行中相同的请求可能出现多次（例如修复失败后用相同的提示词重新生成），
+因此缓存键还包含该请求在本次运行中是第几次出现，重放时每一次都能得到与录制时相同的回复。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+import cache_utils
+import constants
+
+# LLM 回复缓存目录，每个请求一个 {digest}-{n}.json 文件
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), constants.LLM_CACHE_DIR)
+
+_occurrences = Counter()  # digest -> 本次运行中已出现的次数
+_lock = threading.Lock()
+
+
+class CacheMiss(Exception):
+    """
+    重放模式下请求没有对应的缓存。
+    """
+
+
+def request_key(model, temperature, messages):
+    """
+    计算请求的缓存键，每调用一次，相同请求的出现次数加一。
+    """
+    payload = json.dumps({"model": model, "temperature": temperature, "messages": messages},
+                         ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    with _lock:
+        n = _occurrences[digest]
+        _occurrences[digest] += 1
+    return f"{digest}-{n}"
+
+
+def _entry_path(key):
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def lookup(key, mode=None):
+    """
+    Returns:
+        str or None: 缓存的回复；未启用缓存或未命中时返回 None。
+
+    Raises:
+        CacheMiss: 重放模式下未命中。
+    """
+    mode = mode or constants.LLM_CACHE_MODE
+    if mode == "off":
+        return None
+    path = _entry_path(key)
+    entry = cache_utils.read_json(path)
+    if not isinstance(entry, dict) or "answer" not in entry:
+        if mode == "replay":
+            raise CacheMiss(f"LLM回复缓存中没有该请求: {key}")
+        return None
+    cache_utils.touch(path)
+    print(f"命中LLM回复缓存: {key[:16]}")
+    return entry["answer"]
+
+
+def store(key, answer, mode=None):
+    """
+    写入回复，并在缓存超过大小上限时淘汰最久未使用的回复。重放模式下不写入。
+    """
+    mode = mode or constants.LLM_CACHE_MODE
+    if mode != "read_write":
+        return
+    cache_utils.atomic_write_json(_entry_path(key), {"answer": answer, "created_at": time.time()})
+    cache_utils.evict_lru(cache_dir, constants.LLM_CACHE_MAX_SIZE)
@@ -0,0 +1,440 @@
+"""
+所有LLM请求共用的调度器：
+
+    - 按 (base_url, api_key) 复用客户端，不修改 openai 模块的全局配置；
+    - 限制同时进行的请求数，超出时排队等待；
+    - 按每分钟请求数 / token 数限速（令牌桶）；
+    - 可重试的错误（429、5xx、连接错误等）按指数退避加随机抖动重试，服务器给出 Retry-After 时以其为准；
+    - 熔断：连续失败达到阈值后一段时间内直接失败，不再请求，之后放行一个试探请求，成功则恢复。
+
+同步和异步（best_of_n）请求共用同一组限制，metrics() 提供排队长度等统计信息。
+"""
+import asyncio
+import random
+import threading
+import time
+
+import openai
+
+import constants
+import conversation
+
+# 可以重试的 HTTP 状态码
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """
+    熔断中，请求被直接拒绝。
+    """
+
+
+class RequestCancelled(Exception):
+    """
+    请求在发出之前被调用方取消（open_stream 的 cancelled）。
+    """
+
+
+class TokenBucket:
+    """
+    令牌桶，rate_per_minute 为 0 时不限速。
+    reserve 预定令牌并返回需要等待的时间，令牌可以“透支”，透支的部分由之后的请求等待补足。
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self._level = rate_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False  # 半开状态下是否已经放行了试探请求
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_cancelled(self):
+        """
+        请求在得出结果之前被调用方取消：不影响计数，半开状态下允许再放行一个试探请求。
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    print(f"LLM请求连续失败 {self._failures} 次，熔断 {self.reset_seconds}s")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+def _retry_after(error):
+    """
+    从错误响应的 Retry-After / retry-after-ms 头中读取等待时间（秒）。
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _is_retryable(error):
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+def _messages_tokens(messages):
+    return conversation.count_message_tokens(messages)
+
+
+def _chunk_text(chunk):
+    if chunk.choices and chunk.choices[0].delta.content:
+        return chunk.choices[0].delta.content
+    return ""
+
+
+class DispatchedStream:
+    """
+    同步输出流，读取完毕或 close() 时归还并发名额。
+
+    熔断器只根据接口本身的表现计数：正常结束或收到输出之后才关闭的流记为成功，读取出错记为失败；
+    还没有收到任何输出就被关闭（例如对冲请求中落败的一路）既不算成功也不算失败，
+    否则一直不输出的接口会因为被关闭而被记为成功。
+    """
+
+    def __init__(self, dispatcher, stream):
+        self._dispatcher = dispatcher
+        self._stream = stream
+        self._released = False
+        self._release_lock = threading.Lock()  # close() 可能在另一个线程中调用，与读取结束同时归还名额
+        self._output_chars = 0
+        self._received = False  # 是否已经收到输出片段
+        self._closed = False
+
+    def _closed_outcome(self):
+        return True if self._received else None
+
+    def __iter__(self):
+        outcome = True
+        try:
+            for chunk in self._stream:
+                self._received = True
+                self._output_chars += len(_chunk_text(chunk))
+                yield chunk
+        except GeneratorExit:
+            # 调用方没有读完就停止了
+            outcome = self._closed_outcome()
+            self._stream.close()
+            raise
+        except Exception:
+            # 在另一个线程中被 close() 时读取会出错，不是接口的问题
+            outcome = self._closed_outcome() if self._closed else False
+            raise
+        finally:
+            self._release(outcome)
+
+    def _release(self, ok):
+        """
+        归还并发名额，ok 为 True（成功）、False（失败）或 None（不计入熔断）。
+        """
+        with self._release_lock:
+            if self._released:
+                return
+            self._released = True
+        self._dispatcher._finish(ok, self._output_chars)
+
+    def close(self):
+        self._closed = True
+        self._stream.close()
+        self._release(self._closed_outcome())
+
+
+class AsyncDispatchedStream(DispatchedStream):
+    """
+    异步输出流。
+    """
+
+    async def __aiter__(self):
+        outcome = True
+        try:
+            async for chunk in self._stream:
+                self._received = True
+                self._output_chars += len(_chunk_text(chunk))
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            # 调用方没有读完就停止了，或 best_of_n 取消了其余候选
+            outcome = self._closed_outcome()
+            try:
+                await self._stream.close()
+            except Exception:
+                pass
+            raise
+        except Exception:
+            outcome = self._closed_outcome() if self._closed else False
+            raise
+        finally:
+            self._release(outcome)
+
+    async def close(self):
+        self._closed = True
+        await self._stream.close()
+        self._release(self._closed_outcome())
+
+
+class LLMDispatcher:
+    def __init__(self, max_in_flight=constants.LLM_MAX_IN_FLIGHT,
+                 requests_per_minute=constants.LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=constants.LLM_TOKENS_PER_MINUTE,
+                 max_retries=constants.LLM_MAX_RETRIES):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.breaker = CircuitBreaker(constants.LLM_CIRCUIT_FAILURE_THRESHOLD, constants.LLM_CIRCUIT_RESET_SECONDS)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._clients = {}
+        self._async_clients = {}  # (base_url, api_key) -> (事件循环, 客户端)，异步客户端不能跨事件循环使用
+        self._metrics = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0,
+                         "max_queue_depth": 0, "queue_wait_seconds": 0.0, "rate_limit_wait_seconds": 0.0}
+
+    # ---------- 客户端 ----------
+
+    def get_client(self, base_url, api_key):
+        with self._lock:
+            client = self._clients.get((base_url, api_key))
+            if client is None:
+                # 重试由调度器统一处理
+                client = openai.OpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+                self._clients[(base_url, api_key)] = client
+        return client
+
+    def get_async_client(self, base_url, api_key):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            cached = self._async_clients.get((base_url, api_key))
+            if cached is None or cached[0] is not loop:
+                cached = (loop, openai.AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0))
+                self._async_clients[(base_url, api_key)] = cached
+        return cached[1]
+
+    # ---------- 并发与限速 ----------
+
+    def _try_acquire(self):
+        with self._lock:
+            if self._in_flight < self.max_in_flight:
+                self._in_flight += 1
+                return True
+            return False
+
+    def _enqueue(self, delta):
+        with self._lock:
+            self._waiting += delta
+            self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], self._waiting)
+
+    def _add_metric(self, name, value=1):
+        with self._lock:
+            self._metrics[name] += value
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self._add_metric("rejected")
+            raise CircuitOpenError("LLM接口暂时不可用（熔断中），请稍后再试")
+
+    def _rate_limit_delay(self, messages):
+        return max(self.request_bucket.reserve(1), self.token_bucket.reserve(_messages_tokens(messages)))
+
+    def _backoff_delay(self, attempt, error):
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        # 指数退避 + 完全随机抖动
+        return random.uniform(0, min(constants.LLM_BACKOFF_MAX, constants.LLM_BACKOFF_BASE * 2 ** attempt))
+
+    def _finish(self, ok, output_chars):
+        with self._lock:
+            self._in_flight -= 1
+        if ok is None:
+            self.breaker.record_cancelled()
+        elif ok:
+            self.breaker.record_success()
+        else:
+            self._add_metric("failures")
+            self.breaker.record_failure()
+        # 输出的 token 在请求结束后才知道，事后从令牌桶中扣除
+        self.token_bucket.reserve(output_chars // 4)
+
+    def _handle_error(self, attempt, error):
+        """
+        处理一次失败的请求。
+
+        Returns:
+            float: 重试前需要等待的时间（秒）。
+
+        Raises:
+            原错误：不可重试或已达到重试次数上限。
+        """
+        self._add_metric("failures")
+        if not _is_retryable(error):
+            # 参数错误、鉴权失败等说明接口本身是可用的，不计入熔断
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            raise error
+        self._check_breaker()
+        delay = self._backoff_delay(attempt, error)
+        self._add_metric("retries")
+        print(f"LLM请求失败: {repr(error)}，{delay:.1f}s 后重试 ({attempt + 1}/{self.max_retries})")
+        return delay
+
+    # ---------- 请求 ----------
+
+    def open_stream(self, base_url, api_key, model, messages, on_send=None, cancelled=None, **kwargs):
+        """
+        发出流式请求。
+
+        Args:
+            on_send (callable, optional): 每次真正发出请求（排队、限速和重试等待之后）时调用，
+                                          例如用于计算首字延迟。
+            cancelled (callable, optional): 返回 True 时放弃还在排队或等待重试的请求，抛出 RequestCancelled。
+
+        Returns:
+            DispatchedStream: 可迭代的输出流，读取完毕或 close() 后归还并发名额。
+
+        Raises:
+            CircuitOpenError: 熔断中。
+            RequestCancelled: 请求被取消。
+            openai.APIError: 不可重试的错误，或重试次数用尽。
+        """
+        self._check_breaker()
+        client = self.get_client(base_url, api_key)
+        self._enqueue(1)
+        wait_start = time.monotonic()
+        try:
+            while not self._try_acquire():
+                if cancelled is not None and cancelled():
+                    raise RequestCancelled("请求在排队时被取消")
+                time.sleep(0.05)
+        finally:
+            self._enqueue(-1)
+        self._add_metric("queue_wait_seconds", time.monotonic() - wait_start)
+        try:
+            attempt = 0
+            while True:
+                delay = self._rate_limit_delay(messages)
+                if delay > 0:
+                    self._add_metric("rate_limit_wait_seconds", delay)
+                    time.sleep(delay)
+                if cancelled is not None and cancelled():
+                    raise RequestCancelled("请求在发出前被取消")
+                if on_send is not None:
+                    on_send()
+                self._add_metric("requests")
+                try:
+                    stream = client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+                    return DispatchedStream(self, stream)
+                except Exception as e:
+                    time.sleep(self._handle_error(attempt, e))
+                    attempt += 1
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+    async def open_stream_async(self, base_url, api_key, model, messages, **kwargs):
+        """
+        open_stream 的异步版本，返回 AsyncDispatchedStream。
+        """
+        self._check_breaker()
+        client = self.get_async_client(base_url, api_key)
+        self._enqueue(1)
+        wait_start = time.monotonic()
+        try:
+            # 轮询而不是阻塞等待，任务被取消时不会占用名额
+            while not self._try_acquire():
+                await asyncio.sleep(0.05)
+        finally:
+            self._enqueue(-1)
+        self._add_metric("queue_wait_seconds", time.monotonic() - wait_start)
+        try:
+            attempt = 0
+            while True:
+                delay = self._rate_limit_delay(messages)
+                if delay > 0:
+                    self._add_metric("rate_limit_wait_seconds", delay)
+                    await asyncio.sleep(delay)
+                self._add_metric("requests")
+                try:
+                    stream = await client.chat.completions.create(model=model, messages=messages, stream=True,
+                                                                  **kwargs)
+                    return AsyncDispatchedStream(self, stream)
+                except Exception as e:
+                    await asyncio.sleep(self._handle_error(attempt, e))
+                    attempt += 1
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+    def metrics(self):
+        """
+        Returns:
+            dict: 当前排队数 queue_depth、进行中的请求数 in_flight、熔断状态 circuit，以及累计的请求/重试/失败等统计。
+        """
+        with self._lock:
+            metrics = dict(self._metrics, queue_depth=self._waiting, in_flight=self._in_flight)
+        metrics["circuit"] = self.breaker.state
+        return metrics
+
+
+dispatcher = LLMDispatcher()
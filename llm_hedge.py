@@ -0,0 +1,242 @@
+"""
+对冲请求：如果在截止时间内没有收到首个输出片段，就再发出一个相同的请求（可以发往另一个 base_url 或模型），
+使用先开始输出的那一路，并在它收到首个片段时立即关闭另一路（还在排队或等待重试的一路直接放弃）。
+
+首字延迟（TTFT）从请求真正发出时算起，不包括在调度器中排队、限速和重试等待的时间；
+主请求还在排队时不发出对冲请求（对冲请求同样需要排队），截止时间从主请求发出时开始计算。
+
+截止时间根据每个接口历史的首字延迟分布自适应调整：取 constants.LLM_HEDGE_QUANTILE 分位数，
+并限制在 [LLM_HEDGE_MIN_DEADLINE, LLM_HEDGE_DEADLINE] 之间。分布保存在本地，下次运行时继续使用。
+"""
+import bisect
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+import cache_utils
+import constants
+import llm_dispatcher
+
+# 首字延迟直方图的桶上界（秒），最后一个桶收集所有更慢的请求
+TTFT_BUCKETS = [0.5, 1, 2, 3, 5, 8, 12, 20, 30, 45, 60, 90, 120, float("inf")]
+# 单个接口累计的样本数超过该值时，所有计数减半，使分布能跟上接口状态的变化
+MAX_HISTOGRAM_SAMPLES = 1000
+
+stats_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), constants.LLM_HEDGE_STATS_FILE)
+
+
+@dataclass(frozen=True, slots=True)
+class Endpoint:
+    base_url: str
+    api_key: str
+    model: str
+
+    @property
+    def name(self):
+        return f"{self.base_url}|{self.model}"
+
+
+class TTFTHistogram:
+    """
+    按接口记录首字延迟的直方图。
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._counts = {}  # 接口名 -> 各个桶的计数
+        if path:
+            data = cache_utils.read_json(path)
+            if isinstance(data, dict):
+                self._counts = {name: counts for name, counts in data.items()
+                                if isinstance(counts, list) and len(counts) == len(TTFT_BUCKETS)}
+
+    def record(self, name, seconds):
+        with self._lock:
+            counts = self._counts.setdefault(name, [0] * len(TTFT_BUCKETS))
+            counts[bisect.bisect_left(TTFT_BUCKETS, seconds)] += 1
+            if sum(counts) > MAX_HISTOGRAM_SAMPLES:
+                self._counts[name] = [count // 2 for count in counts]
+            snapshot = dict(self._counts)
+        if self.path:
+            try:
+                cache_utils.atomic_write_json(self.path, snapshot)
+            except OSError:
+                pass
+
+    def quantile(self, name, q):
+        """
+        Returns:
+            float or None: 分位数所在桶的上界；样本数不足 LLM_HEDGE_MIN_SAMPLES 时返回 None。
+        """
+        with self._lock:
+            counts = list(self._counts.get(name, ()))
+        total = sum(counts)
+        if total < constants.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        cumulative = 0
+        for bound, count in zip(TTFT_BUCKETS, counts):
+            cumulative += count
+            if cumulative >= q * total:
+                return bound
+        return TTFT_BUCKETS[-1]
+
+    def deadline(self, name):
+        """
+        对冲的截止时间（秒）。
+        """
+        estimate = self.quantile(name, constants.LLM_HEDGE_QUANTILE)
+        if estimate is None:
+            return constants.LLM_HEDGE_DEADLINE
+        return min(max(estimate, constants.LLM_HEDGE_MIN_DEADLINE), constants.LLM_HEDGE_DEADLINE)
+
+
+ttft_histogram = TTFTHistogram(stats_path)
+
+
+def hedge_endpoint(primary):
+    """
+    对冲请求使用的接口，未单独配置的部分与主接口相同。
+    """
+    return Endpoint(constants.LLM_HEDGE_BASE_URL or primary.base_url,
+                    constants.LLM_HEDGE_API_KEY or primary.api_key,
+                    constants.LLM_HEDGE_MODEL or primary.model)
+
+
+class HedgedStream:
+    """
+    胜出一路的输出流，先返回已经收到的首个片段，再继续读取剩余的片段。
+    """
+
+    def __init__(self, stream, iterator, first_chunk, endpoint):
+        self._stream = stream
+        self._iterator = iterator
+        self._first_chunk = first_chunk
+        self.endpoint = endpoint
+
+    def __iter__(self):
+        if self._first_chunk is not None:
+            yield self._first_chunk
+        yield from self._iterator
+
+    def close(self):
+        self._stream.close()
+
+
+class _Race:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.winner = None
+        self.streams = {}  # 序号 -> 已经建立、还没有收到首个片段的输出流，胜出的一路用来关闭其他各路
+        self.sent = {}  # 序号 -> (接口名, 最近一次发出请求的时间)
+        self.results = queue.Queue()  # (序号, "sent" / "stream" / "error", 内容)
+
+    def decided(self):
+        return self.winner is not None
+
+
+def _close_quietly(stream):
+    try:
+        stream.close()
+    except Exception:
+        pass
+
+
+def _open_stream(race, index, endpoint, messages, kwargs):
+    def on_send():
+        with race.lock:
+            race.sent[index] = (endpoint.name, time.monotonic())
+        race.results.put((index, "sent", None))
+
+    try:
+        stream = llm_dispatcher.dispatcher.open_stream(endpoint.base_url, endpoint.api_key, endpoint.model,
+                                                       messages, on_send=on_send, cancelled=race.decided, **kwargs)
+        with race.lock:
+            lost = race.winner is not None
+            if not lost:
+                race.streams[index] = stream
+        if lost:
+            # 建立连接期间另一路已经开始输出
+            _close_quietly(stream)
+            return
+        iterator = iter(stream)
+        first_chunk = next(iterator, None)
+    except Exception as e:
+        # 已经有一路胜出时，这一路是被取消或关闭的，不必报告
+        if not race.decided():
+            race.results.put((index, "error", e))
+        return
+    with race.lock:
+        won = race.winner is None
+        if won:
+            race.winner = index
+        race.streams.pop(index, None)
+        losers = list(race.streams.values())
+        race.streams.clear()
+        sent = dict(race.sent)
+    if not won:
+        # 另一路已经胜出，这一路即将被关闭，收到的首个片段不能反映正常的首字延迟
+        return
+    now = time.monotonic()
+    for name, sent_at in sent.values():
+        # 胜出的一路记录首字延迟；落败的各路（已经发出、还没有开始输出）的首字延迟至少是已经等待的时间，
+        # 按这个偏小的值记入分布，否则分布中只有胜出的快速请求，截止时间会越来越短，对冲越来越多
+        ttft_histogram.record(name, now - sent_at)
+    for loser in losers:
+        _close_quietly(loser)
+    race.results.put((index, "stream", HedgedStream(stream, iterator, first_chunk, endpoint)))
+
+
+def create_stream(primary, messages, **kwargs):
+    """
+    发出流式请求，超过截止时间仍未收到首个片段时发出对冲请求，返回先开始输出的一路。
+
+    Args:
+        primary (Endpoint): 主接口。
+        messages (list): 对话消息。
+        **kwargs: 传递给 chat.completions.create 的其他参数（temperature、max_tokens 等）。
+
+    Returns:
+        HedgedStream: 可迭代的输出流，支持 close()。
+    """
+    endpoints = [primary, hedge_endpoint(primary)]
+    deadline = ttft_histogram.deadline(primary.name)
+    race = _Race()
+    launched = 0
+    errors = []
+
+    def launch():
+        nonlocal launched
+        threading.Thread(target=_open_stream, args=(race, launched, endpoints[launched], messages, kwargs),
+                         daemon=True).start()
+        launched += 1
+
+    launch()
+    sent_at = None  # 主请求最近一次发出的时间，还在排队时为 None
+    while True:
+        if launched < len(endpoints) and sent_at is not None:
+            timeout = max(0.0, deadline - (time.monotonic() - sent_at))
+        else:
+            timeout = None
+        try:
+            index, kind, payload = race.results.get(timeout=timeout)
+        except queue.Empty:
+            print(f"{deadline:.1f}s 内未收到首个输出片段，发出对冲请求: {endpoints[launched].model}")
+            launch()
+            continue
+        if kind == "sent":
+            if index == 0:
+                sent_at = time.monotonic()
+            continue
+        if kind == "stream":
+            if index > 0:
+                print(f"对冲请求先开始输出，使用 {payload.endpoint.model}")
+            return payload
+        errors.append(payload)
+        if launched < len(endpoints):
+            # 主请求在输出前就失败了，不必等到截止时间
+            launch()
+        elif len(errors) == launched:
+            raise errors[0]
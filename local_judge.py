@@ -0,0 +1,320 @@
+"""
+带资源限制的本地评测：运行样例时限制 CPU 时间、地址空间、输出大小和进程数，
+并记录每次运行的 CPU 时间和峰值内存（RSS），与题目的时间/内存限制比较，
+在提交之前就发现可能超时（TLE）或超内存（MLE）的代码。
+
+资源限制依赖 resource 模块和 os.wait4，只在类 Unix 系统上可用；
+其他系统上 available() 返回 False，调用方退回到只有超时限制的 run_cpp.run_executable。
+样例在多个线程中并发运行，不能用 preexec_fn（fork 之后、exec 之前在子进程中执行 Python 代码，与线程一起使用不安全），
+改为通过 /bin/sh 的 ulimit 设置限制后再 exec 程序。
+
+Python 代码（.py）交给常驻的解释器进程 fork 出子进程运行（见 run_python），资源限制和用量统计相同。
+"""
+import math
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import constants
+import run_python
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 * 1024
+
+
+def available():
+    return resource is not None and hasattr(os, "wait4")
+
+
+def _limit_command(command, cpu_seconds, address_space, output_bytes):
+    """
+    由 /bin/sh 设置资源限制后 exec 程序（进程号不变），程序开始运行时限制已经生效。
+    ulimit -f 的单位是 512 字节，-v 的单位是 KB。
+    """
+    # 软限制不能超过硬限制，先降低软限制
+    script = (f"ulimit -St {cpu_seconds} && ulimit -Ht {cpu_seconds + 1} && "
+              f"ulimit -f {math.ceil(output_bytes / 512)} && ulimit -c 0")
+    if address_space:
+        script += f" && ulimit -v {address_space // 1024}"
+    return ["/bin/sh", "-c", script + ' && exec "$@"', "sh"] + command
+
+
+def _limit_processes(pid, processes):
+    """
+    限制进程数。各种 sh 的 ulimit 中进程数的选项不同（-u 或 -p），改为在进程启动后用 resource.prlimit 设置，
+    没有 prlimit 的系统上不限制。
+    """
+    if not processes or not hasattr(resource, "prlimit") or not hasattr(resource, "RLIMIT_NPROC"):
+        return
+    try:
+        resource.prlimit(pid, resource.RLIMIT_NPROC, (processes, processes))
+    except ProcessLookupError:
+        # 程序已经结束
+        pass
+
+
+def _self_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+
+def _watch_peak_rss(pid, executable_path, done, polled):
+    """
+    轮询 /proc/{pid}/status 中的 VmHWM（峰值 RSS），只统计 exec 之后的程序本身（见 run 中的说明）。
+    结果记录在 polled 中：peak_kb 为读到的最大值，samples 为成功读取的次数。
+    """
+    exe_link = f"/proc/{pid}/exe"
+    real_path = os.path.realpath(executable_path)
+    while not done.is_set():
+        try:
+            if os.path.realpath(exe_link) == real_path:
+                with open(f"/proc/{pid}/status", "r") as f:
+                    status = f.read()
+                # 读取期间没有发生 exec，读到的是程序本身的数据
+                if os.path.realpath(exe_link) == real_path:
+                    for line in status.splitlines():
+                        if line.startswith("VmHWM:"):
+                            polled["peak_kb"] = max(polled["peak_kb"], int(line.split()[1]))
+                            polled["samples"] += 1
+                            break
+        except (OSError, ValueError):
+            pass
+        done.wait(0.005)
+
+
+def _read_limited(stream, chunks, limit, on_overflow, on_data=None):
+    """
+    读取管道中的输出，超过 limit 字节时调用一次 on_overflow（RLIMIT_FSIZE 对管道无效，需要在这里限制），
+    之后的输出读出后丢弃，避免程序因管道写满而阻塞。
+    提供了 on_data 时每读到一段输出就交给它处理，不再保存到 chunks。
+    """
+    size = 0
+    while True:
+        data = stream.read1(65536)
+        if not data:
+            break
+        if on_data is not None:
+            on_data(data)
+        elif size < limit:
+            chunks.append(data[:limit - size])
+        size += len(data)
+        if size > limit and size - len(data) <= limit:
+            on_overflow()
+    stream.close()
+
+
+def _write_input(stream, data):
+    try:
+        stream.write(data)
+    except (BrokenPipeError, OSError):
+        # 程序没有读完输入就退出了
+        pass
+    finally:
+        try:
+            stream.close()
+        except OSError:
+            pass
+
+
+class _Process:
+    """
+    由 run 自行回收（os.wait4）的子进程，提供与 run_python.WorkerProcess 相同的 kill 和 wait_usage。
+
+    Popen.kill/poll/wait 内部会用 waitpid 回收进程，与 os.wait4 竞争，先回收的一方成功，另一方得到 ECHILD，
+    因此启动之后不再调用 Popen 的这些方法：终止时直接发送 SIGKILL，
+    并用锁保证进程被回收之后不再发送信号（pid 可能已经分配给了其他进程）。
+    """
+
+    def __init__(self, popen):
+        self._popen = popen
+        self.pid = popen.pid
+        self.stdin, self.stdout, self.stderr = popen.stdin, popen.stdout, popen.stderr
+        self.returncode = None
+        self._lock = threading.Lock()
+        self._reaped = False
+
+    def kill(self):
+        with self._lock:
+            if self._reaped:
+                return
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def wait_usage(self):
+        """
+        等待进程结束并回收。
+
+        Returns:
+            tuple: (returncode, cpu_ms, max_rss_kb)
+        """
+        if hasattr(os, "waitid"):
+            # 先等待进程结束但不回收（WNOWAIT），回收时持有锁，与 kill 互斥
+            os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOWAIT)
+            with self._lock:
+                _, status, usage = os.wait4(self.pid, 0)
+                self._reaped = True
+        else:
+            _, status, usage = os.wait4(self.pid, 0)
+            with self._lock:
+                self._reaped = True
+        self.returncode = os.waitstatus_to_exitcode(status)
+        # 告诉 Popen 进程已经回收，它不会再尝试 waitpid
+        self._popen.returncode = self.returncode
+        cpu_ms = (usage.ru_utime + usage.ru_stime) * 1000
+        # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+        max_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+        return self.returncode, cpu_ms, max_rss_kb
+
+
+def _start(executable_path, cpu_seconds, address_space, output_limit):
+    """
+    启动进程。Python 代码优先在常驻进程中运行（返回 run_python.WorkerProcess），
+    否则启动解释器或可执行文件（返回 _Process）。
+    """
+    processes = constants.LOCAL_JUDGE_MAX_PROCESSES
+    if run_python.is_python_source(executable_path):
+        if run_python.pool_available():
+            try:
+                return run_python.WorkerProcess(executable_path, {
+                    "cpu_seconds": cpu_seconds, "address_space": address_space,
+                    "output_bytes": output_limit, "processes": processes,
+                })
+            except (OSError, run_python.WorkerDied) as e:
+                print(f"警告：无法在常驻 Python 解释器进程中运行代码，改为启动新的解释器: {e}")
+        command = run_python.run_command(executable_path)
+    else:
+        command = [executable_path]
+    popen = subprocess.Popen(
+        _limit_command(command, cpu_seconds, address_space, output_limit),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    _limit_processes(popen.pid, processes)
+    return _Process(popen)
+
+
+def run(executable_path, input_data, time_limit=None, memory_limit=None, on_start=None, on_stdout=None):
+    """
+    在资源限制下运行可执行文件或 Python 代码。
+
+    Args:
+        executable_path (str): 可执行文件路径，或 Python 源文件（.py）的路径。
+        input_data (str): 标准输入。
+        time_limit (float, optional): 题目的时间限制（秒），默认为 constants.LOCAL_JUDGE_DEFAULT_TIME_LIMIT。
+        memory_limit (float, optional): 题目的内存限制（MB），为 None 时不限制地址空间。
+        on_start (callable, optional): 进程启动后以进程对象调用，调用方可以借此提前终止进程（只能使用其 kill 方法）。
+        on_stdout (callable, optional): 流式处理标准输出，每读到一段输出（bytes）调用一次，
+                                        返回 False 时立即终止进程（例如输出已经与预期不一致），见 output_compare。
+                                        提供时返回值中的 stdout 为空字符串。
+
+    Returns:
+        dict: {"ok", "stdout", "stderr", "message", "verdict", "cpu_ms", "max_rss_kb", "wall_ms"}
+              max_rss_kb 无法测得时为 None；
+              verdict 为 "OK"、"WA"（on_stdout 返回了 False）、"TLE"、"MLE"、"OLE"（输出超限）或 "RE"；
+              ok 表示程序正常退出且没有超出限制。
+    """
+    time_limit = time_limit or constants.LOCAL_JUDGE_DEFAULT_TIME_LIMIT
+    # 本地与评测机的速度不同，按 LOCAL_JUDGE_TIME_RATIO 换算；CPU 限制多留 1 秒，超时的程序也能测出实际用时
+    cpu_seconds = math.ceil(time_limit / constants.LOCAL_JUDGE_TIME_RATIO) + 1
+    # 地址空间包含未使用的虚拟内存（代码段、栈、分配器预留等），比实际占用大得多，因此放宽限制，MLE 以 RSS 为准
+    address_space = int(memory_limit * MB * constants.LOCAL_JUDGE_ADDRESS_SPACE_FACTOR) if memory_limit else 0
+    output_limit = constants.LOCAL_JUDGE_OUTPUT_LIMIT
+    wall_timeout = cpu_seconds * 2 + 1
+
+    # 子进程在 exec 之前是当前 Python 进程的副本，内核记录的峰值内存（ru_maxrss）至少是 exec 前的占用，
+    # 只有超过当前进程的占用时才反映程序本身；否则改用轮询 /proc 得到的 exec 之后的峰值（Linux）
+    baseline_rss_kb = _self_rss_kb()
+    start = time.monotonic()
+    proc = _start(executable_path, cpu_seconds, address_space, output_limit)
+    # 常驻进程直接取得子进程本身的用量，不需要上面的处理
+    in_worker = isinstance(proc, run_python.WorkerProcess)
+    if on_start is not None:
+        on_start(proc)
+
+    killed = {"reason": None}
+
+    def kill(reason):
+        if killed["reason"] is None:
+            killed["reason"] = reason
+        proc.kill()
+
+    def on_data(data):
+        if on_stdout(data) is False:
+            kill("WA")
+
+    stdout_chunks, stderr_chunks = [], []
+    threads = [
+        threading.Thread(target=_write_input, args=(proc.stdin, input_data.encode("utf-8")), daemon=True),
+        threading.Thread(target=_read_limited, args=(proc.stdout, stdout_chunks, output_limit, lambda: kill("OLE"),
+                                                     on_data if on_stdout is not None else None), daemon=True),
+        threading.Thread(target=_read_limited, args=(proc.stderr, stderr_chunks, 64 * 1024, lambda: None),
+                         daemon=True),
+    ]
+    done = threading.Event()
+    polled = {"peak_kb": 0, "samples": 0}
+    if os.path.isdir("/proc/self") and not in_worker:
+        program = run_python.interpreter_path() if run_python.is_python_source(executable_path) else executable_path
+        threads.append(threading.Thread(target=_watch_peak_rss, args=(proc.pid, program, done, polled),
+                                        daemon=True))
+    for thread in threads:
+        thread.start()
+    timer = threading.Timer(wall_timeout, kill, args=("TLE",))
+    timer.start()
+    try:
+        # 回收子进程，取得 CPU 时间和峰值内存
+        returncode, cpu_ms, max_rss_kb = proc.wait_usage()
+    finally:
+        timer.cancel()
+        done.set()
+    wall_ms = (time.monotonic() - start) * 1000
+    for thread in threads:
+        thread.join(timeout=1)
+
+    if not in_worker and max_rss_kb <= baseline_rss_kb:
+        # 只轮询到一次时读到的多半是程序刚启动时的占用，远小于实际的峰值，与没有轮询到一样视为未知
+        # （但不超过当前进程的占用）
+        max_rss_kb = polled["peak_kb"] if polled["samples"] >= 2 else None
+    stdout = b"".join(stdout_chunks).decode("utf-8", errors="replace")
+    stderr = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+
+    verdict, message = "OK", None
+    if killed["reason"] == "WA":
+        verdict, message = "WA", "程序输出与预期不一致，已提前终止"
+    elif killed["reason"] == "OLE" or proc.returncode == -getattr(signal, "SIGXFSZ", -1):
+        verdict, message = "OLE", f"程序输出超过了 {output_limit // MB}MB！"
+    elif killed["reason"] == "TLE":
+        verdict, message = "TLE", f"程序执行超时（超过 {wall_timeout} 秒）！"
+    elif cpu_ms > time_limit * 1000 / constants.LOCAL_JUDGE_TIME_RATIO:
+        verdict = "TLE"
+        message = f"程序运行时间 {cpu_ms:.0f}ms 超过了时间限制 {time_limit * 1000:.0f}ms！"
+    elif memory_limit and (max_rss_kb or 0) > memory_limit * 1024:
+        verdict = "MLE"
+        message = f"程序占用内存 {max_rss_kb / 1024:.1f}MB 超过了内存限制 {memory_limit:.0f}MB！"
+    elif memory_limit and proc.returncode != 0 and "std::bad_alloc" in stderr:
+        # 超出了地址空间限制
+        verdict = "MLE"
+        message = f"程序申请内存失败（std::bad_alloc），可能超过了内存限制 {memory_limit:.0f}MB！"
+    elif proc.returncode != 0:
+        verdict, message = "RE", f"程序执行完成，但退出码非零：{proc.returncode}"
+
+    return {
+        "ok": verdict == "OK",
+        "stdout": stdout,
+        "stderr": stderr,
+        "message": message,
+        "verdict": verdict,
+        "cpu_ms": cpu_ms,
+        "max_rss_kb": max_rss_kb,
+        "wall_ms": wall_ms,
+    }
@@ -0,0 +1,241 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import constants
+import local_judge
+import output_compare
+import run_cpp
+from log_format import PREFIX_STEP, PREFIX_ERROR, PREFIX_SUCCESS, PREFIX_DETAIL, PREFIX_WARN, SEPARATOR
+
+
+class _SampleRunner:
+    """
+    并发运行样例时共享的状态：正在运行的进程，以及目前失败的样例中序号最小的一个。
+    某个样例失败后，序号更大的样例不再启动，已经在运行的进程被终止；
+    序号更小的样例继续运行，保证最终报告的总是按样例顺序的第一个失败，反馈给LLM的提示词不随调度顺序变化。
+    调用方不再需要结果时（abort，例如 best_of_n 中其他候选已经胜出），所有样例都不再启动，正在运行的进程全部终止。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.first_failure = None  # 已失败样例中的最小序号
+        self.aborted = False
+        self.processes = {}  # 样例序号 -> 正在运行的进程
+
+    def _cancelled_locked(self, k):
+        return self.aborted or (self.first_failure is not None and k > self.first_failure)
+
+    def cancelled(self, k):
+        with self.lock:
+            return self._cancelled_locked(k)
+
+    def on_start(self, k, proc):
+        with self.lock:
+            self.processes[k] = proc
+            cancelled = self._cancelled_locked(k)
+        if cancelled:
+            proc.kill()
+
+    def abort(self):
+        with self.lock:
+            self.aborted = True
+            to_kill = list(self.processes.values())
+        for proc in to_kill:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def watch(self, cancel_event, done):
+        """
+        在后台线程中运行：cancel_event 被设置时终止全部样例，done 被设置（样例全部结束）时返回。
+        """
+        while not done.is_set():
+            if cancel_event.wait(0.05):
+                self.abort()
+                return
+
+    def on_finish(self, k, passed):
+        with self.lock:
+            self.processes.pop(k, None)
+            if passed or (self.first_failure is not None and self.first_failure <= k):
+                return
+            self.first_failure = k
+            to_kill = [proc for index, proc in self.processes.items() if index > k]
+        for proc in to_kill:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+
+def _format_rss(max_rss_kb):
+    return f"{max_rss_kb / 1024:.1f}MB" if max_rss_kb is not None else "未知"
+
+
+def _use_local_judge():
+    return constants.LOCAL_JUDGE_ENABLED and local_judge.available()
+
+
+def _check_sample(executable_path, sample, timeout_seconds, on_start=None, time_limit=None, memory_limit=None):
+    """
+    运行单个样例并与预期输出比较。本地评测可用时在资源限制下运行（没有时间限制时以 timeout_seconds 代替），
+    输出正确但 CPU 时间或峰值内存超出限制的同样视为未通过；
+    同时边运行边比较输出（output_compare），出现第一处不一致时立即终止程序。
+
+    Returns:
+        tuple: (passed, failed_sample_message, details, usage)，details 为失败时打印的详细信息行，
+               usage 为本地评测测得的 (CPU 毫秒数, 峰值内存 KB 或 None)，未使用本地评测时为 None。
+    """
+    # 执行编译后的程序
+    usage = None
+    limit_verdict = None  # 本地评测判定的 TLE/MLE
+    comparator = output_compare.StreamingComparator(sample["output"])
+    if _use_local_judge():
+        result = local_judge.run(executable_path, sample["input"], time_limit or timeout_seconds, memory_limit,
+                                 on_start=on_start, on_stdout=comparator.feed)
+        usage = (result["cpu_ms"], result["max_rss_kb"])
+        # 输出已经交给比较器处理，这里只有开头的一部分
+        final_stdout, final_stderr, final_message = comparator.actual_output, result["stderr"], result["message"]
+        run_ok = result["verdict"] in ("OK", "WA")
+        if result["verdict"] in ("TLE", "MLE"):
+            limit_verdict = result["verdict"]
+    else:
+        # 没有资源限制的运行方式（Windows 等）只能在程序结束后比较
+        run_ok, final_stdout, final_stderr, final_message = run_cpp.run_executable(
+            executable_path=executable_path,
+            input_data=sample["input"],
+            timeout_seconds=timeout_seconds,
+            on_start=on_start
+        )
+        if run_ok:
+            comparator.feed(final_stdout or "")
+
+    if limit_verdict is not None:
+        # 超出时间/内存限制，即使输出正确，提交后也会得到 TLE/MLE
+        hint = "请优化算法的时间复杂度" if limit_verdict == "TLE" else "请减少内存的使用"
+        failed_sample_message = (f"你的代码在运行测试样例时超出了{'时间' if limit_verdict == 'TLE' else '内存'}限制！"
+                                 f"{hint}，并再次提供完整的代码。\n"
+                                 f"{final_message}\n"
+                                 f"输入:\n{sample['input']}")
+        details = [f"{PREFIX_DETAIL} 资源超限详情:",
+                   f"    Input:\n{sample['input']}",
+                   f"    Reason: {final_message}",
+                   f"    CPU: {usage[0]:.0f}ms, RSS: {_format_rss(usage[1])}"]
+        return False, failed_sample_message, details, usage
+
+    if not run_ok:
+        # 运行出错 (例如超时、运行时错误)
+        failed_sample_message = (f"你的代码在运行测试样例时失败了！请修复错误并再次提供完整的代码。\n"
+                                 f"错误原因：{final_message}\n"
+                                 f"输入:\n{sample['input']}\n"
+                                 f"程序标准输出（可能不完整）：\n{final_stdout if final_stdout is not None else '(无)'}\n"
+                                 f"程序标准错误（可能不完整）：\n{final_stderr if final_stderr is not None else '(无)'}")
+        details = [f"{PREFIX_DETAIL} 运行错误详情:",
+                   f"    Input:\n{sample['input']}",
+                   f"    Reason: {final_message}",
+                   f"    Stdout: {final_stdout if final_stdout is not None else '(无)'}",
+                   f"    Stderr: {final_stderr if final_stderr is not None else '(无)'}"]
+        return False, failed_sample_message, details, usage
+
+    # 运行成功，比较剩余的输出
+    if comparator.finish():
+        return True, None, [], usage
+
+    # 输出不匹配 (答案错误 - WA)
+    # 清理预期输出和实际输出中的空白字符，用于反馈
+    expected_output_clean = "\n".join(
+        line.strip() for line in sample["output"].splitlines()).strip()
+    actual_output_clean = "\n".join(
+        line.strip() for line in comparator.actual_output.splitlines()).strip()
+    if comparator.truncated:
+        actual_output_clean += "\n...（输出不完整）"
+    failed_sample_message = (
+        f"你的代码在运行测试样例时输出了错误的结果！请修复错误并再次提供完整的代码。\n"
+        f"输入:\n{sample['input']}\n"
+        f"预期输出:\n{expected_output_clean}\n"
+        f"你的输出:\n{actual_output_clean}\n"
+        f"{comparator.mismatch}")
+    details = [f"{PREFIX_DETAIL} 输出对比:",
+               f"    Input:\n{sample['input']}",
+               f"    Expected:\n{expected_output_clean}",
+               f"    Actual:\n{actual_output_clean}",
+               f"    {comparator.mismatch}"]
+    return False, failed_sample_message, details, usage
+
+
+def run_samples(executable_path, input_output_samples, timeout_seconds=15, time_limit=None, memory_limit=None,
+                cancel_event=None):
+    """
+    在线程池中并发运行全部输入输出样例（最多 constants.SAMPLE_WORKERS 个同时运行），
+    有样例失败时终止序号在它之后的样例，返回按样例顺序的第一个失败。
+
+    Args:
+        executable_path (str): 编译得到的可执行文件路径。
+        input_output_samples (list): [{"input": ..., "output": ...}, ...]
+        timeout_seconds (int): 每个样例的运行超时时间（秒）；使用本地评测且 time_limit 为空时作为 CPU 时间限制。
+        time_limit (float, optional): 题目的时间限制（秒）。本地评测可用时（constants.LOCAL_JUDGE_ENABLED
+                                      且平台支持，见 local_judge）总是使用本地评测，超出时间或内存限制视为未通过。
+        memory_limit (float, optional): 题目的内存限制（MB），为空时不限制内存。
+        cancel_event (threading.Event, optional): 被设置时终止正在运行的样例并返回 (False, None)，
+                                                  用于调用方不再需要结果的情况（例如 best_of_n 取消其余候选）。
+
+    Returns:
+        tuple: (all_samples_passed, failed_sample_message)
+               all_samples_passed (bool): 是否全部样例通过。
+               failed_sample_message (str or None): 失败时反馈给LLM的信息。
+    """
+    if not input_output_samples:
+        return True, None
+    runner = _SampleRunner()
+    done = threading.Event()
+    if cancel_event is not None:
+        threading.Thread(target=runner.watch, args=(cancel_event, done), daemon=True).start()
+
+    def run_one(k, sample):
+        if runner.cancelled(k):
+            return None
+        try:
+            result = _check_sample(executable_path, sample, timeout_seconds,
+                                   on_start=lambda proc: runner.on_start(k, proc),
+                                   time_limit=time_limit, memory_limit=memory_limit)
+        except Exception as e:
+            # 运行样例时发生意外错误
+            result = (False, f"运行测试样例时发生意外错误: {e}. 输入:\n{sample['input']}",
+                      [f"  {PREFIX_ERROR} 运行样例 {k + 1} 时发生意外错误: {e}"], None)
+        if runner.cancelled(k):
+            # 被更早失败的样例终止，结果无效
+            return None
+        runner.on_finish(k, result[0])
+        return result
+
+    total = len(input_output_samples)
+    print(f"  {PREFIX_STEP} 并发运行 {total} 个样例...")
+    workers = max(1, min(constants.SAMPLE_WORKERS, total))
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sample") as executor:
+            futures = [executor.submit(run_one, k, sample) for k, sample in enumerate(input_output_samples)]
+            results = [future.result() for future in futures]
+    finally:
+        done.set()
+    if runner.aborted:
+        print(f"  {PREFIX_WARN} 样例测试已取消。")
+        return False, None
+
+    # 按样例顺序输出结果，直到第一个失败的样例
+    for k, result in enumerate(results):
+        if result is None:
+            break
+        passed, failed_sample_message, details, usage = result
+        if passed:
+            if usage is not None:
+                print(f"  {PREFIX_SUCCESS} 样例 {k + 1} 通过（CPU {usage[0]:.0f}ms，内存 {_format_rss(usage[1])}）。")
+            else:
+                print(f"  {PREFIX_SUCCESS} 样例 {k + 1} 通过。")
+            continue
+        print(f"  {PREFIX_ERROR} 样例 {k + 1}/{total} 未通过!")
+        for line in details:
+            print(line)
+        print(SEPARATOR)
+        return False, failed_sample_message
+    return True, None
@@ -0,0 +1,9 @@
+# 定义一些用于打印输出格式化的常量
+PREFIX_INFO = "[INFO]"
+PREFIX_STEP = "[STEP]"
+PREFIX_AUTH = "[AUTH]"
+PREFIX_ERROR = "[ERROR]"
+PREFIX_WARN = "[WARN]"
+PREFIX_SUCCESS = "[SUCCESS]"
+PREFIX_DETAIL = "  [DETAIL]"
+SEPARATOR = "-" * 40
@@ -1,23 +1,29 @@
 import re
 import time
 import generate_answer
+import best_of_n
+import code_stream
+import cpp_diagnostics
 import run_cpp
+import run_python
+import language
+import local_test
+import stress_test
+import model_router
+import llm_cache
+import llm_dispatcher
 import get_problem
 import submit_code
 import auto_login
 import constants
+import problem_pack
+import workspace
 import os
 import json
 
-# 定义一些用于打印输出格式化的常量
-PREFIX_INFO = "[INFO]"
-PREFIX_STEP = "[STEP]"
-PREFIX_AUTH = "[AUTH]"
-PREFIX_ERROR = "[ERROR]"
-PREFIX_WARN = "[WARN]"
-PREFIX_SUCCESS = "[SUCCESS]"
-PREFIX_DETAIL = "  [DETAIL]"
-SEPARATOR = "-" * 40
+from log_format import (PREFIX_INFO, PREFIX_STEP, PREFIX_AUTH, PREFIX_ERROR, PREFIX_WARN, PREFIX_SUCCESS,
+                        PREFIX_DETAIL, SEPARATOR)
+
 EXPECTED_ACCEPT_STATUS = "AC"  # 定义表示“答案正确”状态的字符串
 
 # 定义失败状态字符串
@@ -92,42 +98,65 @@ def auto_get_access_token():
     return access_token
 
 
-def auto_ac_problem(problem_id):
+def load_problem_record(problem_id, pack=None):
+    """
+    获取题目记录：优先从题目合集中读取，合集中没有时再通过网络（或题目缓存）获取。
+    """
+    if pack is not None:
+        problem = pack.get(problem_id)
+        if problem is not None:
+            print(f"{PREFIX_INFO} 从题目合集 {pack.path} 中读取题目。")
+            return problem
+        print(f"{PREFIX_WARN} 题目合集 {pack.path} 中没有该题目，改为在线获取。")
+    return get_problem.load_problem(problem_id)
+
+
+def auto_ac_problem(problem_id, pack=None):
     """
     自动化处理流程：获取题目 -> 生成/修复代码 -> 本地编译测试 -> 提交 -> 检查结果。
+    pack 为 problem_pack.PackReader 时优先从题目合集中读取题目。
+    中间文件写入独立的工作目录（见 workspace），结束后删除，只保留题目描述和最终代码。
     始终返回三个值：(判题结果数据, 代码字符串, 状态字符串)。
     成功时，判题结果数据是一个字典，状态字符串是判题状态(如 "AC", "WA")。
     失败时，判题结果数据是 None，状态字符串描述失败原因。
     """
+    with workspace.Workspace.create(f"P{problem_id}") as ws:
+        final_result_data, answer, overall_status = _auto_ac_problem(problem_id, pack, ws)
+        if answer:
+            saved_path = ws.keep(f"{problem_id}{language.source_suffix()}", text=answer)
+            if saved_path:
+                print(f"{PREFIX_INFO} 最终代码已保存到: {saved_path}")
+    return final_result_data, answer, overall_status
+
+
+def _auto_ac_problem(problem_id, pack, ws):
     print(f"\n{'=' * 10} 开始处理题目 P{problem_id} {'=' * 10}")
 
+    # 获取题目的同时在后台构建预编译头（已构建过时直接可用），或启动常驻的 Python 解释器进程
+    language.warm_up()
+
     # --- 步骤 1: 获取题目信息 ---
     print(f"\n{PREFIX_STEP} 1. 获取题目信息...")
-    problem = None
     problem_markdown = None
     input_output_samples = None
     pms_question_version_id = None
     try:
-        # 获取题目基本信息对象
-        problem = get_problem.get_problem_info(problem_id)
-        if not problem:
-            print(f"{PREFIX_ERROR} 获取题目基本信息失败！")
-            return None, None, STATUS_FAIL_GET_PROBLEM
-        # 获取格式化后的题目描述和样例
-        problem_markdown, input_output_samples = get_problem.get_problem_md(problem_id, problem)
+        # 获取题目的Markdown描述、样例和版本ID（优先读取题目合集和本地缓存）
+        problem = load_problem_record(problem_id, pack)
+        problem_markdown = problem["markdown"]
+        input_output_samples = problem["input_output_samples"]
         if not problem_markdown:
             print(f"{PREFIX_ERROR} 转换题目信息到Markdown失败！")
             return None, None, STATUS_FAIL_GET_PROBLEM
 
         # 保存题目描述到本地文件
         md_filename = f"{problem_id}.md"
-        with open(md_filename, "w", encoding='utf-8') as f:
-            f.write(problem_markdown)
-        print(f"{PREFIX_INFO} 题目描述已转换为Markdown并保存到: {md_filename}")
+        md_path = ws.keep(md_filename, text=problem_markdown) or ws.write(md_filename, problem_markdown)
+        print(f"{PREFIX_INFO} 题目描述已转换为Markdown并保存到: {md_path}")
 
-        # 提取题目版本ID (pms_question_version_id)
-        pms_match = re.search(constants.PMS_QUESTION_VERSION_ID_REGEX, problem.prettify())
-        if not pms_match:
+        # 题目版本ID (pms_question_version_id) 已在获取页面时从HTML中提取
+        pms_question_version_id = problem["pms_question_version_id"]
+        if not pms_question_version_id:
             # 备选方案：尝试从Markdown文本中查找ID
             pms_match_md = re.search(r'pmsQuestionVersionId=(\d+)', problem_markdown)
             if pms_match_md:
@@ -138,8 +167,6 @@ def auto_ac_problem(problem_id):
                 print(f"{PREFIX_ERROR} 未能从题目信息中提取 pms_question_version_id！")
                 return None, None, STATUS_FAIL_GET_PMS_ID
         else:
-            # 从HTML结构中成功提取ID
-            pms_question_version_id = pms_match.group(1)
             print(f"{PREFIX_INFO} 题目 PMS Question Version ID: {pms_question_version_id}")
 
         print(f"{PREFIX_SUCCESS} 题目信息获取完成。")
@@ -153,22 +180,66 @@ def auto_ac_problem(problem_id):
     print(f"\n{PREFIX_STEP} 2. 生成和修复代码...")
     answer = None
     messages = None
+    # 代码块一结束就在后台开始编译，修复循环中直接使用编译结果
+    early_compiler = run_cpp.EarlyCompiler(ws.file(f"{problem_id}{language.source_suffix()}"),
+                                           compile_function=run_python.compile_python if language.is_python() else None)
+    # 按题目通过率和历史数据选择起始模型，多次失败后升级到更强的模型
+    router = model_router.ModelRouter(problem.get("pass_rate"))
+    print(f"{PREFIX_INFO} 通过率分组: {router.bucket}，使用模型: {router.model}")
     final_code_ok = False  # 标记最终代码是否通过本地测试
+    # 样例通过后在大规模输入下检查运行时间，未启用或缺少数据范围/时间限制时为 None
+    stress_tester = stress_test.StressTester.create(problem_id, problem_markdown, problem.get("time_limit"),
+                                                    problem.get("memory_limit"), router, ws.subdir("stress"))
 
     # 外层循环：控制整体重试（包括重新生成）次数
     for i in range(constants.MAX_RETRY_COUNT):
         print(f"\n{PREFIX_INFO} 第 {i + 1}/{constants.MAX_RETRY_COUNT} 次尝试 (包括生成/重新生成)...")
 
         # --- 代码生成/重新生成 ---
+        candidate_passed = False  # 并发生成模式下，候选代码是否已通过本地测试
+        # 并发生成模式下胜出的候选未通过压力测试时的反馈，修复循环中直接使用，不再重复测试
+        pending_failure = None
         try:
-            if i == 0:
+            if constants.BEST_OF_N > 1:
+                # 并发生成多份候选代码，第一份通过本地测试的候选胜出
+                note = None
+                if i > 0:
+                    # 与逐份生成时相同：之前的尝试都失败了，记录失败（可能升级模型）并要求更换思路
+                    print(f"{PREFIX_WARN} 代码本地测试失败，请求LLM更换思路并重新生成...")
+                    router.record_failure("regenerate")
+                    note = constants.LLM_REGENERATE_NOTE
+                print(f"{PREFIX_INFO} 请求LLM并发生成 {constants.BEST_OF_N} 份候选代码...")
+                winner, candidates = best_of_n.solve_best_of_n(
+                    problem_id, problem_markdown, input_output_samples, model=router.model,
+                    workspace=ws.subdir(f"attempt{i + 1}"),
+                    limits={"time_limit": problem.get("time_limit"), "memory_limit": problem.get("memory_limit")},
+                    note=note)
+                if winner is not None:
+                    answer, messages, candidate_passed = winner["code"], winner["messages"], True
+                    if stress_tester is not None:
+                        # 与逐份修复时相同，样例通过后还要通过压力测试
+                        print(f"{PREFIX_STEP} 候选代码通过样例，进行压力测试...")
+                        candidate_passed, stress_feedback = stress_tester.check(winner["executable"])
+                        if not candidate_passed:
+                            pending_failure = stress_feedback
+                elif candidates:
+                    # 没有候选通过本地测试，用最先完成的候选进入修复循环
+                    answer, messages = candidates[0]["code"], candidates[0]["messages"]
+                else:
+                    answer = None
+            elif i == 0:
                 # 首次尝试，调用生成答案接口
                 print(f"{PREFIX_INFO} 请求LLM生成初始代码...")
-                answer, messages = generate_answer.generate_answer(problem_markdown)
+                answer, messages = generate_answer.generate_answer(problem_markdown, early_compiler.submit,
+                                                                   model=router.model)
             else:
                 # 非首次尝试（意味着之前的修复都失败了），重新生成代码
                 print(f"{PREFIX_WARN} 代码本地测试失败，请求LLM更换思路并重新生成...")
-                answer, messages = generate_answer.generate_answer(problem_markdown)  # 重新调用生成
+                router.record_failure("regenerate")
+                # 重新调用生成，说明追加在题目描述之后，不影响前面可缓存的提示词前缀
+                answer, messages = generate_answer.generate_answer(problem_markdown, early_compiler.submit,
+                                                                   model=router.model,
+                                                                   note=constants.LLM_REGENERATE_NOTE)
 
             if not answer:
                 # LLM未能生成代码
@@ -184,6 +255,10 @@ def auto_ac_problem(problem_id):
             print(answer)
             print(SEPARATOR)
 
+        except (llm_cache.CacheMiss, llm_dispatcher.CircuitOpenError) as e:
+            # 重放模式下缓存未命中，或LLM接口熔断中，重试也不会成功，直接结束
+            print(f"{PREFIX_ERROR} {e}")
+            return None, answer, f"{STATUS_FAIL_GENERATE} ({e})"
         except Exception as e:
             # 处理调用LLM生成/重新生成时的错误
             print(f"{PREFIX_ERROR} 调用LLM生成代码时出错 (尝试 {i + 1}): {e}")
@@ -192,16 +267,21 @@ def auto_ac_problem(problem_id):
                 return None, answer, f"{STATUS_FAIL_GENERATE} ({e})"  # 返回当前可能存在的代码
             continue  # 继续下一次外层循环
 
+        if candidate_passed:
+            print(f"\n{PREFIX_SUCCESS} 第 {i + 1} 次尝试生成的代码已通过本地编译和测试。")
+            final_code_ok = True
+            break  # 候选代码已通过本地测试，跳出外层重试循环
+
         # --- 内层循环：控制单次生成后的修复次数 ---
         code_passes_local_tests = False  # 重置本地测试通过标记
+        compile_signature = None  # 上一次编译失败的错误特征，用于发现重复出现的相同错误
         for j in range(constants.MAX_FIX_COUNT):
             print(f"\n  {PREFIX_INFO} 第 {i + 1} 次生成后的第 {j + 1}/{constants.MAX_FIX_COUNT} 次本地修复尝试...")
 
             # 保存当前代码到文件
-            cpp_filename = f"{problem_id}.cpp"
+            cpp_filename = early_compiler.source_file
             try:
-                with open(cpp_filename, "w", encoding='utf-8') as f:
-                    f.write(answer)
+                early_compiler.save(answer)
                 print(f"  {PREFIX_INFO} 代码已保存到: {cpp_filename}")
             except IOError as e:
                 print(f"  {PREFIX_ERROR} 保存代码文件失败: {e}")
@@ -210,21 +290,25 @@ def auto_ac_problem(problem_id):
 
             # --- 编译代码 ---
             print(f"  {PREFIX_STEP} 正在编译...")
-            compile_ok, compile_result = run_cpp.compile_cpp(source_file=cpp_filename)
+            compile_ok, compile_result = early_compiler.compile(answer)
 
             if not compile_ok:
                 # 编译失败
                 print(f"  {PREFIX_ERROR} 编译失败!")
+                router.record_failure("compile")
                 # 如果还有修复机会，则反馈给LLM
                 if j < constants.MAX_FIX_COUNT - 1:
                     print(f"  {PREFIX_INFO} 将编译错误反馈给 LLM 进行修复...")
-                    message = f"你的代码编译失败！请修复错误并再次提供完整的代码，编译错误信息：\n{compile_result}"
+                    # 只反馈去重后的根错误，而不是完整的编译器输出
+                    message, compile_signature = cpp_diagnostics.compile_feedback(compile_result, cpp_filename,
+                                                                                  compile_signature)
                     print(f"{PREFIX_DETAIL} 编译错误信息:")
-                    print(compile_result)
+                    print(message)
                     print(SEPARATOR)
                     try:
                         # 调用修复接口
-                        answer, messages = generate_answer.fix_answer(message, messages)
+                        answer, messages = generate_answer.fix_answer(message, messages, early_compiler.submit,
+                                                                      answer, router.model)
                         if not answer:
                             print(f"  {PREFIX_ERROR} LLM 未能修复编译错误。")
                             # LLM修复失败，中断当前修复循环，可能需要重新生成
@@ -246,76 +330,23 @@ def auto_ac_problem(problem_id):
             print(f"  {PREFIX_SUCCESS} 编译成功。可执行文件: {compile_result}")
 
             # --- 运行样例测试 ---
-            if not input_output_samples:
+            if not input_output_samples and pending_failure is None:
                 # 没有样例，无法本地测试，假设通过
                 print(f"  {PREFIX_WARN} 没有找到输入输出样例，跳过本地运行测试。")
                 code_passes_local_tests = True
                 break  # 编译成功且无样例，视为本地测试通过，跳出内层循环
 
-            all_samples_passed = True  # 假设所有样例都通过
-            failed_sample_message = None  # 存储失败样例的反馈信息
-            for k, sample in enumerate(input_output_samples):
-                print(f"  {PREFIX_STEP} 运行样例 {k + 1}/{len(input_output_samples)}...")
-                try:
-                    # 执行编译后的程序
-                    run_ok, final_stdout, final_stderr, final_message = run_cpp.run_executable(
-                        executable_path=compile_result,
-                        input_data=sample["input"],
-                        timeout_seconds=15
-                    )
-
-                    if not run_ok:
-                        # 运行出错 (例如超时、运行时错误)
-                        print(f"  {PREFIX_ERROR} 样例 {k + 1} 运行失败!")
-                        all_samples_passed = False
-                        failed_sample_message = (f"你的代码在运行测试样例时失败了！请修复错误并再次提供完整的代码。\n"
-                                                 f"错误原因：{final_message}\n"
-                                                 f"输入:\n{sample['input']}\n"
-                                                 f"程序标准输出（可能不完整）：\n{final_stdout if final_stdout is not None else '(无)'}\n"
-                                                 f"程序标准错误（可能不完整）：\n{final_stderr if final_stderr is not None else '(无)'}")
-                        print(f"{PREFIX_DETAIL} 运行错误详情:")
-                        print(f"    Input:\n{sample['input']}")
-                        print(f"    Reason: {final_message}")
-                        print(f"    Stdout: {final_stdout if final_stdout is not None else '(无)'}")
-                        print(f"    Stderr: {final_stderr if final_stderr is not None else '(无)'}")
-                        print(SEPARATOR)
-                        break  # 一个样例失败，无需测试其他样例，跳出样例循环
-
-                    else:
-                        # 运行成功，比较输出
-                        # 清理预期输出和实际输出中的空白字符以便比较
-                        expected_output_clean = "\n".join(
-                            line.strip() for line in sample["output"].splitlines()).strip()
-                        actual_output_clean = "\n".join(
-                            line.strip() for line in
-                            (final_stdout or "").splitlines()).strip()  # 处理 final_stdout 可能为 None 的情况
-
-                        if actual_output_clean == expected_output_clean:
-                            # 输出匹配
-                            print(f"  {PREFIX_SUCCESS} 样例 {k + 1} 通过。")
-                            continue  # 测试下一个样例
-                        else:
-                            # 输出不匹配 (答案错误 - WA)
-                            print(f"  {PREFIX_ERROR} 样例 {k + 1} 输出错误!")
-                            all_samples_passed = False
-                            failed_sample_message = (
-                                f"你的代码在运行测试样例时输出了错误的结果！请修复错误并再次提供完整的代码。\n"
-                                f"输入:\n{sample['input']}\n"
-                                f"预期输出:\n{expected_output_clean}\n"
-                                f"你的输出:\n{actual_output_clean}")
-                            print(f"{PREFIX_DETAIL} 输出对比:")
-                            print(f"    Input:\n{sample['input']}")
-                            print(f"    Expected:\n{expected_output_clean}")
-                            print(f"    Actual:\n{actual_output_clean}")
-                            print(SEPARATOR)
-                            break  # 一个样例失败，跳出样例循环
-
-                except Exception as e:
-                    # 运行样例时发生意外错误
-                    print(f"  {PREFIX_ERROR} 运行样例 {k + 1} 时发生意外错误: {e}")
-                    all_samples_passed = False
-                    failed_sample_message = f"运行测试样例时发生意外错误: {e}. 输入:\n{sample['input']}"
-                    break  # 发生意外错误，中断样例测试
+            if pending_failure is not None:
+                all_samples_passed, failed_sample_message = False, pending_failure
+                pending_failure = None
+            else:
+                all_samples_passed, failed_sample_message = local_test.run_samples(
+                    compile_result, input_output_samples,
+                    time_limit=problem.get("time_limit"), memory_limit=problem.get("memory_limit"))
+            if all_samples_passed and stress_tester is not None:
+                # 样例通过后进行压力测试，预计超时时以性能相关的反馈进入修复流程
+                print(f"  {PREFIX_STEP} 样例通过，进行压力测试...")
+                all_samples_passed, failed_sample_message = stress_tester.check(compile_result)
 
             # --- 处理样例测试结果 ---
             if all_samples_passed:
@@ -325,11 +356,13 @@ def auto_ac_problem(problem_id):
                 break  # 本地测试成功，跳出内层修复循环
             else:
                 # 存在失败的样例
+                router.record_failure("wrong_answer")
                 if failed_sample_message and j < constants.MAX_FIX_COUNT - 1:
                     # 如果还有修复机会，反馈给LLM
                     print(f"  {PREFIX_INFO} 将样例运行错误反馈给 LLM 进行修复...")
                     try:
-                        answer, messages = generate_answer.fix_answer(failed_sample_message, messages)
+                        answer, messages = generate_answer.fix_answer(failed_sample_message, messages,
+                                                                      early_compiler.submit, answer, router.model)
                         if not answer:
                             print(f"  {PREFIX_ERROR} LLM 未能修复样例运行错误。")
                             break  # LLM修复失败，中断修复
@@ -361,6 +394,7 @@ def auto_ac_problem(problem_id):
             # 外层循环将继续下一次尝试（重新生成），除非已达上限
 
     # --- 外层重试循环结束 ---
+    router.finish(final_code_ok)
     if not final_code_ok:
         # 所有重试（包括重新生成和修复）都失败了
         print(f"\n{PREFIX_ERROR} 经过 {constants.MAX_RETRY_COUNT} 次尝试后，未能生成可通过本地测试的代码。")
@@ -527,8 +561,11 @@ if __name__ == '__main__':
     overall_status = "Process Started"  # 初始状态
 
     try:
+        # 配置了题目合集时从合集中读取题目
+        pack = problem_pack.PackReader(constants.PROBLEM_PACK_PATH) if constants.PROBLEM_PACK_PATH else None
         # 调用主处理函数，始终接收三个返回值
-        final_result_data, final_code, overall_status = auto_ac_problem(problem_id)
+        final_result_data, final_code, overall_status = auto_ac_problem(problem_id, pack)
+        last_code_filename = os.path.join(constants.WORKSPACE_OUTPUT_DIR, f"{problem_id}{language.source_suffix()}")
 
         print("\n" + "=" * 20 + " 最终总结 " + "=" * 20)
 
@@ -540,7 +577,8 @@ if __name__ == '__main__':
             if overall_status == EXPECTED_ACCEPT_STATUS:
                 print("🎉🎉🎉 恭喜！题目 Accepted! 🎉🎉🎉")
                 if final_code:
-                    final_cpp_filename = f"{problem_id}_AC.cpp"
+                    final_cpp_filename = os.path.join(constants.WORKSPACE_OUTPUT_DIR,
+                                                      f"{problem_id}_AC{language.source_suffix()}")
                     try:
                         with open(final_cpp_filename, "w", encoding='utf-8') as f:
                             f.write(final_code)
@@ -551,7 +589,7 @@ if __name__ == '__main__':
                 # 题目未通过
                 print(f"🤔 题目未完全通过 ({overall_status})，请检查上面的详细判题结果。")
                 if final_code:
-                    print(f"{PREFIX_INFO} 最后提交的代码保存在 {problem_id}.cpp")
+                    print(f"{PREFIX_INFO} 最后提交的代码保存在 {last_code_filename}")
 
         else:
             # 流程中途失败（final_result_data 为 None）
@@ -559,10 +597,35 @@ if __name__ == '__main__':
             print(f"失败原因/状态: {overall_status}")
             if final_code:
                 # 即使失败，也可能生成了代码
-                print(f"{PREFIX_INFO} 最后生成的/尝试的代码保存在 {problem_id}.cpp")
+                print(f"{PREFIX_INFO} 最后生成的/尝试的代码保存在 {last_code_filename}")
             else:
                 print(f"{PREFIX_INFO} 未能生成有效代码。")
 
+        stream_summary = code_stream.summarize_stream_stats()
+        if stream_summary["streams"]:
+            print(f"{PREFIX_INFO} LLM 共输出 {stream_summary['streams']} 次，代码块结束后提前编译/终止输出"
+                  f"{'（部分为估算）' if stream_summary['estimated'] else ''}共节省 "
+                  f"{stream_summary['seconds_saved']:.2f}s、{stream_summary['chunks_saved']:.0f} 个片段"
+                  f"（{stream_summary['chars_saved']:.0f} 字符）。")
+        compile_summary = run_cpp.summarize_compile_stats()
+        if compile_summary:
+            names = {"cache": "命中编译缓存", "pch": "使用预编译头", "cold": "未使用预编译头"}
+            print(f"{PREFIX_INFO} 编译用时：" + "，".join(
+                f"{names[mode]} {entry['count']} 次，平均 {entry['average_seconds']:.2f}s"
+                for mode, entry in compile_summary.items()))
+        cache_summary = code_stream.summarize_prompt_cache()
+        if cache_summary["requests"]:
+            ttft_hit = f"{cache_summary['ttft_hit']:.2f}s" if cache_summary["ttft_hit"] is not None else "无"
+            ttft_miss = f"{cache_summary['ttft_miss']:.2f}s" if cache_summary["ttft_miss"] is not None else "无"
+            print(f"{PREFIX_INFO} 提示词共 {cache_summary['prompt_tokens']} tokens，命中缓存 "
+                  f"{cache_summary['cached_tokens']} tokens（{cache_summary['hit_rate']:.0%}），"
+                  f"平均首字延迟：命中 {ttft_hit}，未命中 {ttft_miss}。")
+        llm_metrics = llm_dispatcher.dispatcher.metrics()
+        if llm_metrics["requests"]:
+            print(f"{PREFIX_INFO} LLM 请求 {llm_metrics['requests']} 次，重试 {llm_metrics['retries']} 次，"
+                  f"最大排队 {llm_metrics['max_queue_depth']}，排队等待 {llm_metrics['queue_wait_seconds']:.2f}s，"
+                  f"限速等待 {llm_metrics['rate_limit_wait_seconds']:.2f}s，熔断拒绝 {llm_metrics['rejected']} 次。")
+
         print(f"\n最终状态: {overall_status}")
 
     except Exception as main_exception:
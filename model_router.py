@@ -0,0 +1,141 @@
+"""
+模型级联：先用便宜、快速的模型，本地测试多次失败后再升级到更强的模型。
+
+每道题目结束时按通过率分组记录各个模型的表现（是否成功、用时），
+之后的题目根据同一分组的历史数据，选择预计最快得到正确代码的模型作为起点。
+"""
+import os
+import time
+
+import cache_utils
+import constants
+
+stats_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), constants.LLM_ROUTER_STATS_FILE)
+
+# 没有历史用时数据时假设的单次尝试用时（秒）
+DEFAULT_TIER_SECONDS = 60.0
+
+
+def get_cascade():
+    """
+    Returns:
+        list: 从便宜到强的模型列表，未配置级联时只有 constants.LLM_MODEL。
+    """
+    return list(constants.LLM_MODEL_CASCADE) or [constants.LLM_MODEL]
+
+
+def pass_rate_bucket(pass_rate):
+    """
+    把通过率归入 constants.LLM_ROUTER_PASS_RATE_BUCKETS 划分的区间，例如 "10-30"。
+    """
+    if pass_rate is None:
+        return "unknown"
+    lower = 0
+    for upper in constants.LLM_ROUTER_PASS_RATE_BUCKETS:
+        if pass_rate < upper:
+            return f"{lower}-{upper}"
+        lower = upper
+    return f"{lower}-100"
+
+
+def load_stats(path=stats_path):
+    stats = cache_utils.read_json(path)
+    return stats if isinstance(stats, dict) else {}
+
+
+def _expected_seconds(model_stats, cascade, start, fallback_seconds):
+    """
+    从第 start 级开始，预计得到正确代码的用时：
+    逐级累加“到达该级的概率 × 该级的平均用时”，成功率用拉普拉斯平滑估计。
+    """
+    expected = 0.0
+    reach = 1.0
+    for model in cascade[start:]:
+        stats = model_stats.get(model, {})
+        attempts = stats.get("attempts", 0)
+        success_rate = (stats.get("successes", 0) + 1) / (attempts + 2)
+        seconds = stats["seconds"] / attempts if attempts else fallback_seconds
+        expected += reach * seconds
+        reach *= 1 - success_rate
+    return expected
+
+
+def choose_start_tier(model_stats, cascade):
+    """
+    根据历史数据选择起始级别，数据不足时从最便宜的模型开始。
+    """
+    if sum(model_stats.get(model, {}).get("attempts", 0) for model in cascade) < constants.LLM_ROUTER_MIN_SAMPLES:
+        return 0
+    known = [s["seconds"] / s["attempts"] for s in model_stats.values() if s.get("attempts")]
+    fallback_seconds = sum(known) / len(known) if known else DEFAULT_TIER_SECONDS
+    return min(range(len(cascade)), key=lambda tier: _expected_seconds(model_stats, cascade, tier, fallback_seconds))
+
+
+class ModelRouter:
+    """
+    单道题目的模型选择。
+
+    用法：
+        router = ModelRouter(problem["pass_rate"])
+        router.model                       # 当前使用的模型
+        router.record_failure("compile")   # 本地测试失败，达到升级条件时切换到更强的模型
+        router.finish(success)             # 记录结果
+    """
+
+    def __init__(self, pass_rate, cascade=None, path=stats_path):
+        self.cascade = cascade or get_cascade()
+        self.bucket = pass_rate_bucket(pass_rate)
+        self.path = path
+        self.tier = choose_start_tier(load_stats(path).get(self.bucket, {}), self.cascade)
+        self.failures = 0  # 当前级别的失败次数
+        self.tier_started = time.time()
+        self.outcomes = []  # [(模型, 用时, 是否成功)]
+
+    @property
+    def model(self):
+        return self.cascade[self.tier]
+
+    def record_failure(self, signal):
+        """
+        记录一次失败。
+
+        Args:
+            signal (str): "compile"（编译失败）、"wrong_answer"（样例未通过）或 "regenerate"（修复失败、重新生成）。
+
+        Returns:
+            bool: 是否升级到了更强的模型。
+        """
+        self.failures += 1
+        if signal == "regenerate" and constants.LLM_ESCALATE_ON_REGENERATE:
+            return self.escalate()
+        if self.failures >= constants.LLM_ESCALATE_AFTER_FAILURES:
+            return self.escalate()
+        return False
+
+    def escalate(self):
+        if self.tier + 1 >= len(self.cascade):
+            return False
+        self.outcomes.append((self.model, time.time() - self.tier_started, False))
+        self.tier += 1
+        self.failures = 0
+        self.tier_started = time.time()
+        print(f"升级到更强的模型: {self.model}")
+        return True
+
+    def finish(self, success):
+        """
+        记录本题在各个级别上的结果，供之后的题目选择起始模型。
+        """
+        self.outcomes.append((self.model, time.time() - self.tier_started, success))
+        stats = load_stats(self.path)
+        bucket = stats.setdefault(self.bucket, {})
+        for model, seconds, ok in self.outcomes:
+            model_stats = bucket.setdefault(model, {"attempts": 0, "successes": 0, "seconds": 0.0})
+            model_stats["attempts"] += 1
+            model_stats["successes"] += int(ok)
+            model_stats["seconds"] += seconds
+        self.outcomes = []
+        try:
+            cache_utils.atomic_write_json(self.path, stats)
+        except OSError as e:
+            print(f"保存模型路由统计失败: {e}")
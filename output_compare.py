@@ -0,0 +1,182 @@
+"""
+流式比较程序输出与预期输出：边读取程序的标准输出边比较，发现第一处不一致时立即停止，
+调用方可以随即终止进程，不必等程序运行结束（或超时）、也不必把全部输出读进内存。
+
+比较规则：
+    "line"   逐行比较，忽略每行首尾的空白以及输出开头和结尾的空行（与原来的整体比较规则相同）
+    "token"  按空白分隔逐个比较，忽略所有空白的差异
+float_epsilon 大于 0 时，两边都是数值的片段允许 max(1, |预期值|)·float_epsilon 以内的误差。
+"""
+import codecs
+
+import constants
+
+# 不一致时保留的程序输出长度（字符），用于反馈给LLM
+MAX_CAPTURED_CHARS = 4096
+
+_END_OF_OUTPUT = "（输出结束）"
+_OUTPUT_ENDED_EARLY = "（输出提前结束）"
+
+
+def _numbers_close(actual, expected, epsilon):
+    try:
+        a, b = float(actual), float(expected)
+    except ValueError:
+        return False
+    return abs(a - b) <= epsilon * max(1.0, abs(b))
+
+
+def _tokens_equal(actual, expected, epsilon):
+    if actual == expected:
+        return True
+    return epsilon > 0 and _numbers_close(actual, expected, epsilon)
+
+
+def _show(text):
+    # 输出结束等说明文字不加引号
+    return text if text in (_END_OF_OUTPUT, _OUTPUT_ENDED_EARLY) else repr(text)
+
+
+class StreamingComparator:
+    """
+    用法：
+        comparator = StreamingComparator(expected_output)
+        comparator.feed(chunk)   # 返回 False 表示已经出现不一致
+        comparator.finish()      # 程序结束后调用，返回是否完全一致
+        comparator.mismatch      # 第一处不一致的描述
+    """
+
+    def __init__(self, expected, mode=None, float_epsilon=None):
+        self.mode = mode or constants.OUTPUT_COMPARE_MODE
+        self.float_epsilon = constants.OUTPUT_FLOAT_EPSILON if float_epsilon is None else float_epsilon
+        if self.mode == "token":
+            self._expected = expected.split()
+        else:
+            self._expected = [line.strip() for line in expected.strip().splitlines()]
+        self._position = 0  # 下一个要比较的预期行/片段
+        self._pending = ""  # 还不完整的最后一行/片段
+        self._blank_lines = 0  # 行模式下暂未比较的连续空行，可能是结尾的空行
+        self._started = False  # 行模式下是否已经出现过非空行
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.captured = []  # 程序输出的开头部分
+        self._captured_chars = 0
+        self.truncated = False  # 程序输出超过 MAX_CAPTURED_CHARS，captured 只有开头的部分
+        self.mismatch = None
+
+    @property
+    def failed(self):
+        return self.mismatch is not None
+
+    def feed(self, data):
+        """
+        追加一段程序输出（bytes 或 str）。
+
+        Returns:
+            bool: 目前为止是否一致。
+        """
+        if self.failed:
+            return False
+        text = self._decoder.decode(data) if isinstance(data, bytes) else data
+        kept = text[:max(0, MAX_CAPTURED_CHARS - self._captured_chars)]
+        if kept:
+            self.captured.append(kept)
+            self._captured_chars += len(kept)
+        if len(kept) < len(text):
+            self.truncated = True
+        text = self._pending + text
+        if self.mode == "token":
+            # 末尾没有空白时最后一个片段可能还不完整
+            parts = text.split()
+            self._pending = parts.pop() if parts and not text[-1].isspace() else ""
+            for token in parts:
+                if not self._compare_token(token):
+                    return False
+        else:
+            lines = text.split("\n")
+            self._pending = lines.pop()
+            for line in lines:
+                if not self._compare_line(line.strip()):
+                    return False
+            # 一直不换行的输出：还没结束的这一行已经比预期的行长，不必等到换行
+            if self.float_epsilon <= 0 and not self._blank_lines and self._pending:
+                expected = self._expected[self._position] if self._position < len(self._expected) else ""
+                if len(self._pending.strip()) > len(expected):
+                    self._fail(expected or _END_OF_OUTPUT, self._pending.strip()[:len(expected) + 20] + "...")
+                    return False
+        return True
+
+    def finish(self):
+        """
+        程序输出结束，比较剩余的部分。
+
+        Returns:
+            bool: 输出是否与预期完全一致。
+        """
+        if self.failed:
+            return False
+        tail = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        if self.mode == "token":
+            for token in tail.split():
+                if not self._compare_token(token):
+                    return False
+        elif tail.strip() and not self._compare_line(tail.strip()):
+            return False
+        # 结尾的空行忽略
+        if self._position < len(self._expected):
+            self._fail(self._expected[self._position], _OUTPUT_ENDED_EARLY)
+            return False
+        return True
+
+    @property
+    def actual_output(self):
+        """
+        程序输出的开头部分（最多 MAX_CAPTURED_CHARS 个字符）。
+        """
+        return "".join(self.captured)
+
+    def _fail(self, expected, actual):
+        unit = "个片段" if self.mode == "token" else "行"
+        self.mismatch = f"第 {self._position + 1} {unit}不一致：预期 {_show(expected)}，实际 {_show(actual)}"
+
+    def _compare_token(self, token):
+        if self._position >= len(self._expected):
+            self._fail(_END_OF_OUTPUT, token)
+            return False
+        if not _tokens_equal(token, self._expected[self._position], self.float_epsilon):
+            self._fail(self._expected[self._position], token)
+            return False
+        self._position += 1
+        return True
+
+    def _line_equal(self, actual, expected):
+        if actual == expected:
+            return True
+        if self.float_epsilon <= 0:
+            return False
+        actual_tokens, expected_tokens = actual.split(), expected.split()
+        return len(actual_tokens) == len(expected_tokens) and all(
+            _tokens_equal(a, b, self.float_epsilon) for a, b in zip(actual_tokens, expected_tokens))
+
+    def _compare_line(self, line):
+        if not line:
+            # 空行先记下，出现下一个非空行时再比较，输出结尾的空行不影响结果
+            if self._started:
+                self._blank_lines += 1
+            return True
+        self._started = True
+        while self._blank_lines:
+            if self._position >= len(self._expected) or self._expected[self._position]:
+                self._fail(self._expected[self._position] if self._position < len(self._expected) else _END_OF_OUTPUT,
+                           "")
+                return False
+            self._position += 1
+            self._blank_lines -= 1
+        if self._position >= len(self._expected):
+            self._fail(_END_OF_OUTPUT, line)
+            return False
+        if not self._line_equal(line, self._expected[self._position]):
+            self._fail(self._expected[self._position], line)
+            return False
+        self._position += 1
+        return True
@@ -0,0 +1,133 @@
+"""
+预编译头：为每组编译选项预编译一份 bits/stdc++.h，编译时通过 -I 指向预编译头所在的目录。
+
+生成的代码几乎都包含 <bits/stdc++.h>，解析这个头文件占了编译时间的大部分。
+GCC 在包含目录中查找头文件时，如果同一位置存在有效的 .gch 文件就直接使用，
+因此把 stdc++.h 和预编译的 stdc++.h.gch 放在 {COMPILE_PCH_DIR}/{key}/bits/ 下即可，不需要修改源代码。
+.gch 与本次编译的选项不兼容（例如 bits/stdc++.h 不是第一个包含的头文件）时，GCC 会退回到同目录下的 stdc++.h，
+结果与不使用预编译头相同。
+
+预编译头在后台线程中构建（约数秒），构建完成前的编译照常进行，不等待；
+程序退出时会等待正在进行的构建完成，下次运行可以直接使用。
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+
+import compile_cache
+import constants
+
+pch_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), constants.COMPILE_PCH_DIR)
+
+HEADER = "bits/stdc++.h"
+
+_lock = threading.Lock()
+_headers = {}  # 编译器路径 -> bits/stdc++.h 的路径，找不到时为 ""
+_states = {}  # 预编译头目录 -> "building"、"ready" 或 "failed"
+
+
+def find_header(compiler_path):
+    """
+    查找编译器使用的 bits/stdc++.h（解析 -H 输出的第一个头文件），找不到时返回 None。
+    """
+    with _lock:
+        if compiler_path in _headers:
+            return _headers[compiler_path] or None
+    header = ""
+    try:
+        proc = subprocess.run([compiler_path, "-x", "c++", "-E", "-H", "-", "-o", os.devnull],
+                              input=f"#include <{HEADER}>\n", capture_output=True, text=True, timeout=30)
+        for line in proc.stderr.splitlines():
+            if line.startswith(". "):
+                header = line[2:].strip()
+                break
+    except (OSError, subprocess.SubprocessError):
+        pass
+    if header and not os.path.isfile(header):
+        header = ""
+    with _lock:
+        _headers[compiler_path] = header
+    return header or None
+
+
+def _pch_dir(compiler_path, compile_flags):
+    payload = json.dumps({
+        "version": compile_cache.compiler_version(compiler_path),
+        "flags": list(compile_flags or []),
+    }, sort_keys=True)
+    return os.path.join(pch_root, hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16])
+
+
+def _build(compiler_path, compile_flags, header, pch_dir):
+    bits_dir = os.path.join(pch_dir, os.path.dirname(HEADER))
+    gch_path = os.path.join(pch_dir, HEADER + ".gch")
+    tmp_path = f"{gch_path}.tmp{os.getpid()}"
+    command = [compiler_path, "-x", "c++-header", header, "-o", tmp_path] + list(compile_flags or [])
+    print(f"开始构建预编译头：{' '.join(command)}")
+    try:
+        os.makedirs(bits_dir, exist_ok=True)
+        # 清理上次被中断的构建留下的临时文件
+        for name in os.listdir(bits_dir):
+            if ".gch.tmp" in name:
+                os.remove(os.path.join(bits_dir, name))
+        shutil.copyfile(header, os.path.join(pch_dir, HEADER))
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip() or f"退出码 {proc.returncode}")
+        os.replace(tmp_path, gch_path)
+        state = "ready"
+        print(f"预编译头构建完成：{gch_path}")
+    except Exception as e:
+        state = "failed"
+        print(f"警告：预编译头构建失败，编译时不使用预编译头: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    with _lock:
+        _states[pch_dir] = state
+
+
+def prepare(compiler_path=constants.COMPILER_PATH, compile_flags=None, wait=False):
+    """
+    确保这组编译选项的预编译头已经构建或正在后台构建。
+
+    Returns:
+        str or None: 预编译头可用时返回应加入 -I 的目录，否则返回 None。
+    """
+    if not constants.COMPILE_USE_PCH or "clang" in compile_cache.compiler_version(compiler_path).lower():
+        # clang 不会自动使用 .gch
+        return None
+    pch_dir = _pch_dir(compiler_path, compile_flags)
+    with _lock:
+        state = _states.get(pch_dir)
+        if state is None and os.path.isfile(os.path.join(pch_dir, HEADER + ".gch")):
+            state = _states[pch_dir] = "ready"
+    if state is None:
+        header = find_header(compiler_path)
+        with _lock:
+            state = _states.get(pch_dir)
+            if state is None:
+                state = _states[pch_dir] = "building" if header else "failed"
+                thread = threading.Thread(target=_build, args=(compiler_path, compile_flags, header, pch_dir),
+                                          name="pch-build") if header else None
+            else:
+                thread = None
+        if thread is not None:
+            thread.start()
+            if wait:
+                thread.join()
+                with _lock:
+                    state = _states[pch_dir]
+    return pch_dir if state == "ready" else None
+
+
+def pch_flags(compiler_path=constants.COMPILER_PATH, compile_flags=None):
+    """
+    编译时需要追加的选项，预编译头还没有构建好时返回空列表。
+    """
+    pch_dir = prepare(compiler_path, compile_flags)
+    return ["-I", pch_dir] if pch_dir else []
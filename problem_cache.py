@@ -0,0 +1,50 @@
+import os
+import time
+import cache_utils
+import constants
+
+# 题目缓存目录，每道题目一个 {problem_id}.json 文件
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), constants.PROBLEM_CACHE_DIR)
+
+
+def _entry_path(problem_id):
+    return os.path.join(cache_dir, f"{problem_id}.json")
+
+
+def load(problem_id):
+    """
+    读取题目的缓存项。
+
+    Returns:
+        dict or None: 缓存项，包含 html、markdown、input_output_samples、pms_question_version_id、ir、
+                      etag、last_modified、fetched_at 等字段；不存在或已损坏时返回 None。
+    """
+    path = _entry_path(problem_id)
+    entry = cache_utils.read_json(path)
+    if not isinstance(entry, dict) or "markdown" not in entry:
+        return None
+    cache_utils.touch(path)
+    return entry
+
+
+def is_fresh(entry, ttl=constants.PROBLEM_CACHE_TTL):
+    """
+    判断缓存项是否仍在有效期内，有效期内的缓存可以直接使用而无需向服务器确认。
+    """
+    return time.time() - entry.get("fetched_at", 0) < ttl
+
+
+def store(problem_id, entry):
+    """
+    写入（或覆盖）题目的缓存项，并在缓存超过大小上限时淘汰最久未使用的题目。
+    """
+    entry["fetched_at"] = time.time()
+    cache_utils.atomic_write_json(_entry_path(problem_id), entry)
+    cache_utils.evict_lru(cache_dir, constants.PROBLEM_CACHE_MAX_SIZE)
+
+
+def invalidate(problem_id):
+    try:
+        os.remove(_entry_path(problem_id))
+    except OSError:
+        pass
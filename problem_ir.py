@@ -0,0 +1,217 @@
+"""
+题目的中间表示（IR）：解析HTML得到的题目结构，可以序列化后缓存，并按不同的风格渲染为 Markdown，
+更换提示词风格时不需要重新解析HTML。
+"""
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class Text:
+    content: str
+
+
+@dataclass(slots=True)
+class Tex:
+    content: str
+
+
+@dataclass(slots=True)
+class Code:
+    content: str
+
+
+@dataclass(slots=True)
+class Image:
+    src: str
+
+
+@dataclass(slots=True)
+class Hr:
+    pass
+
+
+@dataclass(slots=True)
+class Table:
+    header: list  # 表头单元格列表，每个单元格是行内节点（Text/Tex/Code/Image）的列表
+    rows: list  # 表格行列表，每行是单元格列表
+
+
+@dataclass(slots=True)
+class Sample:
+    title: str  # 例如 "输入#1"、"输出#1"
+    content: str
+
+
+@dataclass(slots=True)
+class Section:
+    title: str
+    type: str  # "text"：正文节点列表；"input_output"：样例组列表
+    content: list
+
+
+@dataclass(slots=True)
+class Problem:
+    title: str
+    pass_rates: list  # 通过率、时间限制、内存限制等信息
+    sections: list = field(default_factory=list)
+
+    def input_output_samples(self):
+        """
+        Returns:
+            list: [{"input": ..., "output": ...}, ...]，每组样例一个字典。
+        """
+        samples = []
+        for section in self.sections:
+            if section.type != "input_output":
+                continue
+            for group in section.content:
+                sample = {}
+                for item in group:
+                    if item.title.startswith("输入"):
+                        sample["input"] = item.content
+                    elif item.title.startswith("输出"):
+                        sample["output"] = item.content
+                samples.append(sample)
+        return samples
+
+
+# ---------- 序列化 ----------
+
+_INLINE_TYPES = {"text": Text, "tex": Tex, "code": Code, "image": Image}
+_INLINE_NAMES = {cls: name for name, cls in _INLINE_TYPES.items()}
+
+
+def _node_to_list(node):
+    if isinstance(node, Hr):
+        return ["hr"]
+    if isinstance(node, Table):
+        return ["table",
+                [[_node_to_list(n) for n in cell] for cell in node.header],
+                [[[_node_to_list(n) for n in cell] for cell in row] for row in node.rows]]
+    return [_INLINE_NAMES[type(node)], node.src if isinstance(node, Image) else node.content]
+
+
+def _node_from_list(data):
+    if data[0] == "hr":
+        return Hr()
+    if data[0] == "table":
+        return Table([[_node_from_list(n) for n in cell] for cell in data[1]],
+                     [[[_node_from_list(n) for n in cell] for cell in row] for row in data[2]])
+    return _INLINE_TYPES[data[0]](data[1])
+
+
+def to_dict(problem):
+    """
+    把 Problem 转换为可以直接 JSON 序列化的字典。
+    """
+    sections = []
+    for section in problem.sections:
+        if section.type == "input_output":
+            content = [[[sample.title, sample.content] for sample in group] for group in section.content]
+        else:
+            content = [_node_to_list(node) for node in section.content]
+        sections.append([section.title, section.type, content])
+    return {"title": problem.title, "pass_rates": problem.pass_rates, "sections": sections}
+
+
+def from_dict(data):
+    sections = []
+    for title, section_type, content in data["sections"]:
+        if section_type == "input_output":
+            content = [[Sample(title_, content_) for title_, content_ in group] for group in content]
+        else:
+            content = [_node_from_list(node) for node in content]
+        sections.append(Section(title, section_type, content))
+    return Problem(data["title"], data["pass_rates"], sections)
+
+
+# ---------- 渲染 ----------
+
+@dataclass(slots=True, frozen=True)
+class RenderStyle:
+    tex_format: str = "$ {} $"  # 行内公式的格式
+    sample_fence: str = "text"  # 样例代码块的语言标记
+    show_limits: bool = True  # 是否输出时间/内存限制
+
+
+STYLES = {
+    "default": RenderStyle(),
+    # 更紧凑的公式写法，可以节省一些提示词 token
+    "compact": RenderStyle(tex_format="${}$"),
+}
+
+
+def get_style(style):
+    if style is None:
+        return STYLES["default"]
+    if isinstance(style, str):
+        return STYLES[style]
+    return style
+
+
+def _render_inline(node, style, parts):
+    if isinstance(node, Text):
+        parts.append(node.content)
+    elif isinstance(node, Tex):
+        parts.append(style.tex_format.format(node.content))
+    elif isinstance(node, Image):
+        parts.append(f"![]({node.src})")
+    elif isinstance(node, Hr):
+        parts.append("---")
+    elif isinstance(node, Code):
+        if "\n" not in node.content:
+            parts.append(f"`{node.content}`")
+        else:
+            parts.append(f"```\n{node.content}\n```")
+
+
+def _render_cell(cell, style):
+    parts = []
+    for node in cell:
+        _render_inline(node, style, parts)
+    # 单元格只能占一行，竖线需要转义
+    return " ".join("".join(parts).split()).replace("|", "\\|")
+
+
+def _render_table(table, style, parts):
+    width = max([len(table.header)] + [len(row) for row in table.rows])
+    if width == 0:
+        return
+    header = [_render_cell(cell, style) for cell in table.header]
+    header += [""] * (width - len(header))
+    parts.append("\n\n| " + " | ".join(header) + " |\n")
+    parts.append("|" + " --- |" * width + "\n")
+    for row in table.rows:
+        cells = [_render_cell(cell, style) for cell in row]
+        cells += [""] * (width - len(cells))
+        parts.append("| " + " | ".join(cells) + " |\n")
+
+
+def render_markdown(problem, style=None):
+    """
+    把 Problem 渲染为 Markdown（尚未经过 format_markdown 整理）。
+
+    Args:
+        problem (Problem): 题目IR。
+        style (RenderStyle or str, optional): 渲染风格或 STYLES 中的风格名，默认为 "default"。
+    """
+    style = get_style(style)
+    parts = [f"# {problem.title}\n"]
+    if style.show_limits:
+        parts.append(f"#### 限制：{' | '.join(problem.pass_rates[1:])}\n")
+    for section in problem.sections:
+        parts.append(f"### {section.title}\n")
+        if section.type == "text":
+            for node in section.content:
+                if isinstance(node, Table):
+                    _render_table(node, style, parts)
+                else:
+                    _render_inline(node, style, parts)
+        elif section.type == "input_output":
+            for group in section.content:
+                for sample in group:
+                    parts.append(f"#### {sample.title}\n\n")
+                    parts.append(f"```{style.sample_fence}\n{sample.content}\n```\n")
+        parts.append("\n")
+    return "".join(parts)
+
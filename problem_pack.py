@@ -0,0 +1,158 @@
+"""
+题目合集打包格式：把大量题目（IR、Markdown、样例）追加写入同一个数据文件，并用定长索引记录每道题的位置，
+读取时通过 mmap 按题目ID直接定位，不需要加载整个合集，也不需要扫描成千上万个小文件。
+
+文件结构：
+    {path}.dat  文件头 PACK_MAGIC，之后是逐条追加的题目记录（zlib 压缩的 JSON）
+    {path}.idx  每道题一条定长索引 (problem_id, offset, length)，同一题目重复写入时以最后一条为准
+
+用法：
+    python problem_pack.py export corpus 1-1000   # 抓取题目 1~1000 写入 corpus.dat/corpus.idx
+    python problem_pack.py show corpus 1001       # 查看合集中的一道题
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+
+import get_problem
+import problem_prefetcher
+
+PACK_MAGIC = b"ACGOPK01"
+INDEX_ENTRY = struct.Struct("<qQI")  # problem_id, offset, length
+
+
+class PackWriter:
+    """
+    以追加方式写入题目合集。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = open(f"{path}.dat", "ab")
+        self._index = open(f"{path}.idx", "ab")
+        if self._data.tell() == 0:
+            self._data.write(PACK_MAGIC)
+
+    def add(self, record):
+        """
+        写入一道题目，record 为 get_problem.get_problem_info/load_problem 返回的题目记录。
+        """
+        payload = zlib.compress(json.dumps(get_problem.record_to_dict(record), ensure_ascii=False).encode("utf-8"))
+        offset = self._data.tell()
+        self._data.write(payload)
+        # 先写数据再写索引，中途中断时最多留下一段没有索引的数据，不会产生指向无效数据的索引
+        self._data.flush()
+        self._index.write(INDEX_ENTRY.pack(int(record["problem_id"]), offset, len(payload)))
+        self._index.flush()
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PackReader:
+    """
+    通过 mmap 随机读取题目合集。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._offsets = {}  # problem_id -> (offset, length)
+        with open(f"{path}.idx", "rb") as f:
+            index_data = f.read()
+        # 忽略末尾可能不完整的索引项
+        usable = len(index_data) - len(index_data) % INDEX_ENTRY.size
+        for problem_id, offset, length in INDEX_ENTRY.iter_unpack(index_data[:usable]):
+            self._offsets[problem_id] = (offset, length)
+
+        self._file = open(f"{path}.dat", "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(PACK_MAGIC)] != PACK_MAGIC:
+            self.close()
+            raise ValueError(f"'{path}.dat' 不是有效的题目合集文件")
+
+    def get(self, problem_id):
+        """
+        Returns:
+            dict or None: 题目记录，格式同 get_problem.get_problem_info；合集中没有该题目时返回 None。
+        """
+        location = self._offsets.get(int(problem_id))
+        if location is None:
+            return None
+        offset, length = location
+        entry = json.loads(zlib.decompress(self._mmap[offset:offset + length]))
+        return get_problem.record_from_dict(entry["problem_id"], entry)
+
+    def problem_ids(self):
+        return list(self._offsets)
+
+    def __contains__(self, problem_id):
+        return int(problem_id) in self._offsets
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_problems(problem_ids, path, skip_existing=True, **prefetch_kwargs):
+    """
+    并发抓取题目并写入合集。
+
+    Args:
+        problem_ids (iterable): 题目ID列表或 range。
+        path (str): 合集路径（不含扩展名）。
+        skip_existing (bool): 跳过合集中已有的题目。
+        **prefetch_kwargs: 传递给 problem_prefetcher.prefetch_problems 的参数。
+
+    Returns:
+        tuple: (写入的题目数, 失败的题目ID列表)
+    """
+    problem_ids = list(problem_ids)
+    if skip_existing and os.path.exists(f"{path}.idx") and os.path.exists(f"{path}.dat"):
+        with PackReader(path) as reader:
+            problem_ids = [problem_id for problem_id in problem_ids if problem_id not in reader]
+
+    written = 0
+    failed = []
+    with PackWriter(path) as writer:
+        for problem_id, record, error in problem_prefetcher.prefetch_problems(problem_ids, **prefetch_kwargs):
+            if error is not None:
+                print(f"[ERROR] P{problem_id} 获取失败: {error}")
+                failed.append(problem_id)
+                continue
+            writer.add(record)
+            written += 1
+    return written, failed
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4 or sys.argv[1] not in ("export", "show"):
+        print(__doc__)
+        sys.exit(1)
+    if sys.argv[1] == "export":
+        t = time.time()
+        count, failed_ids = export_problems(problem_prefetcher.parse_problem_ids(sys.argv[3]), sys.argv[2])
+        print(f"done! 写入 {count} 道题目，失败 {len(failed_ids)} 道", f"time: {time.time() - t:.2f}s")
+    else:
+        with PackReader(sys.argv[2]) as pack_reader:
+            problem = pack_reader.get(int(sys.argv[3]))
+            print(problem["markdown"] if problem else f"合集中没有题目 {sys.argv[3]}")
@@ -0,0 +1,117 @@
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import constants
+import get_problem
+
+
+class HostRateLimiter:
+    """
+    按主机限制请求频率：同一主机相邻两次请求的发出时间至少间隔 min_interval 秒。
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = {}  # 主机 -> 下一次允许发出请求的时间
+
+    def wait(self, url):
+        if self.min_interval <= 0:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PooledSession(requests.Session):
+    """
+    保持长连接的会话，连接池大小与并发数一致，每次请求前按主机限速。
+    """
+
+    def __init__(self, pool_size, rate_limiter=None):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(url)
+        return super().request(method, url, *args, **kwargs)
+
+
+def parse_problem_ids(text):
+    """
+    解析题目ID列表，支持逗号分隔和区间，例如 "1-10,15,20-22"。
+    """
+    problem_ids = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            problem_ids.extend(range(int(start), int(end) + 1))
+        else:
+            problem_ids.append(int(part))
+    return problem_ids
+
+
+def prefetch_problems(problem_ids, max_workers=constants.PREFETCH_MAX_WORKERS,
+                      min_interval=constants.PREFETCH_MIN_INTERVAL,
+                      use_cache=constants.PROBLEM_CACHE_ENABLED, refresh=False):
+    """
+    并发获取多道题目的页面和统计信息，每完成一道就立即返回其结果。
+    获取到的题目会写入题目缓存，之后 auto_ac_problem 处理这些题目时无需再访问网络。
+
+    Args:
+        problem_ids (iterable): 题目ID列表或 range。
+        max_workers (int): 同时处理的题目数上限，也是连接池的大小。
+        min_interval (float): 对同一主机相邻两次请求的最小间隔（秒），为 0 时不限速。
+        use_cache (bool): 是否读写题目缓存。
+        refresh (bool): 是否忽略已有缓存强制重新下载。
+
+    Yields:
+        tuple: (problem_id, record, error)，成功时 error 为 None，失败时 record 为 None。
+    """
+    session = PooledSession(max_workers, HostRateLimiter(min_interval))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            executor.submit(get_problem.load_problem, problem_id, use_cache, refresh, session): problem_id
+            for problem_id in problem_ids
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+    finally:
+        # 调用方提前停止迭代时，取消尚未开始的任务
+        executor.shutdown(wait=True, cancel_futures=True)
+        session.close()
+
+
+if __name__ == '__main__':
+    # 用法: python problem_prefetcher.py 1-100,205
+    ids = parse_problem_ids(sys.argv[1] if len(sys.argv) > 1 else "1-10")
+    t = time.time()
+    ok_count = 0
+    for problem_id, record, error in prefetch_problems(ids):
+        if error is None:
+            ok_count += 1
+            print(f"[INFO] P{problem_id} 获取完成，共 {len(record['input_output_samples'])} 组样例")
+        else:
+            print(f"[ERROR] P{problem_id} 获取失败: {error}")
+    print(f"done! {ok_count}/{len(ids)}", f"time: {time.time() - t:.2f}s")
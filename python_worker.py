@@ -0,0 +1,160 @@
+"""
+常驻的 Python 解释器进程，由 run_python 启动，不要直接运行。
+
+启动参数：与 run_python 通信的 Unix 域套接字的文件描述符，以及预先导入的模块列表（JSON）。
+每个任务是一行 JSON（要运行的代码路径和资源限制），同时通过 SCM_RIGHTS 传入子进程的标准输入、输出、错误三个管道；
+收到任务后 fork 出子进程，在子进程中设置资源限制、接上管道并执行代码，
+先回复一行 {"pid"}，子进程结束后再回复一行 {"returncode", "cpu_ms", "max_rss_kb"}。
+
+这个文件只使用标准库，并且不导入项目中的其他模块，可以在 constants.PYTHON_PATH 指定的其他版本的解释器中运行。
+"""
+import array
+import importlib
+import json
+import os
+import signal
+import socket
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _receive_job(sock):
+    """
+    读取一个任务，返回 (job, fds)；连接关闭时返回 (None, [])。
+    """
+    data = b""
+    fds = []
+    while not data.endswith(b"\n"):
+        fd_size = array.array("i").itemsize
+        message, ancillary, _, _ = sock.recvmsg(65536, socket.CMSG_SPACE(3 * fd_size))
+        for level, kind, payload in ancillary:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                received = array.array("i")
+                received.frombytes(payload[:len(payload) - len(payload) % fd_size])
+                fds.extend(received)
+        if not message:
+            for fd in fds:
+                os.close(fd)
+            return None, []
+        data += message
+    return json.loads(data.decode("utf-8")), fds
+
+
+def _set_limits(job):
+    if resource is None:
+        return
+    cpu_seconds = job["cpu_seconds"]
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    if job["address_space"]:
+        resource.setrlimit(resource.RLIMIT_AS, (job["address_space"], job["address_space"]))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (job["output_bytes"], job["output_bytes"]))
+    if job["processes"] and hasattr(resource, "RLIMIT_NPROC"):
+        resource.setrlimit(resource.RLIMIT_NPROC, (job["processes"], job["processes"]))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def _run_child(sock, job, fds):
+    """
+    在 fork 出的子进程中执行代码，不返回。
+    """
+    code = 1
+    try:
+        os.setpgid(0, 0)
+        sock.close()
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        _set_limits(job)
+        # 与用 python 直接运行代码时相同：管道上的标准输出完全缓冲，标准错误按行缓冲
+        sys.stdin = sys.__stdin__ = open(0, "r", encoding="utf-8", closefd=False)
+        sys.stdout = sys.__stdout__ = open(1, "w", encoding="utf-8", closefd=False)
+        sys.stderr = sys.__stderr__ = open(2, "w", encoding="utf-8", errors="backslashreplace", buffering=1,
+                                           closefd=False)
+        # 在代码所在的目录中运行，错误信息中只出现文件名，代码创建的文件也留在工作目录中
+        os.chdir(os.path.dirname(job["path"]))
+        path = os.path.basename(job["path"])
+        sys.argv = [path]
+        sys.path[0] = os.getcwd()
+        if "random" in sys.modules:
+            # 预先导入的 random 在所有子进程中状态相同，重新设置种子
+            sys.modules["random"].seed()
+
+        import runpy
+        import threading
+        import traceback
+        code = 0
+        try:
+            runpy.run_path(path, run_name="__main__")
+            # 与解释器正常退出时一样，等待代码创建的非守护线程（例如为了加大栈空间而在新线程中运行的代码）
+            for thread in threading.enumerate():
+                if thread is not threading.main_thread() and not thread.daemon:
+                    thread.join()
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException as e:
+            # 与直接运行代码时相同，错误信息从代码本身的调用栈开始，不包括这里和 runpy 的部分
+            tb = e.__traceback__
+            while tb is not None and tb.tb_frame.f_code.co_filename != path:
+                tb = tb.tb_next
+            traceback.print_exception(type(e), e, tb or e.__traceback__)
+            code = 1
+        try:
+            sys.stdout.flush()
+        except (BrokenPipeError, OSError):
+            pass
+        sys.stderr.flush()
+    except BaseException:
+        pass
+    finally:
+        os._exit(code)
+
+
+def _send(sock, payload):
+    sock.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+
+
+def main():
+    sock = socket.socket(fileno=int(sys.argv[1]))
+    for name in json.loads(sys.argv[2]):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    # 主程序被 Ctrl+C 中断时由主程序关闭连接，常驻进程随之退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        job, fds = _receive_job(sock)
+        if job is None:
+            break
+        pid = os.fork()
+        if pid == 0:
+            _run_child(sock, job, fds)
+        try:
+            os.setpgid(pid, pid)
+        except OSError:
+            pass
+        for fd in fds:
+            os.close(fd)
+        _send(sock, {"pid": pid})
+        _, status, usage = os.wait4(pid, 0)
+        if os.WIFSIGNALED(status):
+            returncode = -os.WTERMSIG(status)
+        else:
+            returncode = os.WEXITSTATUS(status)
+        # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+        max_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+        _send(sock, {"returncode": returncode, "cpu_ms": (usage.ru_utime + usage.ru_stime) * 1000,
+                     "max_rss_kb": max_rss_kb})
+
+
+if __name__ == "__main__":
+    main()
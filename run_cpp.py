@@ -1,12 +1,24 @@
 import subprocess
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cache_utils
+import compile_cache
 import constants
+import pch
+import run_python
+
+_compile_pool = None  # 后台编译线程池，首次使用时创建
+_compile_pool_lock = threading.Lock()
+# 每次编译的用时统计，见 summarize_compile_stats
+compile_stats = []
 
 
 def compile_cpp(source_file, compiler_path=constants.COMPILER_PATH, executable_name=None, compile_flags=None):
     """
-    编译 C++ 源文件。
+    编译 C++ 源文件。相同的代码、编译器和编译选项编译过时直接使用编译缓存中的结果。
 
     Args:
         source_file (str): C++ 源文件路径 (.cpp)。
@@ -36,9 +48,26 @@ def compile_cpp(source_file, compiler_path=constants.COMPILER_PATH, executable_n
     # 使用绝对路径或相对路径，这里用相对当前目录的
     executable_path = os.path.abspath(exec_name)  # 获取绝对路径以便后续使用
 
+    try:
+        with open(source_file, "r", encoding="utf-8") as f:
+            cache_key = compile_cache.artifact_key(f.read(), compiler_path, compile_flags)
+    except (OSError, UnicodeDecodeError):
+        cache_key = None
+    start_time = time.time()
+    if cache_key is not None:
+        cached = compile_cache.lookup(cache_key, source_file, executable_path)
+        if cached is not None:
+            print(f"命中编译缓存，{'编译成功' if cached[0] else '编译失败'}：{source_file}")
+            compile_stats.append({"mode": "cache", "seconds": time.time() - start_time})
+            return cached
+
     compile_command = [compiler_path, source_file, "-o", executable_path]
     if compile_flags:
         compile_command.extend(compile_flags)
+    # 预编译头构建好之后才会加入，不影响编译结果，因此不参与编译缓存的键
+    extra_flags = pch.pch_flags(compiler_path, compile_flags)
+    compile_command.extend(extra_flags)
+    mode = "pch" if extra_flags else "cold"
 
     print(f"执行编译命令：{' '.join(compile_command)}")
     try:
@@ -51,6 +80,9 @@ def compile_cpp(source_file, compiler_path=constants.COMPILER_PATH, executable_n
 
         compile_stdout = compile_proc.stdout
         compile_stderr = compile_proc.stderr
+        elapsed = time.time() - start_time
+        compile_stats.append({"mode": mode, "seconds": elapsed})
+        print(f"编译用时 {elapsed:.2f}s（{'使用预编译头' if mode == 'pch' else '未使用预编译头'}）")
 
         if compile_stdout:
             print(f"编译器标准输出:\n{compile_stdout.strip()}")
@@ -69,9 +101,13 @@ def compile_cpp(source_file, compiler_path=constants.COMPILER_PATH, executable_n
                     print(f"已清理可能存在的失败产物：{executable_path}")
                 except OSError as e:
                     print(f"警告：无法清理失败产物 '{executable_path}': {e}")
+            if cache_key is not None:
+                compile_cache.store(cache_key, source_file, (False, error_msg))
             return False, error_msg
         else:
             print(f"编译成功！可执行文件位于：{executable_path}")
+            if cache_key is not None:
+                compile_cache.store(cache_key, source_file, (True, executable_path))
             return True, executable_path
 
     except Exception as e:
@@ -80,14 +116,134 @@ def compile_cpp(source_file, compiler_path=constants.COMPILER_PATH, executable_n
         return False, error_msg
 
 
-def run_executable(executable_path, input_data, timeout_seconds=5):
+def get_compile_pool():
+    """
+    后台编译线程池，编译任务排队交给 constants.COMPILE_WORKERS 个线程执行。
+    """
+    global _compile_pool
+    with _compile_pool_lock:
+        if _compile_pool is None:
+            _compile_pool = ThreadPoolExecutor(max_workers=constants.COMPILE_WORKERS, thread_name_prefix="compile")
+        return _compile_pool
+
+
+def submit_compile(source_file, compiler_path=constants.COMPILER_PATH, executable_name=None, compile_flags=None):
+    """
+    把编译任务交给后台编译线程池。
+
+    Returns:
+        concurrent.futures.Future: 结果同 compile_cpp。
     """
-    运行一个可执行文件，提供输入并捕获输出。
+    return get_compile_pool().submit(compile_cpp, source_file, compiler_path, executable_name, compile_flags)
+
+
+def warm_up(compiler_path=constants.COMPILER_PATH, compile_flags=None):
+    """
+    提前创建编译线程池并开始在后台构建预编译头，通常在获取题目的同时调用，
+    等到第一次编译时预编译头已经可用。
+    """
+    get_compile_pool()
+    pch.prepare(compiler_path, compile_flags)
+
+
+def summarize_compile_stats():
+    """
+    按编译方式汇总编译用时。
+
+    Returns:
+        dict: {mode: {"count", "average_seconds"}}，mode 为 "cache"（命中编译缓存）、
+              "pch"（使用预编译头）或 "cold"（未使用预编译头）。
+    """
+    summary = {}
+    for stats in compile_stats:
+        entry = summary.setdefault(stats["mode"], {"count": 0, "total_seconds": 0.0})
+        entry["count"] += 1
+        entry["total_seconds"] += stats["seconds"]
+    return {mode: {"count": entry["count"], "average_seconds": entry["total_seconds"] / entry["count"]}
+            for mode, entry in summary.items()}
+
+
+class EarlyCompiler:
+    """
+    在LLM输出的代码块结束时立即在后台编译，不必等待整段回复结束。
+    submit 作为 generate_answer 的 on_code_block 回调；拿到完整回复后调用 save 和 compile，
+    如果代码与后台编译的一致，就直接复用后台编译的结果；与之前编译失败的代码相同时直接返回当时的错误。
+    """
+
+    def __init__(self, source_file, compiler_path=constants.COMPILER_PATH, compile_flags=None, compile_function=None):
+        self.source_file = source_file
+        self.compiler_path = compiler_path
+        self.compile_flags = compile_flags
+        # compile_function(source_file) 代替 compile_cpp，例如 Python 代码的语法检查（见 language.compile_source）
+        self.compile_function = compile_function
+        self._code = None  # 已写入源文件并提交后台编译的代码
+        self._future = None
+        self._failed = {}  # 编译失败过的代码 -> 编译错误信息，相同的代码不再重复编译
+
+    def _wait(self):
+        # 等待上一次后台编译结束，避免编译过程中源文件被覆盖
+        if self._future is not None:
+            self._future.result()
+            self._future = None
+        self._code = None
+
+    def submit(self, code):
+        if code in self._failed:
+            return
+        self._wait()
+        try:
+            cache_utils.atomic_write_bytes(self.source_file, code.encode("utf-8"))
+        except IOError as e:
+            print(f"警告：无法保存代码以提前编译 '{self.source_file}': {e}")
+            return
+        self._code = code
+        if self.compile_function is not None:
+            self._future = get_compile_pool().submit(self.compile_function, self.source_file)
+        else:
+            self._future = submit_compile(self.source_file, self.compiler_path, None, self.compile_flags)
+
+    def save(self, code):
+        """
+        保存代码到源文件，已提前写入相同代码时不再重复写入。
+        """
+        if code == self._code:
+            return
+        self._wait()
+        # 原子写入，同时处理同一道题的其他进程或编译器不会读到写了一半的代码
+        cache_utils.atomic_write_bytes(self.source_file, code.encode("utf-8"))
+
+    def compile(self, code):
+        """
+        编译代码，返回值同 compile_cpp。
+        """
+        if code in self._failed:
+            print(f"--- 代码与之前编译失败的版本相同，跳过编译: {self.source_file} ---")
+            return False, self._failed[code]
+        if code == self._code and self._future is not None:
+            print(f"--- 使用提前开始的编译结果: {self.source_file} ---")
+            future, self._future = self._future, None
+            self._code = None
+            result = future.result()
+        else:
+            self.save(code)
+            if self.compile_function is not None:
+                result = self.compile_function(self.source_file)
+            else:
+                result = compile_cpp(self.source_file, self.compiler_path, compile_flags=self.compile_flags)
+        if not result[0]:
+            self._failed[code] = result[1]
+        return result
+
+
+def run_executable(executable_path, input_data, timeout_seconds=5, on_start=None):
+    """
+    运行一个可执行文件，提供输入并捕获输出。Python 代码（.py）用解释器运行。
 
     Args:
-        executable_path (str): 要运行的可执行文件的路径。
+        executable_path (str): 要运行的可执行文件的路径，或 Python 源文件的路径。
         input_data (str): 要传递给程序标准输入的字符串。
         timeout_seconds (int): 运行的超时时间（秒）。
+        on_start (callable, optional): 进程启动后以 Popen 对象调用，调用方可以借此提前终止进程。
 
     Returns:
         tuple: (is_ok, run_stdout, run_stderr, message)
@@ -105,7 +261,8 @@ def run_executable(executable_path, input_data, timeout_seconds=5):
     # 在类 Unix 系统上，通常需要 './' 来运行当前目录的文件
     # 但如果 executable_path 是绝对路径，则不需要
     # subprocess 库通常能正确处理路径
-    run_command = [executable_path]
+    run_command = run_python.run_command(executable_path) if run_python.is_python_source(executable_path) \
+        else [executable_path]
     # 注意：在 Windows 上，如果路径包含空格，可能需要特殊处理，
     # 但 subprocess 通常能处理好列表形式的命令。
 
@@ -118,16 +275,22 @@ def run_executable(executable_path, input_data, timeout_seconds=5):
     is_ok = False
 
     try:
-        run_proc = subprocess.run(
+        run_proc = subprocess.Popen(
             run_command,
-            input=input_data,
-            capture_output=True,
-            text=True,
-            timeout=timeout_seconds
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
         )
-
-        run_stdout = run_proc.stdout
-        run_stderr = run_proc.stderr
+        if on_start is not None:
+            on_start(run_proc)
+        try:
+            run_stdout, run_stderr = run_proc.communicate(input_data, timeout=timeout_seconds)
+        except subprocess.TimeoutExpired:
+            run_proc.kill()
+            # 超时前已经输出的内容
+            run_stdout, run_stderr = run_proc.communicate()
+            raise subprocess.TimeoutExpired(run_command, timeout_seconds, run_stdout, run_stderr)
 
         # print(f"\n执行标准输出:\n{run_stdout.strip()}")
         # if run_stderr:  # 只在有内容时打印 stderr
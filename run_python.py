@@ -0,0 +1,244 @@
+"""
+Python 代码（constants.LANGUAGE = 4）的语法检查和运行。
+
+编译步骤对应语法检查（compile_python），返回值与 run_cpp.compile_cpp 相同，“可执行文件”就是源文件本身。
+
+运行样例时不为每次运行启动新的解释器（启动需要 30~50ms），而是维护若干常驻的解释器进程（python_worker.py），
+每次运行由空闲的常驻进程 fork 出子进程，在子进程中设置资源限制后执行代码。
+标准输入、输出、错误的管道在本进程中创建，通过 Unix 域套接字（SCM_RIGHTS）交给常驻进程，
+因此调用方可以像读写普通子进程一样流式读写；子进程的 CPU 时间和峰值内存由常驻进程用 os.wait4 取得后返回，见 local_judge。
+
+常驻进程依赖 fork 和传递文件描述符，只在类 Unix 系统上可用；其他系统上每次运行都启动新的解释器（run_command）。
+"""
+import atexit
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+import constants
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+
+_lock = threading.Lock()
+_idle_workers = []  # 空闲的常驻进程
+_all_workers = set()
+
+
+class WorkerDied(Exception):
+    pass
+
+
+def interpreter_path():
+    return constants.PYTHON_PATH or sys.executable
+
+
+def is_python_source(path):
+    return path.endswith(".py")
+
+
+def run_command(source_file):
+    """
+    不使用常驻进程时运行代码的命令。
+    """
+    return [interpreter_path(), source_file]
+
+
+def pool_available():
+    return (constants.PYTHON_WORKERS > 0 and hasattr(os, "fork") and hasattr(socket, "AF_UNIX")
+            and hasattr(socket, "send_fds"))
+
+
+def compile_python(source_file):
+    """
+    检查 Python 源文件的语法，返回值与 run_cpp.compile_cpp 相同。
+
+    Returns:
+        tuple: (True, source_file) 或 (False, 错误信息)。
+    """
+    print(f"--- 开始检查语法: {source_file} ---")
+    start_time = time.time()
+    if not os.path.exists(source_file):
+        error_msg = f"错误：源文件 '{source_file}' 不存在。"
+        print(error_msg)
+        return False, error_msg
+    if constants.PYTHON_PATH and os.path.realpath(constants.PYTHON_PATH) != os.path.realpath(sys.executable):
+        # 其他版本的解释器，语法可能不同，用它自己检查
+        proc = subprocess.run([constants.PYTHON_PATH, "-m", "py_compile", source_file],
+                              capture_output=True, text=True)
+        ok, error_msg = proc.returncode == 0, proc.stderr.strip()
+    else:
+        try:
+            with open(source_file, "r", encoding="utf-8") as f:
+                # 错误信息中只出现文件名，与工作目录的位置无关（见 cpp_diagnostics 中的处理）
+                compile(f.read(), os.path.basename(source_file), "exec", dont_inherit=True)
+            ok, error_msg = True, None
+        except (SyntaxError, ValueError) as e:
+            ok, error_msg = False, "".join(traceback.format_exception_only(type(e), e)).strip()
+    if not ok:
+        error_msg = f"语法错误：\n{error_msg}"
+        print(error_msg)
+        return False, error_msg
+    print(f"语法检查通过，用时 {time.time() - start_time:.2f}s：{source_file}")
+    return True, source_file
+
+
+class _Worker:
+    """
+    一个常驻的解释器进程，同一时间只运行一份代码。
+    """
+
+    def __init__(self):
+        parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.proc = subprocess.Popen(
+                [interpreter_path(), WORKER_SCRIPT, str(child_sock.fileno()),
+                 json.dumps(constants.PYTHON_PRELOAD_MODULES)],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                pass_fds=(child_sock.fileno(),),
+            )
+        except BaseException:
+            parent_sock.close()
+            raise
+        finally:
+            child_sock.close()
+        self.sock = parent_sock
+        self.reader = parent_sock.makefile("rb")
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise WorkerDied("常驻 Python 解释器进程异常退出")
+        return json.loads(line)
+
+    def start(self, job, fds):
+        """
+        发送任务和子进程的三个管道，返回子进程的 pid。
+        """
+        socket.send_fds(self.sock, [(json.dumps(job) + "\n").encode("utf-8")], fds)
+        return self._read()["pid"]
+
+    def wait(self):
+        """
+        等待子进程结束，返回 {"returncode", "cpu_ms", "max_rss_kb"}。
+        """
+        return self._read()
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+
+def _acquire():
+    with _lock:
+        if _idle_workers:
+            return _idle_workers.pop()
+    worker = _Worker()
+    with _lock:
+        _all_workers.add(worker)
+    return worker
+
+
+def _release(worker, healthy=True):
+    with _lock:
+        if healthy and len(_idle_workers) < constants.PYTHON_WORKERS:
+            _idle_workers.append(worker)
+            return
+        _all_workers.discard(worker)
+    worker.close()
+
+
+def warm_up():
+    """
+    提前启动 constants.PYTHON_WORKERS 个常驻进程，通常在获取题目的同时调用。
+    """
+    if not pool_available():
+        return
+    with _lock:
+        missing = constants.PYTHON_WORKERS - len(_idle_workers)
+    workers = []
+    try:
+        for _ in range(missing):
+            workers.append(_acquire())
+    except OSError as e:
+        print(f"警告：无法启动常驻 Python 解释器进程: {e}")
+    for worker in workers:
+        _release(worker)
+
+
+class WorkerProcess:
+    """
+    在常驻进程中运行的一份代码，提供 local_judge 需要的 Popen 接口：stdin/stdout/stderr、pid、kill。
+    结束后调用 wait_usage 取得退出码、CPU 时间和峰值内存。
+    """
+
+    def __init__(self, source_file, limits):
+        stdin_read, self._stdin_write = os.pipe()
+        self._stdout_read, stdout_write = os.pipe()
+        self._stderr_read, stderr_write = os.pipe()
+        child_fds = [stdin_read, stdout_write, stderr_write]
+        self.returncode = None
+        self._worker = _acquire()
+        job = dict(limits, path=os.path.abspath(source_file))
+        try:
+            self.pid = self._worker.start(job, child_fds)
+        except (OSError, WorkerDied):
+            _release(self._worker, healthy=False)
+            for fd in (self._stdin_write, self._stdout_read, self._stderr_read):
+                os.close(fd)
+            raise
+        finally:
+            for fd in child_fds:
+                os.close(fd)
+        self.stdin = os.fdopen(self._stdin_write, "wb")
+        self.stdout = os.fdopen(self._stdout_read, "rb")
+        self.stderr = os.fdopen(self._stderr_read, "rb")
+
+    def kill(self):
+        if self.returncode is not None:
+            return
+        try:
+            # 子进程自成一个进程组，连同它创建的进程一起终止
+            os.killpg(self.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def wait_usage(self):
+        """
+        等待代码运行结束。
+
+        Returns:
+            tuple: (returncode, cpu_ms, max_rss_kb)
+        """
+        try:
+            result = self._worker.wait()
+        except (OSError, ValueError, WorkerDied):
+            self.kill()
+            _release(self._worker, healthy=False)
+            raise
+        self.returncode = result["returncode"]
+        _release(self._worker)
+        return result["returncode"], result["cpu_ms"], result["max_rss_kb"]
+
+
+@atexit.register
+def _shutdown():
+    with _lock:
+        workers = list(_all_workers)
+        _all_workers.clear()
+        _idle_workers.clear()
+    for worker in workers:
+        worker.close()
@@ -0,0 +1,192 @@
+"""
+压力测试：样例的规模很小，复杂度过高的代码也能通过，提交后才发现超时。
+这里让LLM编写一个输入数据生成器，按题目数据范围的若干比例生成大规模输入，
+在本地评测（local_judge）下测量代码的 CPU 时间，拟合 时间 ≈ a·n^b，
+外推到最大数据规模；预计超时时生成侧重性能的修复提示词，在提交之前让LLM优化。
+
+数据规模 n 取题目描述中 n（或 m、q 等）的上界，生成器从标准输入读取 "n seed"，输出一组规模为 n 的输入。
+上界超过 constants.STRESS_MAX_SIZE 的变量是取值范围（例如 n ≤ 10^18 表示 n 本身的大小），不作为数据规模。
+"""
+import math
+import re
+
+import constants
+import generate_answer
+import language
+import local_judge
+import run_cpp
+import workspace as workspace_module
+from log_format import PREFIX_INFO, PREFIX_WARN, PREFIX_SUCCESS
+
+# 数值，例如 200000、2 \times 10^5、2e5、10^{5}
+_NUMBER = (r"(?:\d+(?:\.\d+)?\s*(?:\\times|\\cdot|×|\*)\s*10\s*\^\s*\{?\s*\d+\s*\}?"
+           r"|10\s*\^\s*\{?\s*\d+\s*\}?|\d+(?:\.\d+)?[eE]\d+|\d[\d,]*)")
+# “变量 ≤ 上界”，变量为单个字母（不带下标，a_i 等表示取值范围而不是规模）
+_BOUND_RE = re.compile(r"(?<![A-Za-z_\\])([A-Za-z])\s*(?:\\leq?|\\leqslant|≤|<=)\s*(" + _NUMBER + r")")
+# 按优先级排列的规模变量
+_SIZE_VARIABLES = ("nN", "mM", "qQ", "kK")
+
+
+def _parse_number(text):
+    text = text.replace(",", "").replace(" ", "")
+    match = re.match(r"^(?:(\d+(?:\.\d+)?)(?:\\times|\\cdot|×|\*))?10\^\{?(\d+)\}?$", text)
+    if match:
+        return int(float(match.group(1) or 1) * 10 ** int(match.group(2)))
+    try:
+        return int(float(text))
+    except ValueError:
+        return None
+
+
+def parse_max_size(problem_markdown):
+    """
+    从题目描述的数据范围中找出规模变量（n、m、q、k，按此优先级）的最大上界。
+    超过 constants.STRESS_MAX_SIZE 的上界是取值范围而不是数据规模，忽略，继续查找下一个变量。
+
+    Returns:
+        int or None: 找不到时返回 None。
+    """
+    bounds = {}
+    for variable, number in _BOUND_RE.findall(problem_markdown):
+        value = _parse_number(number)
+        if value is not None and value <= constants.STRESS_MAX_SIZE:
+            bounds[variable] = max(bounds.get(variable, 0), value)
+    for names in _SIZE_VARIABLES:
+        values = [bounds[name] for name in names if name in bounds]
+        if values:
+            return max(values)
+    return None
+
+
+def fit_power_law(points):
+    """
+    对 (n, 毫秒) 取对数后做最小二乘，拟合 time = a·n^b。
+
+    Returns:
+        tuple or None: (a, b)，点数不足或 n 都相同时返回 None。
+    """
+    if len(points) < 2:
+        return None
+    xs = [math.log(n) for n, _ in points]
+    ys = [math.log(ms) for _, ms in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return None
+    b = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+    a = math.exp(mean_y - b * mean_x)
+    return a, b
+
+
+class StressTester:
+    """
+    单道题目的压力测试，生成器在第一次 check 时生成并编译，之后的修复尝试中重复使用。
+    """
+
+    def __init__(self, problem_id, problem_markdown, time_limit, memory_limit=None, router=None, workspace=None):
+        self.problem_id = problem_id
+        self.workspace = workspace  # 存放生成器源代码和可执行文件的工作目录，为 None 时在生成时新建，程序退出时删除
+        self.problem_markdown = problem_markdown
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.router = router  # model_router.ModelRouter，生成器使用生成时的当前模型（可能已经升级），为 None 时使用默认模型
+        self.max_size = parse_max_size(problem_markdown)
+        self._generator = None  # 生成器的可执行文件路径
+        self._disabled = self.max_size is None
+
+    @classmethod
+    def create(cls, problem_id, problem_markdown, time_limit, memory_limit=None, router=None, workspace=None):
+        """
+        Returns:
+            StressTester or None: 未启用、本地评测不可用或缺少时间限制/数据范围时返回 None。
+        """
+        if not constants.STRESS_TEST_ENABLED or not local_judge.available() or not time_limit:
+            return None
+        tester = cls(problem_id, problem_markdown, time_limit, memory_limit, router, workspace)
+        if tester.max_size is None:
+            print(f"{PREFIX_INFO} 未能从题目描述中找到数据范围，跳过压力测试。")
+            return None
+        return tester
+
+    def _build_generator(self):
+        print(f"  {PREFIX_INFO} 请求LLM编写输入数据生成器（最大规模 n={self.max_size}）...")
+        try:
+            model = self.router.model if self.router is not None else None
+            code = generate_answer.generate_input_generator(self.problem_markdown, model)
+            if self.workspace is None:
+                self.workspace = workspace_module.Workspace.create(f"P{self.problem_id}_stress")
+            source_file = self.workspace.write(f"{self.problem_id}_gen{language.source_suffix()}", code)
+        except Exception as e:
+            print(f"  {PREFIX_WARN} 生成输入数据生成器失败，跳过压力测试: {e}")
+            return None
+        compile_ok, result = language.compile_source(source_file)
+        if not compile_ok:
+            print(f"  {PREFIX_WARN} 输入数据生成器编译失败，跳过压力测试。")
+            return None
+        return result
+
+    def _generate_input(self, size, seed):
+        run_ok, stdout, _, message = run_cpp.run_executable(self._generator, f"{size} {seed}\n",
+                                                            timeout_seconds=constants.STRESS_GENERATOR_TIMEOUT)
+        if not run_ok or not stdout:
+            print(f"  {PREFIX_WARN} 输入数据生成器运行失败（n={size}）: {message}")
+            return None
+        return stdout
+
+    def check(self, executable_path):
+        """
+        对编译好的代码进行压力测试。
+
+        Returns:
+            tuple: (passed, feedback)，与 local_test.run_samples 相同；无法测试时视为通过。
+        """
+        if self._disabled:
+            return True, None
+        if self._generator is None:
+            self._generator = self._build_generator()
+            if self._generator is None:
+                self._disabled = True
+                return True, None
+
+        sizes = sorted({max(1, int(self.max_size * fraction)) for fraction in constants.STRESS_SIZE_FRACTIONS})
+        limit_ms = self.time_limit * 1000 / constants.LOCAL_JUDGE_TIME_RATIO
+        measurements = []  # [(n, CPU 毫秒数)]
+        for seed, size in enumerate(sizes, 1):
+            input_data = self._generate_input(size, seed)
+            if input_data is None:
+                self._disabled = True
+                return True, None
+            result = local_judge.run(executable_path, input_data, self.time_limit, self.memory_limit)
+            print(f"  {PREFIX_INFO} 压力测试 n={size}: {result['verdict']}，CPU {result['cpu_ms']:.0f}ms")
+            measurements.append((size, result["cpu_ms"]))
+            if result["verdict"] in ("TLE", "MLE"):
+                return False, self._feedback(measurements, result["message"])
+            if result["verdict"] != "OK":
+                # 可能是生成器给出了不合法的输入，不据此判断代码有错
+                print(f"  {PREFIX_WARN} 代码在生成的输入上运行失败（{result['message']}），不再继续压力测试。")
+                return True, None
+
+        # 太短的运行时间主要是进程启动等固定开销，不参与拟合
+        fit = fit_power_law([(n, ms) for n, ms in measurements if ms >= constants.STRESS_MIN_FIT_MS])
+        if fit is None:
+            print(f"  {PREFIX_SUCCESS} 压力测试通过（运行时间太短，无需外推）。")
+            return True, None
+        a, b = fit
+        predicted_ms = a * self.max_size ** b
+        print(f"  {PREFIX_INFO} 拟合得到 时间 ≈ {a:.3g}·n^{b:.2f}，n={self.max_size} 时预计 {predicted_ms:.0f}ms"
+              f"（时间限制 {limit_ms:.0f}ms）")
+        if predicted_ms > limit_ms:
+            return False, self._feedback(
+                measurements,
+                f"估计时间复杂度约为 O(n^{b:.1f})，在最大规模 n={self.max_size} 下预计运行 {predicted_ms:.0f}ms，"
+                f"超过了时间限制 {self.time_limit * 1000:.0f}ms。")
+        print(f"  {PREFIX_SUCCESS} 压力测试通过。")
+        return True, None
+
+    def _feedback(self, measurements, reason):
+        lines = "\n".join(f"  n={n}: {ms:.0f}ms" for n, ms in measurements)
+        return (f"你的代码可以通过样例，但在大规模数据下运行太慢或占用内存太多，提交后很可能无法通过！\n"
+                f"本地压力测试结果（数据规模: CPU 时间）：\n{lines}\n"
+                f"{reason}\n"
+                f"请根据题目的数据范围重新分析所需的时间和空间复杂度，改用更高效的算法，并再次提供完整的代码。")
+
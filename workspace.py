@@ -0,0 +1,172 @@
+"""
+工作目录：每次解题（以及 Best-of-N 的每份候选、压力测试的生成器）使用独立的目录保存源代码、可执行文件等中间文件，
+不再写入当前目录，多个进程同时处理同一道题时不会互相覆盖，结束后自动删除。
+
+工作目录默认建在 /dev/shm（tmpfs，内存中的文件系统）下，编译和运行时的读写不经过磁盘；
+不可用（不存在、不可写或挂载为 noexec，无法运行可执行文件）时退回到系统临时目录。
+需要保留的结果（题目描述、最终代码等）通过 keep 复制到 constants.WORKSPACE_OUTPUT_DIR。
+"""
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import cache_utils
+import constants
+
+_PREFIX = "autoac_"
+
+_lock = threading.Lock()
+_root = None  # 工作目录所在的目录，首次使用时确定
+_active = set()  # 尚未清理的工作目录，程序退出时清理
+
+
+def _usable(directory):
+    """
+    目录是否可写，并且其中的可执行文件可以运行（没有以 noexec 挂载）。
+    """
+    if not os.path.isdir(directory) or not os.access(directory, os.W_OK | os.X_OK):
+        return False
+    try:
+        return not os.statvfs(directory).f_flag & getattr(os, "ST_NOEXEC", 0)
+    except (OSError, AttributeError):  # Windows 没有 statvfs
+        return True
+
+
+def _sweep_stale(root):
+    """
+    删除之前被中断的运行留下的、超过 WORKSPACE_STALE_SECONDS 未修改的工作目录。
+    """
+    deadline = time.time() - constants.WORKSPACE_STALE_SECONDS
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            if name.startswith(_PREFIX) and os.path.isdir(path) and os.path.getmtime(path) < deadline:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def workspace_root():
+    """
+    工作目录所在的目录：constants.WORKSPACE_ROOT，未设置时优先使用 /dev/shm，否则使用系统临时目录。
+    """
+    global _root
+    with _lock:
+        if _root is not None:
+            return _root
+        candidates = [constants.WORKSPACE_ROOT] if constants.WORKSPACE_ROOT else ["/dev/shm", tempfile.gettempdir()]
+        root = None
+        for candidate in candidates:
+            if _usable(candidate):
+                root = candidate
+                break
+        if root is None:
+            root = candidates[-1]
+            os.makedirs(root, exist_ok=True)
+        _sweep_stale(root)
+        _root = root
+        return _root
+
+
+class Workspace:
+    """
+    一个独立的工作目录。
+    用法：
+        with Workspace.create(problem_id) as ws:
+            path = ws.write(f"{problem_id}.cpp", code)   # 原子写入，返回文件路径
+            child = ws.subdir("candidate1")               # 子工作目录，随父目录一起清理
+            ws.keep(f"{problem_id}.cpp")                  # 复制到 WORKSPACE_OUTPUT_DIR
+    """
+
+    def __init__(self, path, owned=True):
+        self.path = path
+        self._owned = owned  # 子目录由父目录负责清理
+
+    @classmethod
+    def create(cls, name):
+        path = tempfile.mkdtemp(prefix=f"{_PREFIX}{name}_", dir=workspace_root())
+        with _lock:
+            _active.add(path)
+        return cls(path)
+
+    def file(self, name):
+        """
+        工作目录中文件的路径。
+        """
+        return os.path.join(self.path, name)
+
+    def write(self, name, text):
+        """
+        原子地写入文本文件（先写临时文件再替换），后台编译不会读到写了一半的代码。
+
+        Returns:
+            str: 文件路径。
+        """
+        path = self.file(name)
+        cache_utils.atomic_write_bytes(path, text.encode("utf-8"))
+        return path
+
+    def subdir(self, name):
+        """
+        创建子工作目录，例如每份候选代码一个。
+        """
+        path = self.file(name)
+        os.makedirs(path, exist_ok=True)
+        return Workspace(path, owned=False)
+
+    def keep(self, name, text=None, output_name=None):
+        """
+        把工作目录中的文件（或给定的文本）保存到 constants.WORKSPACE_OUTPUT_DIR，工作目录清理后仍然保留。
+
+        Returns:
+            str or None: 保存的路径，未启用保存或保存失败时返回 None。
+        """
+        if not constants.WORKSPACE_KEEP_ARTIFACTS:
+            return None
+        destination = os.path.join(constants.WORKSPACE_OUTPUT_DIR, output_name or name)
+        try:
+            if text is None:
+                with open(self.file(name), "rb") as f:
+                    data = f.read()
+            else:
+                data = text.encode("utf-8")
+            # 原子替换，同时处理同一道题的其他进程不会看到写了一半的文件
+            cache_utils.atomic_write_bytes(destination, data)
+        except OSError as e:
+            print(f"警告：无法保存 '{name}' 到 '{destination}': {e}")
+            return None
+        return destination
+
+    def cleanup(self):
+        if not self._owned:
+            return
+        with _lock:
+            _active.discard(self.path)
+        if constants.WORKSPACE_CLEANUP:
+            shutil.rmtree(self.path, ignore_errors=True)
+        else:
+            print(f"工作目录已保留：{self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+
+@atexit.register
+def _cleanup_all():
+    # 异常退出（例如 Ctrl+C）时仍然清理没有清理的工作目录
+    with _lock:
+        paths = list(_active)
+        _active.clear()
+    if constants.WORKSPACE_CLEANUP:
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)